@@ -0,0 +1,24 @@
+# app/batch_standin.py
+# Local stand-in for the OpenAI Batch API. Serves batches written by the "local" batch backend
+# (BATCH_BACKEND=local) from BATCH_LOCAL_DIR. Run with `python -m app.batch_standin`.
+import os
+import asyncio
+import logging
+from app.services.batch_client import LocalBatchBackend, LocalBatchServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_STANDIN_POLL_SECONDS = float(os.getenv("BATCH_STANDIN_POLL_SECONDS", "2"))
+
+
+async def main():
+    server = LocalBatchServer(LocalBatchBackend())
+    logger.info(f"Batch stand-in serving {server.backend.root} (mode={server.mode})")
+    while True:
+        await server.process_pending()
+        await asyncio.sleep(BATCH_STANDIN_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
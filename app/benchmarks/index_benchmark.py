@@ -0,0 +1,115 @@
+# app/benchmarks/index_benchmark.py
+# Seeds a throwaway database on a local mongod with course-shaped data and times the hot equality
+# lookups with only the _id index, then again after ensure_indexes(). Run with
+# `python -m app.benchmarks.index_benchmark --uri mongodb://localhost:27017 --courses 200`.
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+from datetime import datetime
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.db.indexes import ensure_indexes
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+PROCESSES = ["elaboration", "prompting", "handout", "misc_points", "quiz"]
+
+
+async def seed(database, courses: int, topics: int, points: int):
+    main_topics, list_topics, points_discussion, cost_entries = [], [], [], []
+    for course in range(courses):
+        main_id = ObjectId()
+        main_topics.append({"_id": main_id, "main_topic": f"Course {course}"})
+        for topic in range(topics):
+            topic_id = ObjectId()
+            list_topics.append({"_id": topic_id, "main_topic_id": main_id, "topic_name": f"Course {course} topic {topic}"})
+            for point in range(points):
+                points_discussion.append({"topic_name_id": topic_id, "point_of_discussion": f"Point {point}", "handout": "x" * 200})
+            for process_name in PROCESSES:
+                cost_entries.append({"topic_id": str(topic_id), "content": "", "process_name": process_name, "cost": 100, "datetime": datetime.utcnow()})
+
+    await database.main_topic.insert_many(main_topics)
+    await database.list_topics.insert_many(list_topics)
+    await database.points_discussion.insert_many(points_discussion)
+    await database.cost_ai.insert_many(cost_entries)
+    return main_topics, list_topics
+
+
+def lookups(main_topics: list, list_topics: list) -> dict:
+    # The filters used by get_list_topics_by_main_topic_id, get_topic_by_name,
+    # get_points_discussion_by_topic_id and the cost breakdown
+    return {
+        "list_topics.main_topic_id": ("list_topics", lambda: {"main_topic_id": random.choice(main_topics)["_id"]}),
+        "list_topics.topic_name": ("list_topics", lambda: {"topic_name": random.choice(list_topics)["topic_name"]}),
+        "points_discussion.topic_name_id": ("points_discussion", lambda: {"topic_name_id": random.choice(list_topics)["_id"]}),
+        "cost_ai.topic_id": ("cost_ai", lambda: {"topic_id": str(random.choice(list_topics)["_id"])}),
+    }
+
+
+def plan_stage(plan: dict) -> str:
+    while "inputStage" in plan:
+        plan = plan["inputStage"]
+    return plan["stage"]
+
+
+async def measure(database, queries: dict, repeat: int) -> dict:
+    results = {}
+    for label, (collection_name, make_filter) in queries.items():
+        collection = database.get_collection(collection_name)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await collection.find(make_filter()).to_list(length=None)
+            timings.append((time.perf_counter() - started) * 1000)
+        explain = await database.command("explain", {"find": collection_name, "filter": make_filter()}, verbosity="queryPlanner")
+        results[label] = {
+            "median_ms": statistics.median(timings),
+            "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1],
+            "plan": plan_stage(explain["queryPlanner"]["winningPlan"]),
+        }
+    return results
+
+
+async def main(args):
+    if args.database == "kursil":
+        raise SystemExit("Refusing to seed the application database; pick another --database")
+    client = AsyncIOMotorClient(args.uri)
+    database = client.get_database(args.database)
+    try:
+        # Starts from empty collections, so only the _id index exists for the first run
+        await client.drop_database(args.database)
+        main_topics, list_topics = await seed(database, args.courses, args.topics, args.points)
+        print(f"Seeded {len(main_topics)} courses, {len(list_topics)} topics, {len(list_topics) * args.points} points")
+
+        queries = lookups(main_topics, list_topics)
+        before = await measure(database, queries, args.repeat)
+        await ensure_indexes(database)
+        after = await measure(database, queries, args.repeat)
+
+        print(f"{'lookup':34} {'plan':>18} {'median ms':>18} {'p95 ms':>18}")
+        for label in queries:
+            b, a = before[label], after[label]
+            print(
+                f"{label:34} {b['plan'] + ' -> ' + a['plan']:>18} "
+                f"{b['median_ms']:8.2f} -> {a['median_ms']:6.2f} {b['p95_ms']:8.2f} -> {a['p95_ms']:6.2f}"
+            )
+    finally:
+        if not args.keep:
+            await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hot lookups with and without the registry indexes")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="kursil_index_benchmark")
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--points", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="leave the seeded database in place")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+# app/benchmarks/misc_quiz_benchmark.py
+# Compares tokens and latency of the two-call misc points + quiz path against the merged call.
+# Nothing is cached or written to the database. Run with
+# `python -m app.benchmarks.misc_quiz_benchmark --limit 5` or pass handout files with --handout.
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from app.db.database import points_discussion_collection
+from app.services.llm_gateway import chat_completion_result, close_client
+from app.services.output_parsers import MiscPointsOutput, MiscQuizOutput, response_format_for, parse_structured
+from app.services.openai_service import build_misc_points_messages, build_quiz_messages, build_misc_quiz_messages
+from app.services.prompt_registry import prompt_registry
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4o-mini"
+
+
+async def load_samples(limit: int, handout_files: list) -> list:
+    if handout_files:
+        return [{"point_of_discussion": Path(path).stem, "handout": Path(path).read_text(encoding="utf-8")} for path in handout_files]
+    cursor = points_discussion_collection.find(
+        {"handout": {"$nin": [None, ""]}},
+        {"point_of_discussion": 1, "handout": 1}
+    ).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def timed_call(messages, **params) -> dict:
+    started = time.perf_counter()
+    result = await chat_completion_result(messages, model=MODEL, **params)
+    return {
+        "prompt_tokens": result["usage"]["prompt_tokens"],
+        "completion_tokens": result["usage"]["completion_tokens"],
+        "latency": time.perf_counter() - started,
+        "content": result["content"],
+    }
+
+
+async def run_separate(point_of_discussion: str, handout: str) -> dict:
+    # The two calls run concurrently in the pipeline, so latency is the slower of the two
+    misc, quiz = await asyncio.gather(
+        timed_call(build_misc_points_messages(point_of_discussion, handout), response_format=response_format_for(MiscPointsOutput)),
+        timed_call(build_quiz_messages(point_of_discussion, handout)),
+    )
+    return {
+        "prompt_tokens": misc["prompt_tokens"] + quiz["prompt_tokens"],
+        "completion_tokens": misc["completion_tokens"] + quiz["completion_tokens"],
+        "latency": max(misc["latency"], quiz["latency"]),
+        "valid": parse_structured(MiscPointsOutput, misc["content"]) is not None,
+    }
+
+
+async def run_merged(point_of_discussion: str, handout: str) -> dict:
+    merged = await timed_call(build_misc_quiz_messages(point_of_discussion, handout), response_format=response_format_for(MiscQuizOutput))
+    return {
+        "prompt_tokens": merged["prompt_tokens"],
+        "completion_tokens": merged["completion_tokens"],
+        "latency": merged["latency"],
+        "valid": parse_structured(MiscQuizOutput, merged["content"]) is not None,
+    }
+
+
+def print_row(label: str, stats: dict):
+    print(f"  {label:<9} prompt={stats['prompt_tokens']:>6} completion={stats['completion_tokens']:>5} "
+          f"latency={stats['latency']:6.2f}s valid={stats['valid']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark merged misc points + quiz generation")
+    parser.add_argument("--limit", type=int, default=5, help="Number of stored handouts to sample")
+    parser.add_argument("--handout", action="append", default=[], help="Markdown handout file to use instead of the database")
+    args = parser.parse_args()
+
+    prompt_registry.load_all()
+    samples = await load_samples(args.limit, args.handout)
+    if not samples:
+        print("No handouts found")
+        return
+
+    totals = {"separate": {}, "merged": {}}
+    try:
+        for sample in samples:
+            print(f"{sample['point_of_discussion'][:70]} ({len(sample['handout'])} chars)")
+            for label, runner in (("separate", run_separate), ("merged", run_merged)):
+                stats = await runner(sample["point_of_discussion"], sample["handout"])
+                print_row(label, stats)
+                for key in ("prompt_tokens", "completion_tokens", "latency"):
+                    totals[label][key] = totals[label].get(key, 0) + stats[key]
+    finally:
+        await close_client()
+
+    print(f"\nTotals over {len(samples)} handouts")
+    for label, stats in totals.items():
+        print(f"  {label:<9} prompt={stats['prompt_tokens']:>6} completion={stats['completion_tokens']:>5} latency={stats['latency']:6.2f}s")
+    saved = 1 - totals["merged"]["prompt_tokens"] / max(totals["separate"]["prompt_tokens"], 1)
+    print(f"  prompt tokens saved by merging: {saved:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+# app/db/cost_rollups.py
+# Materialized cost totals. Every cost entry for a list topic is added to "cost_rollup" on that list
+# topic and on its main topic, so course listings read one field instead of summing the ledger.
+# New topics start with an empty rollup; courses created before it existed get theirs from
+# `python -m app.db.cost_rollups`, which rebuilds every rollup from cost_ai.
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from .database import main_topic_collection, list_topics_collection, cost_ai_collection
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def empty_rollup() -> dict:
+    return {"total_cost": 0, "entries": 0, "by_process": {}}
+
+
+def rollup_increment(process_name: str, cost) -> dict:
+    return {
+        "$inc": {"cost_rollup.total_cost": cost, "cost_rollup.entries": 1, f"cost_rollup.by_process.{process_name}": cost},
+        "$set": {"cost_rollup.updated_at": datetime.utcnow()}
+    }
+
+
+async def apply_cost_to_rollups(topic_id, process_name: str, cost):
+    # The topic list is billed to the main topic id and, like other entries not attributed to a
+    # list topic, is not part of course totals
+    if process_name == "topics" or not ObjectId.is_valid(str(topic_id)):
+        return
+    update = rollup_increment(process_name, cost)
+    # Topics without a rollup yet are left for the backfill; a partial total would hide the ledger fallback
+    list_topic = await list_topics_collection.find_one_and_update(
+        {"_id": ObjectId(str(topic_id)), "cost_rollup": {"$exists": True}}, update, projection={"main_topic_id": 1}
+    )
+    if list_topic and list_topic.get("main_topic_id"):
+        await main_topic_collection.update_one({"_id": ObjectId(str(list_topic["main_topic_id"])), "cost_rollup": {"$exists": True}}, update)
+
+
+async def bulk_set_rollups(collection, rollups: dict):
+    now = datetime.utcnow()
+    operations = [UpdateOne({"_id": _id}, {"$set": {"cost_rollup": {**rollup, "updated_at": now}}}) for _id, rollup in rollups.items()]
+    for start in range(0, len(operations), BACKFILL_BATCH_SIZE):
+        await collection.bulk_write(operations[start:start + BACKFILL_BATCH_SIZE], ordered=False)
+
+
+async def rebuild_cost_rollups() -> dict:
+    # Entries written while this runs may be counted twice or missed; run it when generation is idle
+    rows = await cost_ai_collection.aggregate([
+        {"$group": {"_id": {"topic_id": "$topic_id", "process_name": "$process_name"}, "cost": {"$sum": "$cost"}, "entries": {"$sum": 1}}}
+    ]).to_list(length=None)
+
+    by_topic = defaultdict(empty_rollup)
+    for row in rows:
+        rollup = by_topic[row["_id"]["topic_id"]]
+        rollup["total_cost"] += row["cost"]
+        rollup["entries"] += row["entries"]
+        rollup["by_process"][row["_id"]["process_name"]] = row["cost"]
+
+    list_topics = await list_topics_collection.find({}, {"main_topic_id": 1}).to_list(length=None)
+    main_topics = await main_topic_collection.find({}, {"_id": 1}).to_list(length=None)
+
+    topic_rollups = {}
+    main_rollups = {main_topic["_id"]: empty_rollup() for main_topic in main_topics}
+    for list_topic in list_topics:
+        rollup = by_topic.get(str(list_topic["_id"]), empty_rollup())
+        topic_rollups[list_topic["_id"]] = rollup
+        main_id = list_topic.get("main_topic_id")
+        if main_id is None or not ObjectId.is_valid(str(main_id)) or ObjectId(str(main_id)) not in main_rollups:
+            continue
+        main_rollup = main_rollups[ObjectId(str(main_id))]
+        main_rollup["total_cost"] += rollup["total_cost"]
+        main_rollup["entries"] += rollup["entries"]
+        for process_name, cost in rollup["by_process"].items():
+            main_rollup["by_process"][process_name] = main_rollup["by_process"].get(process_name, 0) + cost
+
+    await bulk_set_rollups(list_topics_collection, topic_rollups)
+    await bulk_set_rollups(main_topic_collection, main_rollups)
+    logger.info(f"Rebuilt cost rollups for {len(topic_rollups)} list topics and {len(main_rollups)} main topics")
+    return {"list_topics": len(topic_rollups), "main_topics": len(main_rollups)}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(rebuild_cost_rollups()))
@@ -15,3 +15,9 @@ main_topic_collection = db.get_collection("main_topic")
 list_topics_collection = db.get_collection("list_topics")
 points_discussion_collection = db.get_collection("points_discussion")
 cost_ai_collection = db.get_collection("cost_ai")
+llm_cache_collection = db.get_collection("llm_cache")
+jobs_collection = db.get_collection("jobs")
+rate_limits_collection = db.get_collection("rate_limits")
+leases_collection = db.get_collection("leases")
+batches_collection = db.get_collection("batches")
+translations_collection = db.get_collection("translations")
@@ -0,0 +1,87 @@
+# app/db/indexes.py
+# Index registry: every index the app relies on, per collection. ensure_indexes() creates them at
+# startup (create_indexes is a no-op for indexes that already exist) and index_report() compares the
+# registry with what the server has, using $indexStats to find indexes nothing reads.
+import logging
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from .database import db
+from .operations import POINT_STAGES
+from app.services.completion_cache import LLM_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "list_topics": [
+        IndexModel([("main_topic_id", ASCENDING)]),
+        IndexModel([("topic_name", ASCENDING)]),
+    ],
+    "points_discussion": [
+        IndexModel([("topic_name_id", ASCENDING)]),
+        # Stage progress and resume scans per topic
+        *(IndexModel([("topic_name_id", ASCENDING), (f"stages.{stage}.status", ASCENDING)]) for stage in POINT_STAGES),
+    ],
+    "cost_ai": [
+        IndexModel([("topic_id", ASCENDING)]),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_after", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+    ],
+    "batches": [
+        IndexModel([("main_topic_id", ASCENDING), ("backend", ASCENDING), ("ingested_at", ASCENDING)]),
+    ],
+    # TTL indexes: Mongo removes documents once the indexed date has passed
+    "llm_cache": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=LLM_CACHE_TTL_SECONDS),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "leases": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+
+def key_spec(key) -> tuple:
+    # index_information() returns the key as (field, direction) pairs, IndexModel as a SON
+    pairs = key.items() if hasattr(key, "items") else key
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in pairs)
+
+
+async def ensure_indexes(database=db, collections: Optional[List[str]] = None) -> dict:
+    created = {}
+    for name, models in INDEXES.items():
+        if collections and name not in collections:
+            continue
+        try:
+            created[name] = await database.get_collection(name).create_indexes(models)
+        except OperationFailure as e:
+            # e.g. a TTL changed through the environment: the existing index has to be dropped by hand
+            logger.error(f"Error creating indexes on {name}: {str(e)}")
+    return created
+
+
+async def index_report(database=db) -> dict:
+    # $indexStats counters start at zero when mongod restarts, so "unused" covers accesses since then
+    report = {}
+    for name, models in INDEXES.items():
+        collection = database.get_collection(name)
+        existing = await collection.index_information()
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+        accesses = {row["name"]: row["accesses"] for row in stats}
+
+        declared = {key_spec(model.document["key"]): model.document["name"] for model in models}
+        existing_specs = {key_spec(info["key"]): index_name for index_name, info in existing.items()}
+        report[name] = {
+            "missing": [index_name for spec, index_name in declared.items() if spec not in existing_specs],
+            "undeclared": [index_name for spec, index_name in existing_specs.items() if spec not in declared and index_name != "_id_"],
+            "unused": [
+                {"name": index_name, "since": accesses[index_name]["since"]}
+                for index_name in existing if index_name != "_id_" and index_name in accesses and accesses[index_name]["ops"] == 0
+            ],
+            "accesses": {index_name: access["ops"] for index_name, access in accesses.items()},
+        }
+    return report
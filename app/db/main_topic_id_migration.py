@@ -0,0 +1,66 @@
+# app/db/main_topic_id_migration.py
+# Online migration of list_topics.main_topic_id from the string form to ObjectId, in small batches
+# so it can run next to live traffic. Rollout: deploy with MAIN_TOPIC_ID_COMPAT=true (new topics are
+# written as ObjectId, lookups match both forms), run `python -m app.db.main_topic_id_migration`
+# until no strings remain, then set MAIN_TOPIC_ID_COMPAT=false.
+import os
+import asyncio
+import logging
+import argparse
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from .database import list_topics_collection
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MAIN_TOPIC_ID_MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_PAUSE_SECONDS = float(os.getenv("MAIN_TOPIC_ID_MIGRATION_PAUSE_SECONDS", "0.2"))
+
+STRING_MAIN_TOPIC_ID = {"main_topic_id": {"$type": "string"}}
+
+
+async def migrate_main_topic_ids(batch_size: int = MIGRATION_BATCH_SIZE, pause_seconds: float = MIGRATION_PAUSE_SECONDS, dry_run: bool = False) -> dict:
+    counts = {"scanned": 0, "convertible": 0, "migrated": 0, "invalid": 0}
+    last_id = None
+    while True:
+        # Walking by _id keeps invalid values from being read again on every batch
+        query = dict(STRING_MAIN_TOPIC_ID)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await list_topics_collection.find(query, {"main_topic_id": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        counts["scanned"] += len(docs)
+
+        operations = []
+        for doc in docs:
+            try:
+                object_id = ObjectId(doc["main_topic_id"])
+            except InvalidId:
+                logger.warning(f"List topic {doc['_id']} has an invalid main_topic_id {doc['main_topic_id']!r}, left as is")
+                counts["invalid"] += 1
+                continue
+            # Matching the value that was read leaves a document changed since then alone
+            operations.append(UpdateOne({"_id": doc["_id"], "main_topic_id": doc["main_topic_id"]}, {"$set": {"main_topic_id": object_id}}))
+        counts["convertible"] += len(operations)
+
+        if operations and not dry_run:
+            result = await list_topics_collection.bulk_write(operations, ordered=False)
+            counts["migrated"] += result.modified_count
+            logger.info(f"Migrated {counts['migrated']} list topics so far")
+        await asyncio.sleep(pause_seconds)
+
+    counts["remaining_strings"] = await list_topics_collection.count_documents(STRING_MAIN_TOPIC_ID)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite string list_topics.main_topic_id values as ObjectId")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=MIGRATION_PAUSE_SECONDS, help="Seconds to wait between batches")
+    parser.add_argument("--dry-run", action="store_true", help="Count the documents without writing")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(migrate_main_topic_ids(args.batch_size, args.pause, args.dry_run)))
@@ -1,8 +1,12 @@
 # app/db/operations.py
 from motor.motor_asyncio import AsyncIOMotorClient
 from .database import main_topic_collection, list_topics_collection, points_discussion_collection, cost_ai_collection
+from .cost_rollups import apply_cost_to_rollups
+import asyncio
 from bson import ObjectId
+from datetime import datetime, timedelta
 import logging
+import os
 
 # Configure the logger
 logger = logging.getLogger(__name__)
@@ -21,20 +25,62 @@ console_handler.setFormatter(formatter)
 # Add the handler to the logger
 logger.addHandler(console_handler)
 
+# Generation stages tracked per point of discussion under "stages.<stage>"
+POINT_STAGES = ["prompting", "handout", "misc_points", "quiz", "translation"]
+STAGE_STATUSES = ["pending", "running", "done", "failed"]
+
+# list_topics.main_topic_id is stored as an ObjectId. Until older string values are rewritten by
+# `python -m app.db.main_topic_id_migration`, lookups also match the string form.
+MAIN_TOPIC_ID_COMPAT = os.getenv("MAIN_TOPIC_ID_COMPAT", "true").lower() == "true"
+
+# A stage submitted in an OpenAI batch stays running under stages.<stage>.batch_id for up to the
+# 24h completion window; only after this long is it treated as abandoned
+BATCH_STAGE_STALE_SECONDS = int(os.getenv("BATCH_STAGE_STALE_SECONDS", str(26 * 3600)))
+
+
+def new_stage_state():
+    return {
+        "status": "pending",
+        "attempts": 0,
+        "content_hash": None,
+        "last_error": None,
+        "started_at": None,
+        "finished_at": None,
+        "updated_at": datetime.utcnow()
+    }
+
+
+def main_topic_id_match(main_topic_id):
+    object_id = ObjectId(str(main_topic_id))
+    if MAIN_TOPIC_ID_COMPAT:
+        return {"$in": [object_id, str(object_id)]}
+    return object_id
+
 
 async def get_all_main_topics():
     cursor = main_topic_collection.find({}, {
         "main_topic": 1, 
         "cost": 1, 
-        "link_image_icon": 1  
+        "link_image_icon": 1,
+        "cost_rollup.total_cost": 1
     })
-    return await cursor.to_list(length=None)
+    main_topics = await cursor.to_list(length=None)
+    # Courses from before the rollup are summed from the ledger until the backfill has run
+    legacy = [main_topic for main_topic in main_topics if "cost_rollup" not in main_topic]
+    if legacy:
+        logger.info(f"{len(legacy)} main topics have no cost rollup yet, run python -m app.db.cost_rollups")
+    totals = await asyncio.gather(*(get_cost_breakdown_by_main_topic_id(main_topic["_id"], totals_only=True) for main_topic in legacy))
+    for main_topic, costs in zip(legacy, totals):
+        main_topic["cost_rollup"] = {"total_cost": costs["total_cost"]}
+    for main_topic in main_topics:
+        main_topic["total_cost"] = main_topic.pop("cost_rollup").get("total_cost", 0)
+    return main_topics
 
 async def get_main_topic_by_id(main_topic_id):
     return await main_topic_collection.find_one({"_id": ObjectId(main_topic_id)})
 
 async def get_list_topics_by_main_topic_id(main_topic_id):
-    cursor = list_topics_collection.find({"main_topic_id": main_topic_id})
+    cursor = list_topics_collection.find({"main_topic_id": main_topic_id_match(main_topic_id)})
     return await cursor.to_list(length=None)
 
 async def get_topic_by_name(topic_name):
@@ -61,7 +107,8 @@ async def add_elaborated_point(point_of_discussion, elaboration, topic_name_id):
         "cost_prompting": "",
         "cost_handout": "",
         "cost_quiz": "",
-        "cost_presentation": ""
+        "cost_presentation": "",
+        "stages": {stage: new_stage_state() for stage in POINT_STAGES}
     })
     return result.inserted_id
 
@@ -122,17 +169,20 @@ async def update_handout(point_id: str, handout: str):
     )
     return result.modified_count
 
+def misc_points_fields(misc_points: dict) -> dict:
+    return {
+        "learn_objective": misc_points.get("learn_objective", ""),
+        "assessment": misc_points.get("assessment", ""),
+        "method": misc_points.get("method", ""),
+        "duration": misc_points.get("duration")
+    }
+
 async def update_misc_points(point_id: str, misc_points: dict):
     logger.info(f"Updating misc points for point of discussion: {point_id}")
     try:
         result = await points_discussion_collection.update_one(
             {"_id": ObjectId(point_id)},
-            {"$set": {
-                "learn_objective": misc_points.get("learn_objective", ""),
-                "assessment": misc_points.get("assessment", ""),
-                "method": misc_points.get("method", ""),
-                "duration": misc_points.get("duration")
-            }}
+            {"$set": misc_points_fields(misc_points)}
         )
         logger.info(f"Update result: matched {result.matched_count}, modified {result.modified_count}")
         if result.modified_count == 0:
@@ -167,6 +217,15 @@ async def update_quiz(point_id: str, quiz_content: str):
         logger.error(f"Error updating quiz for point of discussion {point_id}: {str(e)}", exc_info=True)
         raise
 
+async def update_misc_points_and_quiz(point_id: str, misc_points: dict, quiz_content: str):
+    # Writes both stages' fields in a single update
+    result = await points_discussion_collection.update_one(
+        {"_id": ObjectId(point_id)},
+        {"$set": {**misc_points_fields(misc_points), "quiz": quiz_content}}
+    )
+    logger.info(f"Updated misc points and quiz for point of discussion {point_id}: matched {result.matched_count}, modified {result.modified_count}")
+    return result.modified_count
+
 async def get_points_discussion_ids_by_topic_id(topic_id):
     cursor = points_discussion_collection.find(
         {"topic_name_id": ObjectId(topic_id)},
@@ -186,6 +245,115 @@ async def get_topic_id_by_point_id(point_id):
         return str(point['topic_name_id'])
     return None
 
+async def add_cost_entry(topic_id, content: str, process_name: str, cost: float, **extra):
+    cost_data = {
+        "datetime": datetime.utcnow(),
+        "topic_id": str(topic_id),
+        "content": content,
+        "process_name": process_name,
+        "cost": round(cost),
+        **extra
+    }
+    result = await cost_ai_collection.insert_one(cost_data)
+    try:
+        await apply_cost_to_rollups(topic_id, process_name, cost_data["cost"])
+    except Exception as e:
+        # The ledger entry is the source of truth; the rollup backfill repairs a missed increment
+        logger.warning(f"Cost rollup update failed for topic {topic_id}: {str(e)}")
+    return result.inserted_id
+
+async def get_prompt_cache_stats_by_stage(since: datetime = None, topic_id: str = None):
+    # Provider-side prompt caching per stage: how much of the billed input was served from cache.
+    # Completion cache hits never reach the provider, so they are left out.
+    match = {"cache_hit": {"$ne": True}, "prompt_tokens": {"$exists": True}}
+    if since:
+        match["datetime"] = {"$gte": since}
+    if topic_id:
+        match["topic_id"] = topic_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$process_name",
+            "calls": {"$sum": 1},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "cached_tokens": {"$sum": {"$ifNull": ["$cached_tokens", 0]}},
+            "calls_with_cache": {"$sum": {"$cond": [{"$gt": ["$cached_tokens", 0]}, 1, 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+    rows = await cost_ai_collection.aggregate(pipeline).to_list(length=None)
+    return {
+        row["_id"]: {
+            "calls": row["calls"],
+            "calls_with_cache": row["calls_with_cache"],
+            "prompt_tokens": row["prompt_tokens"],
+            "cached_tokens": row["cached_tokens"],
+            "cached_ratio": round(row["cached_tokens"] / row["prompt_tokens"], 4) if row["prompt_tokens"] else 0
+        }
+        for row in rows
+    }
+
+async def get_model_route_stats_by_stage(since: datetime = None):
+    # Cascade decisions per stage and model, from the route_* fields on cost entries
+    match = {"route_outcome": {"$exists": True}}
+    if since:
+        match["datetime"] = {"$gte": since}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"stage": "$process_name", "model": "$model", "outcome": "$route_outcome"},
+            "calls": {"$sum": 1},
+            "cost": {"$sum": "$cost"}
+        }}
+    ]
+    rows = await cost_ai_collection.aggregate(pipeline).to_list(length=None)
+    stats = {}
+    for row in rows:
+        key = row["_id"]
+        model_stats = stats.setdefault(key["stage"], {}).setdefault(key["model"], {})
+        model_stats[key["outcome"]] = {"calls": row["calls"], "cost": row["cost"]}
+    return stats
+
+async def get_cost_breakdown_by_main_topic_id(main_topic_id: str, totals_only: bool = False, include_ids: bool = False):
+    # One aggregation for the whole course: the main topic's list topics joined to their cost entries,
+    # grouped per topic and process_name on the server. totals_only skips the line items.
+    facets = {
+        "breakdown": [
+            {"$group": {
+                "_id": {"topic_id": "$topic_id", "process_name": "$costs.process_name"},
+                "topic_name": {"$first": "$topic_name"},
+                "cost": {"$sum": "$costs.cost"},
+                "entries": {"$sum": 1}
+            }},
+            {"$sort": {"_id.topic_id": 1, "_id.process_name": 1}}
+        ],
+        "total": [{"$group": {"_id": None, "cost": {"$sum": "$costs.cost"}, "entries": {"$sum": 1}}}]
+    }
+    if not totals_only:
+        item = {"_id": 0, "topic_name": 1, "content": "$costs.content", "process_name": "$costs.process_name", "cost": "$costs.cost", "datetime": "$costs.datetime"}
+        if include_ids:
+            item.update({"topic_id": 1, "cost_id": {"$toString": "$costs._id"}})
+        facets["items"] = [{"$project": item}]
+
+    pipeline = [
+        {"$match": {"main_topic_id": main_topic_id_match(main_topic_id)}},
+        {"$project": {"topic_name": 1, "topic_id": {"$toString": "$_id"}}},
+        {"$lookup": {"from": cost_ai_collection.name, "localField": "topic_id", "foreignField": "topic_id", "as": "costs"}},
+        {"$unwind": "$costs"},
+        {"$facet": facets}
+    ]
+    result = (await list_topics_collection.aggregate(pipeline).to_list(length=1))[0]
+    total = result["total"][0] if result["total"] else {"cost": 0, "entries": 0}
+    return {
+        "total_cost": total["cost"],
+        "entries": total["entries"],
+        "breakdown": [
+            {"topic_id": row["_id"]["topic_id"], "topic_name": row["topic_name"], "process_name": row["_id"]["process_name"], "cost": row["cost"], "entries": row["entries"]}
+            for row in result["breakdown"]
+        ],
+        "items": result.get("items"),
+    }
+
 async def get_total_cost_by_topic(topic_id: str):
     pipeline = [
         {"$match": {"topic_id": topic_id}},
@@ -258,7 +426,7 @@ async def get_all_elaboration_by_main_topic_id(main_topic_id: str):
     }
 
     # Query list_topics_collection
-    list_topics_query = {"main_topic_id": main_topic_id}
+    list_topics_query = {"main_topic_id": main_topic_id_match(main_topic_id)}
     logger.info(f"Querying list_topics_collection with: {list_topics_query}")
 
     list_topics_cursor = list_topics_collection.find(list_topics_query)
@@ -299,7 +467,7 @@ async def get_all_elaboration_by_main_topic_id(main_topic_id: str):
     return main_topic['main_topic'], all_elaborations, debug_info
 
 async def get_all_points_of_discussion_by_main_topic_id(main_topic_id: str):
-    cursor = list_topics_collection.find({"main_topic_id": main_topic_id})
+    cursor = list_topics_collection.find({"main_topic_id": main_topic_id_match(main_topic_id)})
     topics = await cursor.to_list(length=None)
     
     all_points = []
@@ -307,4 +475,131 @@ async def get_all_points_of_discussion_by_main_topic_id(main_topic_id: str):
         if 'point_of_discussion' in topic:
             all_points.extend(topic['point_of_discussion'])
     
-    return all_points
\ No newline at end of file
+    return all_points
+
+
+async def mark_stage_running(point_id: str, stage: str):
+    now = datetime.utcnow()
+    await points_discussion_collection.update_one(
+        {"_id": ObjectId(point_id)},
+        {
+            "$set": {
+                f"stages.{stage}.status": "running",
+                f"stages.{stage}.started_at": now,
+                f"stages.{stage}.updated_at": now,
+                f"stages.{stage}.batch_id": None
+            },
+            "$inc": {f"stages.{stage}.attempts": 1}
+        }
+    )
+
+async def mark_stage_done(point_id: str, stage: str, content_hash: str):
+    now = datetime.utcnow()
+    await points_discussion_collection.update_one(
+        {"_id": ObjectId(point_id)},
+        {"$set": {
+            f"stages.{stage}.status": "done",
+            f"stages.{stage}.content_hash": content_hash,
+            f"stages.{stage}.last_error": None,
+            f"stages.{stage}.finished_at": now,
+            f"stages.{stage}.updated_at": now
+        }}
+    )
+
+async def mark_stage_failed(point_id: str, stage: str, error: str, status: str = "failed"):
+    # status="pending" records why a stage could not start yet (e.g. missing upstream content)
+    now = datetime.utcnow()
+    await points_discussion_collection.update_one(
+        {"_id": ObjectId(point_id)},
+        {"$set": {
+            f"stages.{stage}.status": status,
+            f"stages.{stage}.last_error": error,
+            f"stages.{stage}.finished_at": now,
+            f"stages.{stage}.updated_at": now
+        }}
+    )
+
+async def get_point_stage_states_by_topic_id(topic_id):
+    cursor = points_discussion_collection.find({"topic_name_id": ObjectId(topic_id)}, {"stages": 1})
+    points = await cursor.to_list(length=None)
+    return {str(point["_id"]): point.get("stages", {}) for point in points}
+
+def incomplete_stage_query(stage: str, stale_before: datetime):
+    # Points created before stage tracking have no state and count as pending. A stage held by a
+    # batch is only taken over once the batch window has passed, not after stale_before.
+    batch_stale_before = datetime.utcnow() - timedelta(seconds=BATCH_STAGE_STALE_SECONDS)
+    return {"$or": [
+        {f"stages.{stage}.status": {"$in": [None, "pending", "failed"]}},
+        {f"stages.{stage}.status": "running", f"stages.{stage}.batch_id": None, f"stages.{stage}.started_at": {"$lt": stale_before}},
+        {f"stages.{stage}.status": "running", f"stages.{stage}.batch_id": {"$ne": None}, f"stages.{stage}.started_at": {"$lt": batch_stale_before}}
+    ]}
+
+async def get_incomplete_points_by_topic_ids(topic_ids, stage: str, stale_before: datetime):
+    cursor = points_discussion_collection.find(
+        {"topic_name_id": {"$in": [ObjectId(topic_id) for topic_id in topic_ids]}, **incomplete_stage_query(stage, stale_before)},
+        {"_id": 1, "point_of_discussion": 1, "topic_name_id": 1}
+    )
+    points = await cursor.to_list(length=None)
+    return [{"id": str(point["_id"]), "point": point["point_of_discussion"], "topic_id": str(point["topic_name_id"])} for point in points]
+
+async def get_batch_candidate_points(topic_ids, stage: str, required_field: str, output_field: str, stale_before: datetime):
+    # Points whose stage is incomplete, whose input exists and whose output has not been written yet
+    cursor = points_discussion_collection.find(
+        {
+            "topic_name_id": {"$in": [ObjectId(topic_id) for topic_id in topic_ids]},
+            required_field: {"$nin": [None, ""]},
+            output_field: {"$in": [None, ""]},
+            **incomplete_stage_query(stage, stale_before)
+        },
+        {"point_of_discussion": 1, "topic_name_id": 1, "elaboration": 1, "prompting": 1, "handout": 1}
+    )
+    return await cursor.to_list(length=None)
+
+async def claim_points_for_batch(point_ids, stage: str, batch_id: str, stale_before: datetime):
+    # Marks the stage running under batch_id for the points nobody else is generating, and
+    # returns the ids that were claimed
+    now = datetime.utcnow()
+    object_ids = [ObjectId(str(point_id)) for point_id in point_ids]
+    await points_discussion_collection.update_many(
+        {"_id": {"$in": object_ids}, **incomplete_stage_query(stage, stale_before)},
+        {
+            "$set": {
+                f"stages.{stage}.status": "running",
+                f"stages.{stage}.batch_id": batch_id,
+                f"stages.{stage}.started_at": now,
+                f"stages.{stage}.updated_at": now
+            },
+            "$inc": {f"stages.{stage}.attempts": 1}
+        }
+    )
+    cursor = points_discussion_collection.find({"_id": {"$in": object_ids}, f"stages.{stage}.batch_id": batch_id}, {"_id": 1})
+    return {str(point["_id"]) for point in await cursor.to_list(length=None)}
+
+async def set_stage_batch_id(point_ids, stage: str, old_batch_id: str, batch_id):
+    # batch_id None releases the points back to pending
+    update = {f"stages.{stage}.batch_id": batch_id, f"stages.{stage}.updated_at": datetime.utcnow()}
+    if batch_id is None:
+        update[f"stages.{stage}.status"] = "pending"
+    await points_discussion_collection.update_many(
+        {"_id": {"$in": [ObjectId(str(point_id)) for point_id in point_ids]}, f"stages.{stage}.batch_id": old_batch_id, f"stages.{stage}.status": "running"},
+        {"$set": update}
+    )
+
+async def get_points_discussion_by_ids(point_ids, projection: dict = None):
+    cursor = points_discussion_collection.find({"_id": {"$in": [ObjectId(point_id) for point_id in point_ids]}}, projection)
+    return await cursor.to_list(length=None)
+
+async def get_stage_progress_by_topic_ids(topic_ids):
+    pipeline = [
+        {"$match": {"topic_name_id": {"$in": [ObjectId(topic_id) for topic_id in topic_ids]}}},
+        {"$project": {"stages": [
+            {"stage": stage, "status": {"$ifNull": [f"$stages.{stage}.status", "pending"]}} for stage in POINT_STAGES
+        ]}},
+        {"$unwind": "$stages"},
+        {"$group": {"_id": {"stage": "$stages.stage", "status": "$stages.status"}, "count": {"$sum": 1}}}
+    ]
+    rows = await points_discussion_collection.aggregate(pipeline).to_list(length=None)
+    progress = {stage: {status: 0 for status in STAGE_STATUSES} for stage in POINT_STAGES}
+    for row in rows:
+        progress[row["_id"]["stage"]][row["_id"]["status"]] = row["count"]
+    return progress
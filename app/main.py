@@ -6,6 +6,12 @@ from app.routes.openai_routes import router as openai_router
 from app.routes.document_routes import router as document_routes
 from app.routes.rag_routes import router as rag_routes
 from app.routes.multimedia_routes import router as multimedia_routes
+from app.routes.pipeline_routes import router as pipeline_routes
+from app.routes.job_routes import router as job_routes
+from app.routes.metrics_routes import router as metrics_routes
+from app.services.llm_gateway import close_client
+from app.services.prompt_registry import prompt_registry
+from app.db.indexes import ensure_indexes
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -36,6 +42,25 @@ app.include_router(openai_router, prefix="/api", tags=["openai"])
 app.include_router(document_routes, prefix="/api", tags=["documents"])
 app.include_router(rag_routes, prefix="/api", tags=["RAG"])
 app.include_router(multimedia_routes, prefix="/api", tags=["multimedia"])
+app.include_router(pipeline_routes, prefix="/api", tags=["pipeline"])
+app.include_router(job_routes, prefix="/api", tags=["jobs"])
+app.include_router(metrics_routes, prefix="/api", tags=["metrics"])
+
+@app.on_event("startup")
+async def startup_event():
+    # Load and pre-compile every prompt template once
+    prompt_registry.load_all()
+
+    # Every index from the registry in app/db/indexes.py; existing ones are left as they are
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logging.error(f"Error creating indexes: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Release the pooled OpenAI connections
+    await close_client()
 
 @app.get("/")
 async def read_root():
@@ -0,0 +1,37 @@
+# app/routes/job_routes.py
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from bson import ObjectId
+from app.services.job_queue import get_job, list_jobs, retry_job
+from app.db.operations import convert_object_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/jobs")
+async def get_jobs(status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 50):
+    jobs = await list_jobs(status, job_type, min(limit, 200))
+    return {"jobs": convert_object_id(jobs)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job_id")
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return convert_object_id(job)
+
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_failed_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job_id")
+    if not await retry_job(job_id):
+        raise HTTPException(status_code=409, detail="Only failed jobs can be retried")
+    logger.info(f"Requeued failed job {job_id}")
+    return {"message": "Job requeued", "job_id": job_id}
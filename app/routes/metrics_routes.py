@@ -0,0 +1,45 @@
+# app/routes/metrics_routes.py
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter
+from app.services.resilience import upstream_metrics
+from app.services.rate_limiter import rate_limit_stats
+from app.services.translation_memory import translation_memory_stats
+from app.db.operations import get_prompt_cache_stats_by_stage, get_model_route_stats_by_stage
+from app.db.indexes import index_report
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/metrics/upstreams")
+async def get_upstream_metrics():
+    # Per upstream retry counts, breaker state and latency percentiles, plus the OpenAI rate governor
+    return {"upstreams": upstream_metrics(), "rate_limits": rate_limit_stats()}
+
+
+@router.get("/metrics/prompt-cache")
+async def get_prompt_cache_metrics(hours: int = 24, topic_id: Optional[str] = None):
+    # cached_tokens reported by OpenAI per stage, from the cost entries
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return {"since": since, "stages": await get_prompt_cache_stats_by_stage(since=since, topic_id=topic_id)}
+
+
+@router.get("/metrics/model-routing")
+async def get_model_routing_metrics(hours: int = 24):
+    # Accepted, escalated and exhausted attempts per stage and model, with their cost
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return {"since": since, "stages": await get_model_route_stats_by_stage(since=since)}
+
+
+@router.get("/metrics/translation-memory")
+async def get_translation_memory_metrics():
+    return translation_memory_stats()
+
+
+@router.get("/metrics/indexes")
+async def get_index_metrics():
+    # Declared indexes missing on the server, and server indexes that are undeclared or never used
+    return await index_report()
@@ -1,16 +1,23 @@
 # fastapi app/routes/openai_routes.py
 import json
+import time
 import asyncio
 import random
 import logging
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from functools import partial
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 from bson import ObjectId
-from app.services.openai_service import create_listof_topic, translate_points, elaborate_discussionpoint, elaborate_discussionpoint,  generate_prompting, generate_handout, generate_misc_points, generate_quiz, generate_handout_translation, generate_topic_imageicon, generate_analogy, translate_topic, get_all_cost, do_analisis_kebutuhan
-from app.db.operations import get_all_main_topics, get_main_topic_by_id, get_list_topics_by_main_topic_id, get_point_of_discussion, update_prompting, update_handout, update_misc_points, update_quiz, get_points_discussion_by_topic_id, get_points_discussion_ids_by_topic_id, get_topic_id_by_point_id, update_translated_handout, update_topic_analogy, get_topic_by_id, get_all_elaboration_by_main_topic_id, get_all_points_of_discussion_by_main_topic_id
+from app.services.concurrency import run_bounded, iter_bounded
+from app.services.job_queue import enqueue_job
+from app.services.token_accounting import start_usage_tracking
+from app.services.single_flight import stage_lease, wait_for_release, lease_key
+from app.services.stage_service import record_stage_result, process_point_prompting, process_point_handout, process_point_misc, process_point_quiz, process_point_translation
+from app.services.openai_service import stream_handout, create_listof_topic, translate_points, elaborate_discussionpoint, stream_elaborate_discussionpoint,  generate_prompting, generate_handout, generate_misc_points, generate_quiz, generate_handout_translation, generate_topic_imageicon, generate_analogy, translate_topic, get_all_cost, do_analisis_kebutuhan
+from app.db.operations import get_all_main_topics, get_main_topic_by_id, get_list_topics_by_main_topic_id, get_point_of_discussion, update_prompting, update_handout, update_misc_points, update_quiz, get_points_discussion_by_topic_id, get_points_discussion_ids_by_topic_id, get_topic_id_by_point_id, update_translated_handout, update_topic_analogy, get_topic_by_id, get_all_elaboration_by_main_topic_id, get_all_points_of_discussion_by_main_topic_id, mark_stage_running, mark_stage_failed
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +35,46 @@ def convert_objectid_to_str(obj):
         return str(obj)
     return obj
 
+async def run_point_with_metrics(worker, point):
+    # Runs one point in its own task context so token usage is attributed to it
+    usage = start_usage_tracking()
+    started = time.monotonic()
+    result = await worker(point)
+    if result is None:
+        return None
+    return {**result, "latency_ms": round((time.monotonic() - started) * 1000), "tokens": usage}
+
+async def stream_topic_stage(points, worker, concurrency: Optional[int], stage_label: str):
+    total = len(points)
+    results = [None] * total
+    completed = 0
+    async for index, result in iter_bounded(points, partial(run_point_with_metrics, worker), concurrency):
+        completed += 1
+        results[index] = result
+        yield {
+            "event": "progress",
+            "data": json.dumps({
+                "progress": (completed / total) * 100,
+                "completed": completed,
+                "total": total,
+                "point_id": points[index]['id'],
+                "result": result
+            })
+        }
+    yield {
+        "event": "complete",
+        "data": json.dumps({
+            "message": f"{stage_label} generation completed for {total} points of discussion",
+            "results": [result for result in results if result is not None]
+        })
+    }
+
+async def get_topic_points_or_404(topic_id: str):
+    points = await get_points_discussion_ids_by_topic_id(topic_id)
+    if not points:
+        raise HTTPException(status_code=404, detail="No points of discussion found for this topic")
+    return points
+
 @router.get("/topic/{topic_id}")
 async def get_topic(topic_id: str):
     topic = await get_topic_by_id(topic_id)
@@ -61,17 +108,9 @@ async def generate_list_of_topics(request: TopicRequest):
 @router.get("/main-topics/")
 async def get_main_topics():
     try:
+        # total_cost comes from the materialized cost rollup, in the same projected query
         main_topics = await get_all_main_topics()
-        converted_topics = convert_objectid_to_str(main_topics)
-        
-        for topic in converted_topics:
-            main_topic, all_costs, debug_info = await get_all_cost(str(topic['_id']))
-            total_cost = sum(cost['cost'] for cost in all_costs)
-            topic['total_cost'] = total_cost
-            
-            logging.info(f"Topic: {topic.get('main_topic')}, Image Link: {topic.get('link_image_icon')}, Total Cost: {topic.get('total_cost')}")
-        
-        return converted_topics
+        return convert_objectid_to_str(main_topics)
     except Exception as e:
         logging.error(f"Error in get_main_topics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -105,7 +144,7 @@ class TranslationRequest(BaseModel):
 @router.post("/translate-points")
 async def translate_points_of_discussion(request: TranslationRequest):
     try:
-        translated_points = translate_points(request.points)
+        translated_points = await translate_points(request.points)
         return {"translated_points": translated_points}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))    
@@ -126,17 +165,34 @@ async def elaborate_points_of_discussion(request: ElaborationRequest):
     except Exception as e:
         logger.error(f"Error in elaboration: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/elaborate-points/stream")
+async def stream_elaborate_points_route(request: ElaborationRequest):
+    return EventSourceResponse(stream_elaboration_events(request))
+
+async def stream_elaboration_events(request: ElaborationRequest):
+    # One "point" event per subtopic as soon as it is stored, so the client can start prompting it
+    try:
+        async for event in stream_elaborate_discussionpoint(request.topic, request.objective, request.points_of_discussion):
+            if event["type"] == "point":
+                yield {"event": "point", "data": json.dumps({"point_id": event["point_id"], "subtopic": event["subtopic"], "elaboration": event["elaboration"]})}
+            else:
+                yield {"event": "complete", "data": json.dumps({"elaborated_points": event["points"], "usage": event["usage"], "cost": event["cost"]})}
+    except Exception as e:
+        logger.error(f"Error in streamed elaboration: {str(e)}", exc_info=True)
+        yield {"event": "error", "data": json.dumps({"detail": str(e)})}
     
 
 class PromptingRequest(BaseModel):
     point_of_discussion_id: str
+    bypass_cache: bool = False
 
 # Testing with Insomnia
 @router.post("/generate-prompting")
 async def generate_prompting_route(request: PromptingRequest):
     logger.debug(f"Received request to generate prompting for point of discussion: {request.point_of_discussion_id}")
     try:
-        point = get_point_of_discussion(request.point_of_discussion_id)
+        point = await get_point_of_discussion(request.point_of_discussion_id)
         if not point:
             raise HTTPException(status_code=404, detail="Point of discussion not found")
         
@@ -145,11 +201,19 @@ async def generate_prompting_route(request: PromptingRequest):
             logger.info(f"Prompting already exists for point of discussion: {request.point_of_discussion_id}")
             return {"message": "Prompting already exists", "prompting": point['prompting']}
         
-        # If prompting doesn't exist, generate a new one
-        prompting = generate_prompting(point['elaboration'], point['point_of_discussion'])
-        update_prompting(request.point_of_discussion_id, prompting)
-        
-        return {"message": "Prompting generated and stored successfully", "prompting": prompting}
+        # If prompting doesn't exist, generate a new one; concurrent requests share one generation
+        result = await process_point_prompting({"id": request.point_of_discussion_id}, bypass_cache=request.bypass_cache)
+        if result and result["status"] == "batched":
+            raise HTTPException(status_code=409, detail=result["reason"])
+        if not result or result["status"] == "failed":
+            raise HTTPException(status_code=500, detail="Prompting generation failed")
+        point = await get_point_of_discussion(request.point_of_discussion_id)
+        if not point or not point.get('prompting'):
+            raise HTTPException(status_code=500, detail="Prompting generation did not store a prompting")
+        
+        return {"message": "Prompting generated and stored successfully", "prompting": point['prompting']}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in prompting generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -159,7 +223,7 @@ async def generate_prompting_route(request: PromptingRequest):
 async def generate_handout_route(request: PromptingRequest):
     logger.debug(f"Received request to generate handout for point of discussion: {request.point_of_discussion_id}")
     try:
-        point = get_point_of_discussion(request.point_of_discussion_id)
+        point = await get_point_of_discussion(request.point_of_discussion_id)
         if not point:
             raise HTTPException(status_code=404, detail="Point of discussion not found")
         
@@ -172,83 +236,153 @@ async def generate_handout_route(request: PromptingRequest):
         if not point.get('prompting'):
             raise HTTPException(status_code=400, detail="Prompting not found. Please generate prompting first.")
         
-        # Generate handout
-        handout = generate_handout(point['point_of_discussion'], point['prompting'])
-        update_handout(request.point_of_discussion_id, handout)
-        
-        return {"message": "Handout generated and stored successfully", "handout": handout}
+        # Generate handout; concurrent requests share one generation
+        result = await process_point_handout({"id": request.point_of_discussion_id}, bypass_cache=request.bypass_cache)
+        if result["status"] == "batched":
+            raise HTTPException(status_code=409, detail=result["reason"])
+        if result["status"] not in ("generated", "existing"):
+            raise HTTPException(status_code=500, detail=result.get("reason") or "Handout generation failed")
+        point = await get_point_of_discussion(request.point_of_discussion_id)
+        if not point or not point.get('handout'):
+            raise HTTPException(status_code=500, detail="Handout generation did not store a handout")
+        
+        return {"message": "Handout generated and stored successfully", "handout": point['handout']}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in handout generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))    
 
+@router.post("/generate-handout/stream")
+async def stream_handout_route(request: PromptingRequest):
+    logger.debug(f"Received request to stream handout for point of discussion: {request.point_of_discussion_id}")
+    point = await get_point_of_discussion(request.point_of_discussion_id)
+    if not point:
+        raise HTTPException(status_code=404, detail="Point of discussion not found")
+
+    if point.get('handout'):
+        logger.info(f"Handout already exists for point of discussion: {request.point_of_discussion_id}")
+        return EventSourceResponse(existing_handout_events(point['handout']))
+
+    if not point.get('prompting'):
+        raise HTTPException(status_code=400, detail="Prompting not found. Please generate prompting first.")
+
+    return EventSourceResponse(stream_handout_events(request.point_of_discussion_id, point, request.bypass_cache))
+
+async def existing_handout_events(handout: str):
+    yield {"event": "complete", "data": json.dumps({"message": "Handout already exists", "handout": handout})}
+
+async def stream_handout_events(point_id: str, point: dict, bypass_cache: bool):
+    try:
+        async with stage_lease(point_id, "handout") as acquired:
+            if acquired:
+                async for event in generate_handout_events(point_id, point, bypass_cache):
+                    yield event
+                return
+
+        # Another request is already generating this handout; wait for it instead of paying twice
+        yield {"event": "waiting", "data": json.dumps({"message": "Handout is being generated by another request"})}
+        await wait_for_release(lease_key(point_id, "handout"))
+        point = await get_point_of_discussion(point_id)
+        if point and point.get('handout'):
+            yield {"event": "complete", "data": json.dumps({"message": "Handout generated by another request", "handout": point['handout']})}
+        else:
+            yield {"event": "error", "data": json.dumps({"detail": "Handout generation by another request did not complete"})}
+    except Exception as e:
+        logger.error(f"Error in streamed handout generation for point {point_id}: {str(e)}", exc_info=True)
+        yield {"event": "error", "data": json.dumps({"detail": str(e)})}
+
+async def generate_handout_events(point_id: str, point: dict, bypass_cache: bool):
+    await mark_stage_running(point_id, "handout")
+    try:
+        async for event in stream_handout(point['point_of_discussion'], point['prompting'], str(point['topic_name_id']), bypass_cache=bypass_cache):
+            if event["type"] == "delta":
+                yield {"event": "delta", "data": json.dumps({"content": event["content"]})}
+            else:
+                # Persist only once the whole completion (and its usage) is in
+                await update_handout(point_id, event["content"])
+                await record_stage_result(point_id, "handout", {"point_id": point_id, "status": "generated"})
+                logger.info(f"Streamed and stored handout for point: {point_id}")
+                yield {
+                    "event": "complete",
+                    "data": json.dumps({
+                        "message": "Handout generated and stored successfully",
+                        "handout": event["content"],
+                        "usage": event["usage"],
+                        "cost": event["cost"]
+                    })
+                }
+    except Exception as e:
+        await mark_stage_failed(point_id, "handout", str(e))
+        raise
+
 @router.post("/generate-misc-points")
-async def generate_misc_points_route(request: PromptingRequest, background_tasks: BackgroundTasks):
+async def generate_misc_points_route(request: PromptingRequest):
     logger.debug(f"Received request to generate miscellaneous points for point of discussion: {request.point_of_discussion_id}")
     try:
-        point = get_point_of_discussion(request.point_of_discussion_id)
+        point = await get_point_of_discussion(request.point_of_discussion_id)
         if not point:
             raise HTTPException(status_code=404, detail="Point of discussion not found")
         
         if not point.get('handout'):
             raise HTTPException(status_code=400, detail="Handout not found. Please generate handout first.")
         
-        # Start the generation process in the background
-        background_tasks.add_task(process_misc_points, request.point_of_discussion_id, point['point_of_discussion'], point['handout'])
+        # Queue the generation for the worker pool
+        job_id = await enqueue_job("misc_points", {"point_id": request.point_of_discussion_id, "bypass_cache": request.bypass_cache})
         
-        return {"message": "Miscellaneous points generation started in the background"}
+        return {"message": "Miscellaneous points generation queued", "job_id": job_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in miscellaneous points generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_misc_points(point_id: str, point_of_discussion: str, handout: str):
-    try:
-        misc_points = generate_misc_points(point_of_discussion, handout)
-        logger.info(f"Generated misc points for point of discussion: {point_id}")
-        logger.debug(f"Misc points: {misc_points}")
-        update_misc_points(point_id, misc_points)
-        logger.info(f"Updated database with misc points for point of discussion: {point_id}")
-    except Exception as e:
-        logger.error(f"Error in background misc points generation: {str(e)}", exc_info=True)
-
 @router.post("/generate-quiz")
-async def generate_quiz_route(request: PromptingRequest, background_tasks: BackgroundTasks):
+async def generate_quiz_route(request: PromptingRequest):
     logger.debug(f"Received request to generate quiz for point of discussion: {request.point_of_discussion_id}")
     try:
-        point = get_point_of_discussion(request.point_of_discussion_id)
+        point = await get_point_of_discussion(request.point_of_discussion_id)
         if not point:
             raise HTTPException(status_code=404, detail="Point of discussion not found")
         
         if not point.get('handout'):
             raise HTTPException(status_code=400, detail="Handout not found. Please generate handout first.")
         
-        # Start the generation process in the background
-        background_tasks.add_task(process_quiz, request.point_of_discussion_id, point['point_of_discussion'], point['handout'])
+        # Queue the generation for the worker pool
+        job_id = await enqueue_job("quiz", {"point_id": request.point_of_discussion_id, "bypass_cache": request.bypass_cache})
         
-        return {"message": "Quiz generation started in the background"}
+        return {"message": "Quiz generation queued", "job_id": job_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in quiz generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_quiz(point_id: str, point_of_discussion: str, handout: str):
+@router.post("/generate-misc-quiz")
+async def generate_misc_quiz_route(request: PromptingRequest):
+    logger.debug(f"Received request to generate misc points and quiz for point of discussion: {request.point_of_discussion_id}")
     try:
-        quiz_content = generate_quiz(point_of_discussion, handout)
-        logger.info(f"Generated quiz for point of discussion: {point_id}")
-        logger.debug(f"Quiz content length: {len(quiz_content)}")
-
-        if not quiz_content:
-            logger.warning(f"Generated quiz content is empty for point of discussion: {point_id}")
-            return
-
-        try:
-            update_quiz(point_id, quiz_content)
-            logger.info(f"Updated database with quiz for point of discussion: {point_id}")
-        except Exception as db_error:
-            logger.error(f"Error updating database with quiz for point of discussion {point_id}: {str(db_error)}", exc_info=True)
+        point = await get_point_of_discussion(request.point_of_discussion_id)
+        if not point:
+            raise HTTPException(status_code=404, detail="Point of discussion not found")
+        
+        if not point.get('handout'):
+            raise HTTPException(status_code=400, detail="Handout not found. Please generate handout first.")
+        
+        # One generation call for both outputs, so the handout is only sent once
+        job_id = await enqueue_job("misc_quiz", {"point_id": request.point_of_discussion_id, "bypass_cache": request.bypass_cache})
+        
+        return {"message": "Miscellaneous points and quiz generation queued", "job_id": job_id}
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in background quiz generation for point of discussion {point_id}: {str(e)}", exc_info=True)
+        logger.error(f"Error in misc points and quiz generation: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
 class TopicPromptingRequest(BaseModel):
     topic_id: str
+    concurrency: Optional[int] = None
+    bypass_cache: bool = False
 
 @router.post("/generate-topic-prompting")
 async def generate_topic_prompting_route(topic_request: TopicPromptingRequest):
@@ -258,48 +392,28 @@ async def generate_topic_prompting_route(topic_request: TopicPromptingRequest):
         if not points:
             raise HTTPException(status_code=404, detail="No points of discussion found for this topic")
         
-        results = await process_topic_prompting(points)
+        results = await process_topic_prompting(points, topic_request.concurrency, topic_request.bypass_cache)
         
         return {"message": f"Prompting generation completed for {len(points)} points of discussion", "results": results}
     except Exception as e:
         logger.error(f"Error in topic prompting generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_topic_prompting(points):
-    results = []
-    for point in points:
-        point_data = await get_point_of_discussion(point['id'])
-        if not point_data:
-            logger.warning(f"Point data not found for id: {point['id']}")
-            continue
-        
-        topic_id = await get_topic_id_by_point_id(point['id'])
-        if not topic_id:
-            logger.warning(f"Topic ID not found for point id: {point['id']}")
-            continue
-        
-        if not point_data.get('prompting'):
-            prompting = await generate_prompting(
-                point_data['elaboration'],
-                point_data['point_of_discussion'],
-                topic_id
-            )
-            if prompting:
-                await update_prompting(point['id'], prompting)
-                logger.info(f"Generated prompting for point: {point['id']}")
-                results.append({"point_id": point['id'], "status": "generated"})
-            else:
-                logger.warning(f"No prompting generated for point: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed"})
-        else:
-            logger.info(f"Prompting already exists for point: {point['id']}")
-            results.append({"point_id": point['id'], "status": "existing"})
-    
-    return results
+@router.post("/generate-topic-prompting/stream")
+async def stream_topic_prompting_route(topic_request: TopicPromptingRequest):
+    points = await get_topic_points_or_404(topic_request.topic_id)
+    worker = partial(process_point_prompting, bypass_cache=topic_request.bypass_cache)
+    return EventSourceResponse(stream_topic_stage(points, worker, topic_request.concurrency, "Prompting"))
+
+async def process_topic_prompting(points, concurrency: Optional[int] = None, bypass_cache: bool = False):
+    results = await run_bounded(points, partial(process_point_prompting, bypass_cache=bypass_cache), concurrency)
+    return [result for result in results if result is not None]
 
 
 class TopicHandoutRequest(BaseModel):
     topic_id: str
+    concurrency: Optional[int] = None
+    bypass_cache: bool = False
 
 @router.post("/generate-topic-handout")
 async def generate_topic_handout_route(request: TopicHandoutRequest):
@@ -309,41 +423,21 @@ async def generate_topic_handout_route(request: TopicHandoutRequest):
         if not points:
             raise HTTPException(status_code=404, detail="No points of discussion found for this topic")
         
-        results = await process_topic_handout(points)
+        results = await process_topic_handout(points, request.concurrency, request.bypass_cache)
         
         return {"message": f"Handout generation completed for {len(points)} points of discussion", "results": results}
     except Exception as e:
         logger.error(f"Error in topic handout generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_topic_handout(points):
-    results = []
-    for point in points:
-        point_data = await get_point_of_discussion(point['id'])
-        if not point_data:
-            logger.warning(f"Point data not found for id: {point['id']}")
-            results.append({"point_id": point['id'], "status": "failed", "reason": "Point data not found"})
-            continue
-        
-        if not point_data.get('handout'):
-            if not point_data.get('prompting'):
-                logger.warning(f"Prompting not found for point: {point['id']}. Skipping handout generation.")
-                results.append({"point_id": point['id'], "status": "skipped", "reason": "Prompting not found"})
-                continue
-            
-            handout = await generate_handout(point_data['point_of_discussion'], point_data['prompting'], str(point_data['topic_name_id']))
-            if handout:
-                await update_handout(point['id'], handout)
-                logger.info(f"Generated handout for point: {point['id']}")
-                results.append({"point_id": point['id'], "status": "generated"})
-            else:
-                logger.warning(f"Failed to generate handout for point: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Handout generation failed"})
-        else:
-            logger.info(f"Handout already exists for point: {point['id']}")
-            results.append({"point_id": point['id'], "status": "existing"})
-    
-    return results
+@router.post("/generate-topic-handout/stream")
+async def stream_topic_handout_route(request: TopicHandoutRequest):
+    points = await get_topic_points_or_404(request.topic_id)
+    worker = partial(process_point_handout, bypass_cache=request.bypass_cache)
+    return EventSourceResponse(stream_topic_stage(points, worker, request.concurrency, "Handout"))
+
+async def process_topic_handout(points, concurrency: Optional[int] = None, bypass_cache: bool = False):
+    return await run_bounded(points, partial(process_point_handout, bypass_cache=bypass_cache), concurrency)
 
 
 
@@ -374,6 +468,8 @@ async def mock_process_topic_prompting(topic_id: str):
 
 class TopicMiscRequest(BaseModel):
     topic_id: str
+    concurrency: Optional[int] = None
+    bypass_cache: bool = False
 
 @router.post("/generate-topic-misc")
 async def generate_topic_misc_route(request: TopicMiscRequest):
@@ -384,44 +480,27 @@ async def generate_topic_misc_route(request: TopicMiscRequest):
         if not points:
             raise HTTPException(status_code=404, detail="No points of discussion found for this topic")
         
-        results = await process_topic_misc(points)
+        results = await process_topic_misc(points, request.concurrency, request.bypass_cache)
         
         return {"message": f"Misc points generation completed for {len(points)} points of discussion", "results": results}
     except Exception as e:
         logger.error(f"Error in topic misc points generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_topic_misc(points):
-    results = []
-    for point in points:
-        try:
-            point_data = await get_point_of_discussion(point['id'])
-            if not point_data:
-                logger.warning(f"Point data not found for id: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Point data not found"})
-                continue
-
-            if not point_data.get('handout'):
-                logger.warning(f"Handout not found for point: {point['id']}. Skipping misc points generation.")
-                results.append({"point_id": point['id'], "status": "skipped", "reason": "Handout not found"})
-                continue
-
-            misc_points = await generate_misc_points(point_data['point_of_discussion'], point_data['handout'], str(point_data['topic_name_id']))
-            if misc_points:
-                await update_misc_points(point['id'], misc_points)
-                logger.info(f"Generated misc points for point of discussion: {point['id']}")
-                results.append({"point_id": point['id'], "status": "generated"})
-            else:
-                logger.warning(f"Failed to generate misc points for point: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Misc points generation failed"})
-        except Exception as e:
-            logger.error(f"Error generating misc points for point {point['id']}: {str(e)}", exc_info=True)
-            results.append({"point_id": point['id'], "status": "failed", "reason": str(e)})
-    
-    return results
+@router.post("/generate-topic-misc/stream")
+async def stream_topic_misc_route(request: TopicMiscRequest):
+    points = await get_topic_points_or_404(request.topic_id)
+    worker = partial(process_point_misc, bypass_cache=request.bypass_cache)
+    return EventSourceResponse(stream_topic_stage(points, worker, request.concurrency, "Misc points"))
+
+async def process_topic_misc(points, concurrency: Optional[int] = None, bypass_cache: bool = False):
+    return await run_bounded(points, partial(process_point_misc, bypass_cache=bypass_cache), concurrency)
+
 
 class TopicQuizRequest(BaseModel):
     topic_id: str
+    concurrency: Optional[int] = None
+    bypass_cache: bool = False
 
 @router.post("/generate-topic-quiz")
 async def generate_topic_quiz_route(request: TopicQuizRequest):
@@ -431,44 +510,26 @@ async def generate_topic_quiz_route(request: TopicQuizRequest):
         if not points:
             raise HTTPException(status_code=404, detail="No points of discussion found for this topic")
         
-        results = await process_topic_quiz(points)
+        results = await process_topic_quiz(points, request.concurrency, request.bypass_cache)
         
         return {"message": f"Quiz generation completed for {len(points)} points of discussion", "results": results}
     except Exception as e:
         logger.error(f"Error in topic quiz generation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_topic_quiz(points):
-    results = []
-    for point in points:
-        try:
-            point_data = await get_point_of_discussion(point['id'])
-            if not point_data:
-                logger.warning(f"Point data not found for id: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Point data not found"})
-                continue
-
-            if not point_data.get('handout'):
-                logger.warning(f"Handout not found for point: {point['id']}. Skipping quiz generation.")
-                results.append({"point_id": point['id'], "status": "skipped", "reason": "Handout not found"})
-                continue
-
-            quiz_content = await generate_quiz(point_data['point_of_discussion'], point_data['handout'], str(point_data['topic_name_id']))
-            if quiz_content:
-                await update_quiz(point['id'], quiz_content)
-                logger.info(f"Generated and stored quiz for point of discussion: {point['id']}")
-                results.append({"point_id": point['id'], "status": "generated"})
-            else:
-                logger.warning(f"Generated quiz content is empty for point of discussion: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Empty quiz content"})
-        except Exception as e:
-            logger.error(f"Error generating quiz for point {point['id']}: {str(e)}", exc_info=True)
-            results.append({"point_id": point['id'], "status": "failed", "reason": str(e)})
-    
-    return results
+@router.post("/generate-topic-quiz/stream")
+async def stream_topic_quiz_route(request: TopicQuizRequest):
+    points = await get_topic_points_or_404(request.topic_id)
+    worker = partial(process_point_quiz, bypass_cache=request.bypass_cache)
+    return EventSourceResponse(stream_topic_stage(points, worker, request.concurrency, "Quiz"))
+
+async def process_topic_quiz(points, concurrency: Optional[int] = None, bypass_cache: bool = False):
+    return await run_bounded(points, partial(process_point_quiz, bypass_cache=bypass_cache), concurrency)
+
 
 class TranslateHandoutRequest(BaseModel):
     topic_id: str
+    concurrency: Optional[int] = None
 
 @router.post("/translate-handout")
 async def translate_handout_route(request: TranslateHandoutRequest):
@@ -478,41 +539,15 @@ async def translate_handout_route(request: TranslateHandoutRequest):
         if not points:
             raise HTTPException(status_code=404, detail="No points of discussion found for this topic")
         
-        results = await process_handout_translation(points)
+        results = await process_handout_translation(points, request.concurrency)
         
         return {"message": f"Handout translation completed for {len(points)} points of discussion", "results": results}
     except Exception as e:
         logger.error(f"Error in handout translation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_handout_translation(points):
-    results = []
-    for point in points:
-        try:
-            point_data = await get_point_of_discussion(point['id'])
-            if not point_data:
-                logger.warning(f"Point data not found for id: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Point data not found"})
-                continue
-
-            if not point_data.get('handout'):
-                logger.warning(f"Handout not found for point: {point['id']}. Skipping translation.")
-                results.append({"point_id": point['id'], "status": "skipped", "reason": "Handout not found"})
-                continue
-
-            translated_handout = generate_handout_translation(point_data['handout'])
-            if translated_handout:
-                await update_translated_handout(point['id'], translated_handout)
-                logger.info(f"Generated and stored translated handout for point of discussion: {point['id']}")
-                results.append({"point_id": point['id'], "status": "translated"})
-            else:
-                logger.warning(f"Generated translated handout is empty for point of discussion: {point['id']}")
-                results.append({"point_id": point['id'], "status": "failed", "reason": "Empty translated handout"})
-        except Exception as e:
-            logger.error(f"Error translating handout for point {point['id']}: {str(e)}", exc_info=True)
-            results.append({"point_id": point['id'], "status": "failed", "reason": str(e)})
-    
-    return results
+async def process_handout_translation(points, concurrency: Optional[int] = None):
+    return await run_bounded(points, process_point_translation, concurrency)
 
 
 class AnalogyRequest(BaseModel):
@@ -531,7 +566,7 @@ async def generate_topic_analogy(request: AnalogyRequest):
         points_text = "\n".join([point['point_of_discussion'] for point in points_discussion])
         
         # Generate the analogy
-        analogy = generate_analogy(points_text)
+        analogy = await generate_analogy(points_text, request.topic_id)
         
         # Store the analogy in the database
         updated = await update_topic_analogy(request.topic_id, analogy)
@@ -562,23 +597,20 @@ async def generate_image_route(request: TopicImageRequest):
 
 class CostRequest(BaseModel):
     main_topic_id: str
+    # Totals and the per topic/process breakdown only, without the line items
+    totals_only: bool = False
+    debug: bool = False
 
 @router.post("/findout-cost")
 async def findout_cost(request: CostRequest):
     try:
-        main_topic, all_costs, debug_info = await get_all_cost(request.main_topic_id)
-        if not main_topic:
+        costs = await get_all_cost(request.main_topic_id, totals_only=request.totals_only, include_debug=request.debug)
+        if not costs:
             raise HTTPException(status_code=404, detail="Main topic not found")
         
-        # Calculate the total cost
-        total_cost = sum(cost['cost'] for cost in all_costs)
-        
-        return {
-            "main_topic": main_topic,
-            "costs": all_costs,
-            "debug_info": debug_info,
-            "total_cost": total_cost
-        }
+        return costs
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
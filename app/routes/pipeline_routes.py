@@ -0,0 +1,116 @@
+# app/routes/pipeline_routes.py
+import os
+from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from bson import ObjectId
+from app.services.job_queue import enqueue_job, get_job
+from app.db.operations import POINT_STAGES, get_main_topic_by_id, get_list_topics_by_main_topic_id, get_stage_progress_by_topic_ids, get_incomplete_points_by_topic_ids, convert_object_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# A stage left "running" longer than this is assumed to belong to a crashed run
+STAGE_STALE_SECONDS = int(os.getenv("STAGE_STALE_SECONDS", "900"))
+
+
+class CoursePipelineRequest(BaseModel):
+    main_topic_id: str
+    concurrency: Optional[int] = None
+    bypass_cache: bool = False
+    # None follows MERGED_MISC_QUIZ
+    merged_misc_quiz: Optional[bool] = None
+
+
+@router.post("/generate-course")
+async def generate_course(request: CoursePipelineRequest):
+    main_topic = await get_main_topic_by_id(request.main_topic_id)
+    if not main_topic:
+        raise HTTPException(status_code=404, detail="Main topic not found")
+
+    # The pipeline runs as a durable job on the worker pool; the job id doubles as the run id
+    run_id = await enqueue_job("course_pipeline", {
+        "main_topic_id": request.main_topic_id,
+        "concurrency": request.concurrency,
+        "bypass_cache": request.bypass_cache,
+        "merged_misc_quiz": request.merged_misc_quiz
+    }, max_attempts=1)
+    logger.info(f"Queued course pipeline {run_id} for main topic {request.main_topic_id}")
+    return {"message": "Course generation queued", "run_id": run_id}
+
+
+class CourseBatchRequest(BaseModel):
+    main_topic_id: str
+
+
+@router.post("/generate-course-batch")
+async def generate_course_batch(request: CourseBatchRequest):
+    main_topic = await get_main_topic_by_id(request.main_topic_id)
+    if not main_topic:
+        raise HTTPException(status_code=404, detail="Main topic not found")
+
+    # Offline build through the Batch API; hours instead of minutes, at half the price
+    run_id = await enqueue_job("course_batch", {"main_topic_id": request.main_topic_id})
+    logger.info(f"Queued batch course build {run_id} for main topic {request.main_topic_id}")
+    return {"message": "Batch course generation queued", "run_id": run_id}
+
+
+async def get_main_topic_topic_ids_or_404(main_topic_id: str):
+    main_topic = await get_main_topic_by_id(main_topic_id)
+    if not main_topic:
+        raise HTTPException(status_code=404, detail="Main topic not found")
+    list_topics = await get_list_topics_by_main_topic_id(main_topic_id)
+    return [str(list_topic["_id"]) for list_topic in list_topics]
+
+
+@router.post("/resume-course")
+async def resume_course(request: CoursePipelineRequest):
+    topic_ids = await get_main_topic_topic_ids_or_404(request.main_topic_id)
+    progress = await get_stage_progress_by_topic_ids(topic_ids)
+    outstanding = sum(counts["pending"] + counts["running"] + counts["failed"] for counts in progress.values())
+    if topic_ids and not outstanding and any(progress[stage]["done"] for stage in POINT_STAGES):
+        return {"message": "All stages are already done", "run_id": None, "progress": progress}
+
+    run_id = await enqueue_job("course_pipeline", {
+        "main_topic_id": request.main_topic_id,
+        "concurrency": request.concurrency,
+        "bypass_cache": request.bypass_cache,
+        "merged_misc_quiz": request.merged_misc_quiz,
+        "resume": True
+    }, max_attempts=1)
+    logger.info(f"Queued course resume {run_id} for main topic {request.main_topic_id} ({outstanding} outstanding stages)")
+    return {"message": "Course resume queued", "run_id": run_id, "progress": progress}
+
+
+@router.get("/course-progress/{main_topic_id}")
+async def get_course_progress(main_topic_id: str, stage: Optional[str] = None):
+    topic_ids = await get_main_topic_topic_ids_or_404(main_topic_id)
+    if stage is None:
+        return {"main_topic_id": main_topic_id, "stages": await get_stage_progress_by_topic_ids(topic_ids)}
+
+    if stage not in POINT_STAGES:
+        raise HTTPException(status_code=400, detail=f"Unknown stage: {stage}")
+    stale_before = datetime.utcnow() - timedelta(seconds=STAGE_STALE_SECONDS)
+    points = await get_incomplete_points_by_topic_ids(topic_ids, stage, stale_before)
+    return {"main_topic_id": main_topic_id, "stage": stage, "outstanding": points}
+
+
+@router.get("/generate-course/{run_id}")
+async def get_course_generation_status(run_id: str):
+    if not ObjectId.is_valid(run_id):
+        raise HTTPException(status_code=400, detail="Invalid run_id")
+    job = await get_job(run_id)
+    if not job or job["type"] != "course_pipeline":
+        raise HTTPException(status_code=404, detail="Pipeline run not found")
+    return convert_object_id({
+        "run_id": job["_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "last_error": job["last_error"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"]
+    })
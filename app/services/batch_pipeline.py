@@ -0,0 +1,294 @@
+# app/services/batch_pipeline.py
+# Offline course build through the Batch API: pending prompting, handout, misc points and quiz
+# requests are written as Batch JSONL, submitted, polled, and ingested through the same update
+# functions and stage state as the interactive pipeline. Stages run in rounds because each one
+# needs the previous round's output.
+import os
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from app.db.database import batches_collection
+from app.db.operations import (
+    get_list_topics_by_main_topic_id, get_batch_candidate_points, get_points_discussion_by_ids,
+    claim_points_for_batch, set_stage_batch_id, update_prompting, update_handout, update_misc_points, update_quiz, add_cost_entry
+)
+from app.services.batch_client import TERMINAL_BATCH_STATUSES, get_batch_backend
+from app.services.model_router import primary_model, validate_prompting, validate_handout, validate_misc_points, validate_quiz
+from app.services.output_parsers import STRUCTURED_OUTPUTS_ENABLED, MiscPointsOutput, response_format_for, parse_structured, parse_misc_points_text
+from app.services.openai_service import build_prompting_messages, build_handout_messages, build_misc_points_messages, build_quiz_messages, clean_quiz
+from app.services.single_flight import stage_lease
+from app.services.stage_service import record_stage_result
+from app.services.token_accounting import completion_cost, cost_entry_fields
+
+logger = logging.getLogger(__name__)
+
+BATCH_WORK_DIR = os.getenv("BATCH_WORK_DIR", "/tmp/kursil_batches")
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+# The Batch API accepts up to 50,000 requests per file
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+# An interactive stage running longer than this is taken over, as on course resume; stages held
+# by another batch follow BATCH_STAGE_STALE_SECONDS in app/db/operations.py instead
+STAGE_STALE_SECONDS = int(os.getenv("STAGE_STALE_SECONDS", "900"))
+
+BATCH_ROUNDS = [["prompting"], ["handout"], ["misc_points", "quiz"]]
+
+
+def misc_points_body() -> dict:
+    return {"response_format": response_format_for(MiscPointsOutput)} if STRUCTURED_OUTPUTS_ENABLED else {}
+
+
+def parse_misc_points(content: str) -> dict:
+    parsed = parse_structured(MiscPointsOutput, content)
+    return parsed.model_dump() if parsed is not None else parse_misc_points_text(content)
+
+
+# stage -> the point field it needs, the field it writes, request builder, parser, validator, update
+BATCH_STAGES = {
+    "prompting": {
+        "requires": "elaboration",
+        "output": "prompting",
+        "messages": lambda point: build_prompting_messages(point["point_of_discussion"], point["elaboration"]),
+        "params": dict,
+        "parse": lambda content: content.strip(),
+        "validate": validate_prompting,
+        "update": update_prompting,
+    },
+    "handout": {
+        "requires": "prompting",
+        "output": "handout",
+        "messages": lambda point: build_handout_messages(point["point_of_discussion"], point["prompting"]),
+        "params": dict,
+        "parse": lambda content: content.strip(),
+        "validate": validate_handout,
+        "update": update_handout,
+    },
+    "misc_points": {
+        "requires": "handout",
+        "output": "learn_objective",
+        "messages": lambda point: build_misc_points_messages(point["point_of_discussion"], point["handout"]),
+        "params": misc_points_body,
+        "parse": parse_misc_points,
+        "validate": validate_misc_points,
+        "update": update_misc_points,
+    },
+    "quiz": {
+        "requires": "handout",
+        "output": "quiz",
+        "messages": lambda point: build_quiz_messages(point["point_of_discussion"], point["handout"]),
+        "params": dict,
+        "parse": lambda content: clean_quiz(content.strip()),
+        "validate": validate_quiz,
+        "update": update_quiz,
+    },
+}
+
+
+def batch_request_line(stage: str, point: dict) -> dict:
+    spec = BATCH_STAGES[stage]
+    return {
+        "custom_id": f"{stage}:{point['_id']}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": primary_model(stage), "messages": spec["messages"](point), **spec["params"]()},
+    }
+
+
+def usage_from_body(body: dict) -> dict:
+    usage = body.get("usage") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+    }
+
+
+class CourseBatchRun:
+    def __init__(self, main_topic_id: str, backend=None, on_progress: Optional[Callable] = None, poll_seconds: float = BATCH_POLL_SECONDS):
+        self.main_topic_id = main_topic_id
+        self.backend = backend or get_batch_backend()
+        self.on_progress = on_progress
+        self.poll_seconds = poll_seconds
+        self.state = {
+            "main_topic_id": main_topic_id,
+            "backend": self.backend.name,
+            "status": "pending",
+            "started_at": None,
+            "finished_at": None,
+            "batches": [],
+            "stages": {stage: {"submitted": 0, "done": 0, "failed": 0, "skipped": 0} for stage in BATCH_STAGES},
+        }
+
+    async def run(self) -> dict:
+        # One batch run per main topic at a time, so unfinished batches are not ingested twice
+        async with stage_lease(self.main_topic_id, "course_batch") as acquired:
+            if acquired:
+                return await self._run()
+        logger.warning(f"A batch run for main topic {self.main_topic_id} is already in progress")
+        self.state["status"] = "already_running"
+        self.state["finished_at"] = datetime.utcnow()
+        await self._report()
+        return self.state
+
+    async def _run(self) -> dict:
+        self.state["status"] = "running"
+        self.state["started_at"] = datetime.utcnow()
+        list_topics = await get_list_topics_by_main_topic_id(self.main_topic_id)
+        topic_ids = [str(list_topic["_id"]) for list_topic in list_topics]
+
+        # A batch submitted before a restart is finished first, so its requests are not sent twice
+        unfinished = await batches_collection.find(
+            {"main_topic_id": self.main_topic_id, "backend": self.backend.name, "ingested_at": None}
+        ).to_list(length=None)
+        for batch_doc in unfinished:
+            logger.info(f"Resuming batch {batch_doc['_id']} for main topic {self.main_topic_id}")
+            await self._await_and_ingest(batch_doc["_id"])
+
+        for stages in BATCH_ROUNDS:
+            requests = []
+            stale_before = datetime.utcnow() - timedelta(seconds=STAGE_STALE_SECONDS)
+            for stage in stages:
+                spec = BATCH_STAGES[stage]
+                points = await get_batch_candidate_points(topic_ids, stage, spec["requires"], spec["output"], stale_before)
+                requests.extend((stage, point) for point in points)
+            if not requests:
+                continue
+
+            batch_ids = []
+            for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+                batch_id = await self._submit(stages, requests[start:start + BATCH_MAX_REQUESTS], stale_before)
+                if batch_id:
+                    batch_ids.append(batch_id)
+            await asyncio.gather(*(self._await_and_ingest(batch_id) for batch_id in batch_ids))
+
+        self.state["status"] = "completed_with_errors" if any(counts["failed"] for counts in self.state["stages"].values()) else "completed"
+        self.state["finished_at"] = datetime.utcnow()
+        await self._report()
+        return self.state
+
+    async def _report(self):
+        if self.on_progress:
+            await self.on_progress(self.state)
+
+    async def _submit(self, stages: list, requests: list, stale_before: datetime) -> Optional[str]:
+        # The points are marked running under a claim id first, so interactive runs and other
+        # batches leave them alone; the claim is renamed to the batch id once it exists
+        claim_id = f"claim-{uuid.uuid4().hex}"
+        claimed = {}
+        for stage in stages:
+            point_ids = [str(point["_id"]) for request_stage, point in requests if request_stage == stage]
+            if point_ids:
+                claimed[stage] = await claim_points_for_batch(point_ids, stage, claim_id, stale_before)
+        lines = [batch_request_line(stage, point) for stage, point in requests if str(point["_id"]) in claimed.get(stage, ())]
+        if not lines:
+            return None
+
+        try:
+            batch = await self._create_batch(stages, lines)
+        except Exception:
+            for stage, point_ids in claimed.items():
+                await set_stage_batch_id(point_ids, stage, claim_id, None)
+            raise
+        for stage, point_ids in claimed.items():
+            await set_stage_batch_id(point_ids, stage, claim_id, batch["id"])
+            self.state["stages"][stage]["submitted"] += len(point_ids)
+        return batch["id"]
+
+    async def _create_batch(self, stages: list, lines: list) -> dict:
+        os.makedirs(BATCH_WORK_DIR, exist_ok=True)
+        path = os.path.join(BATCH_WORK_DIR, f"{self.main_topic_id}-{'-'.join(stages)}-{datetime.utcnow():%Y%m%d%H%M%S%f}.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+
+        input_file_id = await self.backend.upload(path)
+        batch = await self.backend.create(input_file_id, {"main_topic_id": self.main_topic_id, "stages": ",".join(stages)})
+        await batches_collection.insert_one({
+            "_id": batch["id"],
+            "backend": self.backend.name,
+            "main_topic_id": self.main_topic_id,
+            "stages": stages,
+            "input_file_id": input_file_id,
+            "request_count": len(lines),
+            "status": batch["status"],
+            "created_at": datetime.utcnow(),
+            "ingested_at": None,
+        })
+        self.state["batches"].append({"batch_id": batch["id"], "stages": stages, "requests": len(lines), "status": batch["status"]})
+        logger.info(f"Submitted batch {batch['id']} with {len(lines)} {'/'.join(stages)} requests")
+        await self._report()
+        return batch
+
+    async def _await_and_ingest(self, batch_id: str):
+        while True:
+            batch = await self.backend.retrieve(batch_id)
+            await batches_collection.update_one({"_id": batch_id}, {"$set": {"status": batch["status"], "request_counts": batch.get("request_counts")}})
+            for entry in self.state["batches"]:
+                if entry["batch_id"] == batch_id:
+                    entry["status"] = batch["status"]
+            if batch["status"] in TERMINAL_BATCH_STATUSES:
+                break
+            await self._report()
+            await asyncio.sleep(self.poll_seconds)
+
+        # Expired and cancelled batches still return the requests that finished
+        lines = []
+        for key in ("output_file_id", "error_file_id"):
+            if batch.get(key):
+                lines.extend(json.loads(line) for line in (await self.backend.download(batch[key])).splitlines() if line.strip())
+        if batch["status"] != "completed":
+            logger.warning(f"Batch {batch_id} ended as {batch['status']} with {len(lines)} results")
+
+        await self._ingest(batch_id, lines)
+        await batches_collection.update_one({"_id": batch_id}, {"$set": {"ingested_at": datetime.utcnow()}})
+        await self._report()
+
+    async def _ingest(self, batch_id: str, lines: list):
+        requests = [(line["custom_id"].split(":", 1), line) for line in lines]
+        points = await get_points_discussion_by_ids([point_id for (_, point_id), _ in requests], {"point_of_discussion": 1, "topic_name_id": 1, "stages": 1})
+        points_by_id = {str(point["_id"]): point for point in points}
+
+        for (stage, point_id), line in requests:
+            point = points_by_id.get(point_id)
+            if point is None:
+                logger.warning(f"Batch result for unknown point {point_id}")
+                continue
+            await self._ingest_line(batch_id, stage, point, line)
+
+    async def _ingest_line(self, batch_id: str, stage: str, point: dict, line: dict):
+        point_id = str(point["_id"])
+        spec = BATCH_STAGES[stage]
+        response = line.get("response") or {}
+        succeeded = not line.get("error") and response.get("status_code") == 200
+        if succeeded:
+            # Billed whether or not the output is used; priced by the submitted model, since the
+            # response names a dated snapshot
+            body = response["body"]
+            result = {"model": primary_model(stage), "usage": usage_from_body(body), "batch": True}
+            await add_cost_entry(str(point["topic_name_id"]), point["point_of_discussion"], stage, completion_cost(result), **cost_entry_fields(result))
+
+        stage_state = (point.get("stages") or {}).get(stage) or {}
+        if stage_state.get("status") == "done" or stage_state.get("batch_id") not in (None, batch_id):
+            # Finished elsewhere, or taken over after the batch window
+            logger.info(f"Batch {batch_id} {stage} result for point {point_id} is superseded, not ingesting")
+            self.state["stages"][stage]["skipped"] += 1
+            return
+
+        if not succeeded:
+            reason = (line.get("error") or {}).get("message") or f"Batch request failed with status {response.get('status_code')}"
+            await record_stage_result(point_id, stage, {"point_id": point_id, "status": "failed", "reason": reason})
+            self.state["stages"][stage]["failed"] += 1
+            return
+
+        value = spec["parse"](body["choices"][0]["message"]["content"] or "")
+        problem = spec["validate"](value)
+        if problem:
+            # Left for the interactive pipeline, whose model cascade can escalate
+            await record_stage_result(point_id, stage, {"point_id": point_id, "status": "failed", "reason": f"Batch output rejected: {problem}"})
+            self.state["stages"][stage]["failed"] += 1
+            return
+
+        await spec["update"](point_id, value)
+        await record_stage_result(point_id, stage, {"point_id": point_id, "status": "generated"})
+        self.state["stages"][stage]["done"] += 1
@@ -0,0 +1,92 @@
+# app/services/completion_cache.py
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from app.db.database import llm_cache_collection
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "true").lower() == "true"
+
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+memory_cache = LRUCache(LLM_CACHE_MAX_ENTRIES)
+
+
+def make_cache_key(model: str, messages: list, params: Optional[dict] = None) -> str:
+    system_message = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    user_prompt = "\n".join(m["content"] for m in messages if m["role"] != "system")
+    payload = json.dumps({
+        "model": model,
+        "system": system_message,
+        "user": user_prompt,
+        "params": params or {},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached_completion(key: str) -> Optional[dict]:
+    entry = memory_cache.get(key)
+    if entry is not None:
+        return entry
+
+    if not LLM_CACHE_PERSIST:
+        return None
+
+    try:
+        doc = await llm_cache_collection.find_one({"_id": key})
+    except Exception as e:
+        logger.warning(f"Completion cache lookup failed: {str(e)}")
+        return None
+
+    if doc:
+        entry = {"model": doc["model"], "content": doc["content"]}
+        memory_cache.set(key, entry)
+        return entry
+    return None
+
+
+async def store_completion(key: str, model: str, content: str):
+    entry = {"model": model, "content": content}
+    memory_cache.set(key, entry)
+
+    if not LLM_CACHE_PERSIST:
+        return
+
+    try:
+        await llm_cache_collection.update_one(
+            {"_id": key},
+            {"$set": {**entry, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.warning(f"Completion cache write failed: {str(e)}")
@@ -0,0 +1,91 @@
+# app/services/concurrency.py
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Default number of points processed at once for a single request
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+# Upper bound on generations in flight across all requests in this worker
+GENERATION_GLOBAL_CONCURRENCY = int(os.getenv("GENERATION_GLOBAL_CONCURRENCY", "32"))
+
+_global_semaphore = None
+_global_semaphore_loop = None
+
+
+def get_global_semaphore() -> asyncio.Semaphore:
+    # One semaphore per event loop; the worker normally only ever runs one
+    global _global_semaphore, _global_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _global_semaphore is None or _global_semaphore_loop is not loop:
+        _global_semaphore = asyncio.Semaphore(GENERATION_GLOBAL_CONCURRENCY)
+        _global_semaphore_loop = loop
+    return _global_semaphore
+
+
+def resolve_limit(limit: Optional[int] = None) -> int:
+    if not limit or limit < 1:
+        return GENERATION_CONCURRENCY
+    return min(limit, GENERATION_GLOBAL_CONCURRENCY)
+
+
+def failed_result(item, error: Exception) -> dict:
+    # Same shape as the results the point workers return for their own failures
+    result = {"status": "failed", "reason": str(error)}
+    if isinstance(item, dict) and "id" in item:
+        result = {"point_id": item["id"], **result}
+    return result
+
+
+async def run_bounded(items: Iterable[T], worker: Callable[[T], Awaitable[R]], limit: Optional[int] = None) -> List[R]:
+    # Runs worker over items concurrently; results keep the order of items.
+    # A worker that raises gets a failed result in its place instead of failing the whole batch.
+    items = list(items)
+    local_semaphore = asyncio.Semaphore(resolve_limit(limit))
+    global_semaphore = get_global_semaphore()
+
+    async def run_one(item):
+        async with local_semaphore:
+            async with global_semaphore:
+                try:
+                    return await worker(item)
+                except Exception as e:
+                    logger.error(f"Error in bounded task: {str(e)}", exc_info=True)
+                    return failed_result(item, e)
+
+    logger.debug(f"Running {len(items)} tasks with concurrency {resolve_limit(limit)}")
+    return await asyncio.gather(*(run_one(item) for item in items))
+
+
+async def iter_bounded(items: Iterable[T], worker: Callable[[T], Awaitable[R]], limit: Optional[int] = None) -> AsyncIterator[Tuple[int, R]]:
+    # Like run_bounded, but yields (index, result) as each task finishes; a worker that raises
+    # yields a failed result like in run_bounded.
+    # Closing the iterator early (e.g. the client disconnected) cancels the tasks still pending.
+    items = list(items)
+    local_semaphore = asyncio.Semaphore(resolve_limit(limit))
+    global_semaphore = get_global_semaphore()
+
+    async def run_one(index, item):
+        async with local_semaphore:
+            async with global_semaphore:
+                try:
+                    return index, await worker(item)
+                except Exception as e:
+                    logger.error(f"Error in bounded task: {str(e)}", exc_info=True)
+                    return index, failed_result(item, e)
+
+    tasks = [asyncio.create_task(run_one(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.info(f"Cancelled {len(pending)} pending tasks")
@@ -1,11 +1,32 @@
 # app/services/cost_calculator.py
-def calculate_cost(input_token_count, output_token_count):
-    input_rate_per_1k_tokens = 0.005
-    output_rate_per_1k_tokens = 0.015
+# USD per 1k (input, output) tokens; models not listed are billed at the default rates.
+# Dated snapshots (e.g. gpt-4o-mini-2024-07-18) take the rates of the longest listed prefix.
+MODEL_RATES_PER_1K_TOKENS = {
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+DEFAULT_RATES_PER_1K_TOKENS = (0.005, 0.015)
+
+
+def model_rates(model=None):
+    if model in MODEL_RATES_PER_1K_TOKENS:
+        return MODEL_RATES_PER_1K_TOKENS[model]
+    prefixes = [name for name in MODEL_RATES_PER_1K_TOKENS if model and model.startswith(f"{name}-")]
+    if prefixes:
+        return MODEL_RATES_PER_1K_TOKENS[max(prefixes, key=len)]
+    return DEFAULT_RATES_PER_1K_TOKENS
+
+
+def calculate_cost(input_token_count, output_token_count, cached_input_token_count=0, model=None):
+    input_rate_per_1k_tokens, output_rate_per_1k_tokens = model_rates(model)
+    cached_input_rate_per_1k_tokens = input_rate_per_1k_tokens / 2
     api_call_cost = 0.0080
     usd_to_idr = 16500
 
-    input_cost_usd = (input_token_count / 1000) * input_rate_per_1k_tokens
+    # Cached prompt tokens are part of the input count but billed at half rate
+    uncached_input_token_count = input_token_count - cached_input_token_count
+    input_cost_usd = (uncached_input_token_count / 1000) * input_rate_per_1k_tokens
+    input_cost_usd += (cached_input_token_count / 1000) * cached_input_rate_per_1k_tokens
     output_cost_usd = (output_token_count / 1000) * output_rate_per_1k_tokens
     total_cost_usd = input_cost_usd + output_cost_usd + api_call_cost
 
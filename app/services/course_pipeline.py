@@ -0,0 +1,182 @@
+# app/services/course_pipeline.py
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Optional
+from app.services.concurrency import get_global_semaphore
+from app.services.openai_service import stream_elaborate_discussionpoint
+from app.services.stage_service import process_point_prompting, process_point_handout, process_point_misc, process_point_quiz, process_point_misc_quiz, process_point_translation
+from app.db.operations import get_list_topics_by_main_topic_id, get_points_discussion_ids_by_topic_id, get_point_stage_states_by_topic_id
+
+logger = logging.getLogger(__name__)
+
+# Stages of a course build running at once, across all topics and points
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "8"))
+# Topic elaborations streaming at once. They have their own limit because a stream holds its slot
+# while points are still arriving, and point stages must be able to start alongside it.
+PIPELINE_ELABORATION_CONCURRENCY = int(os.getenv("PIPELINE_ELABORATION_CONCURRENCY", "4"))
+# Generate misc points and quiz in one call, so the handout is sent to the model once
+MERGED_MISC_QUIZ = os.getenv("MERGED_MISC_QUIZ", "false").lower() == "true"
+
+# Per-point dependency graph, in topological order: stage -> stages it waits for.
+# Elaboration runs once per topic before any of these, since it creates the points.
+POINT_STAGE_DEPENDENCIES = {
+    "prompting": [],
+    "handout": ["prompting"],
+    "misc_points": ["handout"],
+    "quiz": ["handout"],
+    "translation": ["handout"],
+}
+
+# Pipeline stages that produce several recorded point stages at once
+COMBINED_STAGES = {"misc_quiz": ["misc_points", "quiz"]}
+
+MERGED_STAGE_DEPENDENCIES = {
+    "prompting": [],
+    "handout": ["prompting"],
+    "misc_quiz": ["handout"],
+    "translation": ["handout"],
+}
+
+SUCCESS_STATUSES = {"generated", "existing", "translated"}
+
+
+class CoursePipeline:
+    def __init__(self, main_topic_id: str, concurrency: Optional[int] = None, bypass_cache: bool = False, run_id: Optional[str] = None, resume: bool = False, merged_misc_quiz: Optional[bool] = None):
+        self.main_topic_id = main_topic_id
+        self.concurrency = concurrency or PIPELINE_CONCURRENCY
+        # On resume, stages already recorded as done are not run again
+        self.resume = resume
+        self.stage_states = {}
+        merged_misc_quiz = MERGED_MISC_QUIZ if merged_misc_quiz is None else merged_misc_quiz
+        self.dependencies = MERGED_STAGE_DEPENDENCIES if merged_misc_quiz else POINT_STAGE_DEPENDENCIES
+        self.workers = {
+            "prompting": partial(process_point_prompting, bypass_cache=bypass_cache),
+            "handout": partial(process_point_handout, bypass_cache=bypass_cache),
+            "misc_points": partial(process_point_misc, bypass_cache=bypass_cache),
+            "quiz": partial(process_point_quiz, bypass_cache=bypass_cache),
+            "misc_quiz": partial(process_point_misc_quiz, bypass_cache=bypass_cache),
+            "translation": partial(process_point_translation, skip_existing=True),
+        }
+        self.state = {
+            "run_id": run_id or uuid.uuid4().hex,
+            "main_topic_id": main_topic_id,
+            "resume": resume,
+            "status": "pending",
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+            "topics": 0,
+            "points": 0,
+            "stages": {stage: {} for stage in ["elaboration", *self.dependencies]},
+            "failures": [],
+            "error": None,
+        }
+        self._semaphore = None
+        self._elaboration_semaphore = None
+
+    async def run(self) -> dict:
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._elaboration_semaphore = asyncio.Semaphore(PIPELINE_ELABORATION_CONCURRENCY)
+        self.state["status"] = "running"
+        self.state["started_at"] = datetime.utcnow()
+        try:
+            list_topics = await get_list_topics_by_main_topic_id(self.main_topic_id)
+            self.state["topics"] = len(list_topics)
+            logger.info(f"Starting course pipeline {self.state['run_id']} for {len(list_topics)} topics")
+
+            await asyncio.gather(*(self._run_topic(list_topic) for list_topic in list_topics))
+            self.state["status"] = "completed_with_errors" if self.state["failures"] else "completed"
+        except Exception as e:
+            logger.error(f"Course pipeline {self.state['run_id']} failed: {str(e)}", exc_info=True)
+            self.state["status"] = "failed"
+            self.state["error"] = str(e)
+        finally:
+            self.state["finished_at"] = datetime.utcnow()
+        return self.state
+
+    async def _limited(self, coro_fn, *args):
+        async with self._semaphore:
+            async with get_global_semaphore():
+                return await coro_fn(*args)
+
+    def _record(self, stage: str, result: Optional[dict], point_id: Optional[str] = None):
+        status = result["status"] if result else "skipped"
+        counts = self.state["stages"][stage]
+        counts[status] = counts.get(status, 0) + 1
+        if status == "failed":
+            self.state["failures"].append({"stage": stage, "point_id": point_id, "reason": result.get("reason")})
+
+    async def _run_topic(self, list_topic: dict):
+        topic_id = str(list_topic["_id"])
+        points = await get_points_discussion_ids_by_topic_id(topic_id)
+
+        if not points:
+            await self._elaborate_topic(list_topic)
+            return
+        self._record("elaboration", {"status": "existing"})
+
+        if self.resume:
+            self.stage_states.update(await get_point_stage_states_by_topic_id(topic_id))
+
+        self.state["points"] += len(points)
+        await asyncio.gather(*(self._run_point(point) for point in points))
+
+    async def _elaborate_topic(self, list_topic: dict):
+        # Points are created while the elaboration streams in, and each one starts its
+        # stages straight away instead of waiting for the whole topic
+        topic_id = str(list_topic["_id"])
+        point_tasks = []
+        try:
+            async with self._elaboration_semaphore:
+                async for event in stream_elaborate_discussionpoint(
+                    list_topic["topic_name"],
+                    list_topic.get("objective", ""),
+                    list_topic.get("point_of_discussion", []),
+                    topic_id=list_topic["_id"]
+                ):
+                    if event["type"] == "point":
+                        self.state["points"] += 1
+                        point = {"id": event["point_id"], "point": event["subtopic"]}
+                        point_tasks.append(asyncio.create_task(self._run_point(point)))
+            self._record("elaboration", {"status": "generated"})
+        except Exception as e:
+            logger.error(f"Elaboration failed for topic {topic_id}: {str(e)}", exc_info=True)
+            self._record("elaboration", {"status": "failed", "reason": str(e)})
+        # Points stored before a failure are real and still get their stages
+        await asyncio.gather(*point_tasks)
+
+    async def _run_point(self, point: dict):
+        # Each stage starts as soon as the stages it depends on have succeeded
+        tasks = {}
+        for stage, dependencies in self.dependencies.items():
+            tasks[stage] = asyncio.create_task(self._run_stage(stage, point, [tasks[d] for d in dependencies]))
+        await asyncio.gather(*tasks.values())
+
+    def _stage_done(self, point_id: str, stage: str) -> bool:
+        states = self.stage_states.get(point_id, {})
+        return all(states.get(s, {}).get("status") == "done" for s in COMBINED_STAGES.get(stage, [stage]))
+
+    async def _run_stage(self, stage: str, point: dict, dependencies: list) -> Optional[dict]:
+        dependency_results = await asyncio.gather(*dependencies)
+        if any(not result or result["status"] not in SUCCESS_STATUSES for result in dependency_results):
+            result = {"point_id": point["id"], "status": "skipped", "reason": "Upstream stage did not complete"}
+            self._record(stage, result, point["id"])
+            return result
+
+        if self.resume and self._stage_done(point["id"], stage):
+            result = {"point_id": point["id"], "status": "existing"}
+            self._record(stage, result, point["id"])
+            return result
+
+        try:
+            result = await self._limited(self.workers[stage], point)
+        except Exception as e:
+            logger.error(f"Stage {stage} failed for point {point['id']}: {str(e)}", exc_info=True)
+            result = {"point_id": point["id"], "status": "failed", "reason": str(e)}
+
+        self._record(stage, result, point["id"])
+        return result
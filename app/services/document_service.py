@@ -14,7 +14,7 @@ from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 import re
 from datetime import datetime
-from ..db.operations import main_topic_collection, list_topics_collection, points_discussion_collection
+from ..db.operations import main_topic_collection, list_topics_collection, points_discussion_collection, main_topic_id_match
 from app.utils.digitalocean_spaces import upload_file_to_spaces
 
 logger = logging.getLogger(__name__)
@@ -136,13 +136,7 @@ async def get_all_kursil_by_main_topic_id(main_topic_id: str):
     all_kursil_data = []
 
     # Get all list_topics documents for this main topic
-    # Try with both ObjectId and string versions of main_topic_id
-    list_topics_cursor = list_topics_collection.find({
-        "$or": [
-            {"main_topic_id": ObjectId(main_topic_id)},
-            {"main_topic_id": main_topic_id}
-        ]
-    })
+    list_topics_cursor = list_topics_collection.find({"main_topic_id": main_topic_id_match(main_topic_id)})
     list_topics_docs = await list_topics_cursor.to_list(length=None)
     
     logger.info(f"Found {len(list_topics_docs)} list topics for main topic")
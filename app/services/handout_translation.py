@@ -0,0 +1,181 @@
+# app/services/handout_translation.py
+# Markdown-aware translation: the text is cut into translatable pieces on line, table-cell and
+# sentence boundaries, with markdown markers, code blocks and whitespace kept as literal layout.
+# Neighbouring pieces are then packed, with the layout between them, into segments of up to
+# TRANSLATE_MAX_SEGMENT_CHARS. Segments go through the translation memory and are translated
+# concurrently off the event loop, then the remaining layout is put back around them.
+import os
+import re
+import asyncio
+import logging
+from typing import List, Tuple
+from deep_translator import GoogleTranslator
+from app.services.rate_limiter import TokenBucket
+from app.services.resilience import call_blocking_with_policy
+from app.services.translation_memory import translate_with_memory
+
+logger = logging.getLogger(__name__)
+
+# Google Translate rejects requests over 5000 characters
+TRANSLATE_MAX_SEGMENT_CHARS = int(os.getenv("TRANSLATE_MAX_SEGMENT_CHARS", "3000"))
+# In-flight requests; kept at the google_translate thread pool size so queued work does not eat the call timeout
+TRANSLATE_CONCURRENCY = int(os.getenv("TRANSLATE_CONCURRENCY", "8"))
+TRANSLATE_REQUESTS_PER_MINUTE = int(os.getenv("TRANSLATE_REQUESTS_PER_MINUTE", "600"))
+
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+RULE_PATTERN = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+TABLE_SEPARATOR_PATTERN = re.compile(r'^\s*\|?(\s*:?-+:?\s*\|)+\s*:?-*:?\s*\|?\s*$')
+# Leading markers (headings, bullets, numbering, quotes) and trailing whitespace stay out of the text
+LINE_PATTERN = re.compile(r'^(\s*(?:(?:#{1,6}|[-*+]|\d+[.)]|>)\s+)*)(.*?)(\s*)$')
+CELL_PATTERN = re.compile(r'(\s*\|\s*)')
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'((?<=[.!?:;])\s+)')
+WORD_BOUNDARY_PATTERN = re.compile(r'(\s+)')
+
+# (translatable, text) pieces; joining every text in order gives back the original
+Piece = Tuple[bool, str]
+
+_semaphore = None
+_requests = None
+
+
+def pack(text: str, pattern, max_chars: int) -> List[Piece]:
+    # Greedily joins the parts between pattern matches into chunks of at most max_chars;
+    # the separator at each chunk boundary is kept as layout
+    parts = pattern.split(text)
+    pieces = []
+    current, pending = "", ""
+    for index in range(0, len(parts), 2):
+        token = parts[index]
+        separator = parts[index + 1] if index + 1 < len(parts) else ""
+        if current and len(current) + len(pending) + len(token) > max_chars:
+            pieces.append((True, current))
+            pieces.append((False, pending))
+            current = token
+        else:
+            current = current + pending + token
+        pending = separator
+
+    if current:
+        pieces.append((True, current))
+    if pending:
+        pieces.append((False, pending))
+    return pieces
+
+
+def split_text(text: str, max_chars: int) -> List[Piece]:
+    if len(text) <= max_chars:
+        return [(True, text)]
+    pieces = []
+    for translatable, chunk in pack(text, SENTENCE_BOUNDARY_PATTERN, max_chars):
+        if not translatable or len(chunk) <= max_chars:
+            pieces.append((translatable, chunk))
+            continue
+        # A single sentence over the limit falls back to word boundaries, then to a hard cut
+        for word_translatable, word_chunk in pack(chunk, WORD_BOUNDARY_PATTERN, max_chars):
+            if word_translatable and len(word_chunk) > max_chars:
+                pieces.extend((True, word_chunk[i:i + max_chars]) for i in range(0, len(word_chunk), max_chars))
+            else:
+                pieces.append((word_translatable, word_chunk))
+    return pieces
+
+
+def split_line(line: str, max_chars: int) -> List[Piece]:
+    if not line.strip() or RULE_PATTERN.match(line) or TABLE_SEPARATOR_PATTERN.match(line):
+        return [(False, line)]
+
+    if line.lstrip().startswith("|"):
+        pieces = []
+        for part in CELL_PATTERN.split(line):
+            if CELL_PATTERN.fullmatch(part) or not part:
+                pieces.append((False, part))
+            else:
+                pieces.extend(split_text(part, max_chars))
+        return pieces
+
+    prefix, body, suffix = LINE_PATTERN.match(line).groups()
+    pieces = [(False, prefix)] if prefix else []
+    if body:
+        pieces.extend(split_text(body, max_chars))
+    if suffix:
+        pieces.append((False, suffix))
+    return pieces
+
+
+def merge_pieces(pieces: List[Piece], max_chars: int) -> List[Piece]:
+    # Folds the layout between translatable pieces into one segment while it fits in max_chars;
+    # layout before the first and after the last piece of a segment stays out of it
+    merged = []
+    current, pending = "", ""
+    for translatable, text in pieces:
+        if not translatable:
+            if current:
+                pending += text
+            else:
+                merged.append((False, text))
+            continue
+        if current and len(current) + len(pending) + len(text) <= max_chars:
+            current = current + pending + text
+        else:
+            if current:
+                merged.append((True, current))
+            if pending:
+                merged.append((False, pending))
+            current = text
+        pending = ""
+
+    if current:
+        merged.append((True, current))
+    if pending:
+        merged.append((False, pending))
+    return merged
+
+
+def segment_markdown(text: str, max_chars: int = TRANSLATE_MAX_SEGMENT_CHARS) -> List[Piece]:
+    # Code blocks, rules and table separator rows are never sent to the translator,
+    # so segments are only packed within the text between them
+    pieces, block = [], []
+    in_code = False
+    for index, line in enumerate(text.split("\n")):
+        if index:
+            block.append((False, "\n"))
+        if FENCE_PATTERN.match(line):
+            in_code = not in_code
+        elif not in_code and not RULE_PATTERN.match(line) and not TABLE_SEPARATOR_PATTERN.match(line):
+            block.extend(split_line(line, max_chars))
+            continue
+        pieces.extend(merge_pieces(block, max_chars))
+        pieces.append((False, line))
+        block = []
+    pieces.extend(merge_pieces(block, max_chars))
+    return pieces
+
+
+def _translate_blocking(source: str, target: str, segment: str) -> str:
+    # A GoogleTranslator per request: instances keep per-request state and are not safe to share across threads
+    return GoogleTranslator(source=source, target=target).translate(segment)
+
+
+async def translate_segment(segment: str, source: str, target: str) -> str:
+    global _semaphore, _requests
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(TRANSLATE_CONCURRENCY)
+        _requests = TokenBucket(TRANSLATE_REQUESTS_PER_MINUTE)
+
+    async with _semaphore:
+        await asyncio.sleep(_requests.reserve(1))
+        translated = await call_blocking_with_policy("google_translate", _translate_blocking, source, target, segment)
+    # The translator returns None for text it leaves alone (numbers, symbols)
+    return translated if translated is not None else segment
+
+
+async def translate_segments(segments: List[str], source: str, target: str) -> List[str]:
+    async def translate_missing(pending):
+        return await asyncio.gather(*(translate_segment(segment, source, target) for segment in pending))
+
+    return await translate_with_memory(source, target, segments, translate_missing)
+
+
+async def translate_markdown(text: str, source: str, target: str) -> str:
+    pieces = segment_markdown(text)
+    translated = iter(await translate_segments([piece for translatable, piece in pieces if translatable], source, target))
+    return "".join(next(translated) if translatable else piece for translatable, piece in pieces)
@@ -0,0 +1,78 @@
+# app/services/job_handlers.py
+import asyncio
+import logging
+from app.services.course_pipeline import CoursePipeline
+from app.services.batch_pipeline import CourseBatchRun
+from app.services.job_queue import update_job_progress
+from app.services.stage_service import process_point_misc, process_point_quiz, process_point_misc_quiz
+
+logger = logging.getLogger(__name__)
+
+# How often a running course pipeline writes its progress to the job document
+PIPELINE_PROGRESS_INTERVAL_SECONDS = 5
+
+
+class JobFailedError(Exception):
+    pass
+
+
+def require_success(result: dict) -> dict:
+    # Stage workers report failures in their result instead of raising; turn them into retries
+    if result and result.get("status") == "failed":
+        raise JobFailedError(result.get("reason") or "Stage failed")
+    return result
+
+
+async def handle_misc_points(job: dict):
+    payload = job["payload"]
+    result = await process_point_misc({"id": payload["point_id"]}, bypass_cache=payload.get("bypass_cache", False))
+    return require_success(result)
+
+
+async def handle_quiz(job: dict):
+    payload = job["payload"]
+    result = await process_point_quiz({"id": payload["point_id"]}, bypass_cache=payload.get("bypass_cache", False))
+    return require_success(result)
+
+
+async def handle_misc_quiz(job: dict):
+    payload = job["payload"]
+    result = await process_point_misc_quiz({"id": payload["point_id"]}, bypass_cache=payload.get("bypass_cache", False))
+    return require_success(result)
+
+
+async def handle_course_pipeline(job: dict):
+    payload = job["payload"]
+    pipeline = CoursePipeline(
+        payload["main_topic_id"],
+        concurrency=payload.get("concurrency"),
+        bypass_cache=payload.get("bypass_cache", False),
+        run_id=str(job["_id"]),
+        resume=payload.get("resume", False),
+        merged_misc_quiz=payload.get("merged_misc_quiz")
+    )
+    task = asyncio.create_task(pipeline.run())
+    while not task.done():
+        await asyncio.wait({task}, timeout=PIPELINE_PROGRESS_INTERVAL_SECONDS)
+        await update_job_progress(job["_id"], pipeline.state)
+
+    state = task.result()
+    if state["status"] == "failed":
+        raise JobFailedError(state["error"] or "Course pipeline failed")
+    return {"status": state["status"], "stages": state["stages"], "failures": state["failures"]}
+
+
+async def handle_course_batch(job: dict):
+    payload = job["payload"]
+    run = CourseBatchRun(payload["main_topic_id"], on_progress=lambda state: update_job_progress(job["_id"], state))
+    state = await run.run()
+    return {"status": state["status"], "stages": state["stages"], "batches": state["batches"]}
+
+
+JOB_HANDLERS = {
+    "misc_points": handle_misc_points,
+    "quiz": handle_quiz,
+    "misc_quiz": handle_misc_quiz,
+    "course_pipeline": handle_course_pipeline,
+    "course_batch": handle_course_batch,
+}
@@ -0,0 +1,177 @@
+# app/services/job_queue.py
+import os
+import random
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.db.database import jobs_collection
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "30"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "1800"))
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    # Exponential backoff with full jitter
+    ceiling = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+async def enqueue_job(job_type: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+    now = datetime.utcnow()
+    result = await jobs_collection.insert_one({
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_after": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "progress": None,
+        "result": None,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None
+    })
+    logger.info(f"Enqueued {job_type} job {result.inserted_id}")
+    return str(result.inserted_id)
+
+
+async def fail_expired_jobs(job_types: Optional[List[str]] = None) -> int:
+    # A worker that dies on a job's last attempt leaves it running with an expired lease and no
+    # attempts left; nothing would claim it again, so it is marked failed (and can be retried)
+    now = datetime.utcnow()
+    query = {
+        "status": "running",
+        "lease_expires_at": {"$lt": now},
+        "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+    }
+    if job_types:
+        query["type"] = {"$in": job_types}
+
+    result = await jobs_collection.update_many(query, {"$set": {
+        "status": "failed",
+        "last_error": "lease expired",
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "updated_at": now,
+        "finished_at": now
+    }})
+    if result.modified_count:
+        logger.error(f"Marked {result.modified_count} jobs failed after their last attempt's lease expired")
+    return result.modified_count
+
+
+async def claim_job(worker_id: str, job_types: Optional[List[str]] = None) -> Optional[dict]:
+    # Claims the oldest runnable job: queued and due, or running with an expired lease
+    await fail_expired_jobs(job_types)
+    now = datetime.utcnow()
+    query = {
+        "$or": [
+            {"status": "queued", "run_after": {"$lte": now}},
+            {"status": "running", "lease_expires_at": {"$lt": now}},
+        ],
+        "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+    }
+    if job_types:
+        query["type"] = {"$in": job_types}
+
+    return await jobs_collection.find_one_and_update(
+        query,
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_after", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def renew_lease(job_id, worker_id: str) -> bool:
+    now = datetime.utcnow()
+    result = await jobs_collection.update_one(
+        {"_id": ObjectId(job_id), "lease_owner": worker_id, "status": "running"},
+        {"$set": {"lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now}}
+    )
+    return result.modified_count > 0
+
+
+async def update_job_progress(job_id, progress: dict):
+    await jobs_collection.update_one(
+        {"_id": ObjectId(job_id)},
+        {"$set": {"progress": progress, "updated_at": datetime.utcnow()}}
+    )
+
+
+async def complete_job(job_id, worker_id: str, result=None) -> bool:
+    now = datetime.utcnow()
+    update = await jobs_collection.update_one(
+        {"_id": ObjectId(job_id), "lease_owner": worker_id},
+        {"$set": {
+            "status": "completed",
+            "result": result,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": now,
+            "finished_at": now
+        }}
+    )
+    return update.modified_count > 0
+
+
+async def fail_job(job: dict, worker_id: str, error: str) -> str:
+    # Requeues with backoff while attempts remain, otherwise marks the job failed
+    now = datetime.utcnow()
+    if job["attempts"] < job["max_attempts"]:
+        delay = retry_delay_seconds(job["attempts"])
+        update = {"status": "queued", "run_after": now + timedelta(seconds=delay)}
+        logger.warning(f"Job {job['_id']} failed (attempt {job['attempts']}/{job['max_attempts']}), retrying in {delay:.0f}s: {error}")
+    else:
+        update = {"status": "failed", "finished_at": now}
+        logger.error(f"Job {job['_id']} failed permanently after {job['attempts']} attempts: {error}")
+
+    await jobs_collection.update_one(
+        {"_id": job["_id"], "lease_owner": worker_id},
+        {"$set": {**update, "last_error": error, "lease_owner": None, "lease_expires_at": None, "updated_at": now}}
+    )
+    return update["status"]
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    return await jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+
+async def list_jobs(status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 50) -> List[dict]:
+    query = {}
+    if status:
+        query["status"] = status
+    if job_type:
+        query["type"] = job_type
+    cursor = jobs_collection.find(query).sort("created_at", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def retry_job(job_id: str) -> bool:
+    # Puts a failed job back in the queue with a fresh attempt budget
+    job = await get_job(job_id)
+    if not job or job["status"] != "failed":
+        return False
+    now = datetime.utcnow()
+    result = await jobs_collection.update_one(
+        {"_id": job["_id"], "status": "failed"},
+        {"$set": {"status": "queued", "run_after": now, "updated_at": now, "finished_at": None},
+         "$inc": {"max_attempts": JOB_MAX_ATTEMPTS}}
+    )
+    return result.modified_count > 0
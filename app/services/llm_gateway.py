@@ -0,0 +1,190 @@
+# app/services/llm_gateway.py
+import os
+import asyncio
+import logging
+import httpx
+from openai import AsyncOpenAI, RateLimitError
+from dotenv import load_dotenv
+from app.services.completion_cache import make_cache_key, get_cached_completion, store_completion
+from app.services.resilience import call_with_policy
+from app.services.output_parsers import response_format_for, parse_structured
+from app.services.rate_limiter import get_governor, estimate_tokens
+from app.services.token_accounting import EMPTY_USAGE, usage_from_completion, ensure_usage, track_usage
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Connection pool tuning, shared by every OpenAI call made from this worker
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "50"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+# Retries are owned by the resilience policy, so the SDK's own retries are off by default
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+# Longest gap allowed between two chunks of a streamed completion
+OPENAI_STREAM_IDLE_TIMEOUT = float(os.getenv("OPENAI_STREAM_IDLE_TIMEOUT", "60"))
+
+_http_client = None
+_client = None
+
+
+def get_client() -> AsyncOpenAI:
+    # Created lazily so the pool is bound to the running event loop
+    global _http_client, _client
+    if _client is None:
+        _http_client = httpx.AsyncClient(
+            http2=OPENAI_HTTP2,
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        )
+        _client = AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=_http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+        logger.info(
+            f"Initialized AsyncOpenAI client (http2={OPENAI_HTTP2}, "
+            f"max_connections={OPENAI_MAX_CONNECTIONS}, keepalive={OPENAI_MAX_KEEPALIVE_CONNECTIONS})"
+        )
+    return _client
+
+
+async def close_client():
+    global _http_client, _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        _http_client = None
+        logger.info("Closed AsyncOpenAI client")
+
+
+async def create_with_rate_limit(create, model: str, estimated_tokens: int, **params):
+    # Reserves RPM/TPM capacity before sending and feeds the rate limit headers back;
+    # every attempt goes through the OpenAI timeout/retry/circuit breaker policy. Waiting on the
+    # governor happens before the attempt timeout starts.
+    governor = get_governor(model)
+
+    async def attempt():
+        try:
+            response = await create(model=model, **params)
+        except RateLimitError as e:
+            governor.rate_limited(e.response.headers)
+            raise
+        governor.update_from_headers(response.headers)
+        return response.parse()
+
+    return governor, await call_with_policy("openai", attempt, prepare=lambda: governor.acquire(estimated_tokens))
+
+
+async def chat_completion(messages, model: str = "gpt-4o-mini", **params):
+    client = get_client()
+    estimated = estimate_tokens(messages, params.get("max_tokens"))
+    governor, completion = await create_with_rate_limit(
+        client.chat.completions.with_raw_response.create, model, estimated, messages=messages, **params
+    )
+    governor.settle(estimated, completion.usage.total_tokens if completion.usage else None)
+    return completion
+
+
+async def chat_completion_result(messages, model: str = "gpt-4o-mini", **params) -> dict:
+    completion = await chat_completion(messages, model=model, **params)
+    content = completion.choices[0].message.content
+    usage = await ensure_usage(usage_from_completion(completion), messages, content, model)
+    track_usage(usage)
+    return {"content": content, "model": model, "cache_hit": False, "usage": usage}
+
+
+async def cached_chat_completion(messages, model: str = "gpt-4o-mini", bypass_cache: bool = False, **params) -> dict:
+    # Identical (model, system, prompt, params) requests are served from the completion cache
+    key = make_cache_key(model, messages, params)
+    if not bypass_cache:
+        cached = await get_cached_completion(key)
+        if cached is not None:
+            logger.info(f"Completion cache hit ({model}, key={key[:12]})")
+            return {"content": cached["content"], "model": model, "cache_hit": True, "usage": dict(EMPTY_USAGE)}
+
+    result = await chat_completion_result(messages, model=model, **params)
+    await store_completion(key, model, result["content"])
+    return result
+
+
+async def structured_chat_completion(messages, output_model, model: str = "gpt-4o-mini", bypass_cache: bool = False, **params) -> dict:
+    # JSON-schema constrained completion; result["parsed"] holds the validated model, or None
+    # when the output did not validate (only valid outputs are cached)
+    params = {**params, "response_format": response_format_for(output_model)}
+    key = make_cache_key(model, messages, params)
+    if not bypass_cache:
+        cached = await get_cached_completion(key)
+        parsed = parse_structured(output_model, cached["content"]) if cached is not None else None
+        if parsed is not None:
+            logger.info(f"Completion cache hit ({model}, key={key[:12]})")
+            return {"content": cached["content"], "parsed": parsed, "model": model, "cache_hit": True, "usage": dict(EMPTY_USAGE)}
+
+    result = await chat_completion_result(messages, model=model, **params)
+    result["parsed"] = parse_structured(output_model, result["content"])
+    if result["parsed"] is not None:
+        await store_completion(key, model, result["content"])
+    return result
+
+
+async def stream_chat_completion(messages, model: str = "gpt-4o-mini", bypass_cache: bool = False, **params):
+    # Yields {"type": "delta", "content": ...} events as tokens arrive, then one
+    # {"type": "done", ...} event carrying the full text and usage.
+    key = make_cache_key(model, messages, params)
+    if not bypass_cache:
+        cached = await get_cached_completion(key)
+        if cached is not None:
+            logger.info(f"Completion cache hit ({model}, key={key[:12]})")
+            yield {"type": "delta", "content": cached["content"]}
+            yield {"type": "done", "content": cached["content"], "model": model, "cache_hit": True, "usage": dict(EMPTY_USAGE)}
+            return
+
+    client = get_client()
+    estimated = estimate_tokens(messages, params.get("max_tokens"))
+    governor, stream = await create_with_rate_limit(
+        client.chat.completions.with_raw_response.create,
+        model,
+        estimated,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        **params
+    )
+    parts = []
+    reported_usage = None
+    chunks = stream.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=OPENAI_STREAM_IDLE_TIMEOUT)
+            except StopAsyncIteration:
+                break
+            if chunk.usage is not None:
+                reported_usage = usage_from_completion(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                parts.append(delta)
+                yield {"type": "delta", "content": delta}
+    finally:
+        await stream.close()
+
+    content = "".join(parts)
+    usage = await ensure_usage(reported_usage, messages, content, model)
+    governor.settle(estimated, usage["prompt_tokens"] + usage["completion_tokens"])
+    track_usage(usage)
+    await store_completion(key, model, content)
+    yield {"type": "done", "content": content, "model": model, "cache_hit": False, "usage": usage}
+
+
+async def generate_image(prompt: str, model: str = "dall-e-3", **params):
+    client = get_client()
+    _, image = await create_with_rate_limit(client.images.with_raw_response.generate, model, 0, prompt=prompt, **params)
+    return image
@@ -0,0 +1,165 @@
+# app/services/model_router.py
+# Per-stage model cascade: each stage starts on its cheapest adequate model and escalates to the
+# next one only when the output fails the stage's structural checks. Every billed attempt carries
+# its routing decision, which cost_entry_fields writes to cost_ai next to the model and cost.
+import os
+import re
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CASCADE = ["gpt-4o-mini", "gpt-4o"]
+
+# Stages not listed use DEFAULT_CASCADE; MODEL_CASCADE_<STAGE>="model-a,model-b" overrides any stage
+STAGE_CASCADES = {
+    "topics": DEFAULT_CASCADE,
+    "elaboration": DEFAULT_CASCADE,
+    "prompting": DEFAULT_CASCADE,
+    "handout": DEFAULT_CASCADE,
+    "misc_points": DEFAULT_CASCADE,
+    "quiz": DEFAULT_CASCADE,
+    "misc_quiz": DEFAULT_CASCADE,
+    # Free text with nothing to check structurally, so it stays on the model it always used
+    "analogy": ["gpt-4o"],
+}
+
+# Below these lengths a prompting or handout is treated as cut short and escalated
+MIN_PROMPTING_CHARS = int(os.getenv("MIN_PROMPTING_CHARS", "300"))
+MIN_HANDOUT_CHARS = int(os.getenv("MIN_HANDOUT_CHARS", "1500"))
+
+REFUSAL_PATTERN = re.compile(r"^\W*(I'm sorry|I am sorry|I can't|I cannot|Sorry,|Maaf,? saya)", re.IGNORECASE)
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+\S', re.MULTILINE)
+QUIZ_QUESTION_PATTERN = re.compile(r'^\s*\d+\.\s', re.MULTILINE)
+QUIZ_OPTION_PATTERN = re.compile(r'\b[A-D]\)')
+
+
+def stage_models(stage: str) -> List[str]:
+    override = os.getenv(f"MODEL_CASCADE_{stage.upper()}")
+    if override:
+        return [model.strip() for model in override.split(",") if model.strip()]
+    return STAGE_CASCADES.get(stage, DEFAULT_CASCADE)
+
+
+def primary_model(stage: str) -> str:
+    # Streaming paths commit output as it arrives and cannot escalate, so they use the first model
+    return stage_models(stage)[0]
+
+
+# Validators return None when the output is acceptable, otherwise the reason it is not
+
+def validate_text(value) -> Optional[str]:
+    return None if value and value.strip() else "empty output"
+
+
+def validate_long_text(value, min_chars: int) -> Optional[str]:
+    problem = validate_text(value)
+    if problem:
+        return problem
+    if REFUSAL_PATTERN.match(value):
+        return "refusal"
+    if len(value.strip()) < min_chars:
+        return f"shorter than {min_chars} characters"
+    return None
+
+
+def validate_prompting(prompting) -> Optional[str]:
+    return validate_long_text(prompting, MIN_PROMPTING_CHARS)
+
+
+def validate_handout(handout) -> Optional[str]:
+    problem = validate_long_text(handout, MIN_HANDOUT_CHARS)
+    if problem:
+        return problem
+    # A book section: headed sections, or at least several paragraphs
+    if not HEADING_PATTERN.search(handout) and len([block for block in handout.split("\n\n") if block.strip()]) < 3:
+        return "no sections or paragraphs"
+    return None
+
+
+def validate_topics(topics) -> Optional[str]:
+    if not topics:
+        return "no topics parsed"
+    for topic in topics:
+        if not topic.get("topic_name") or not topic.get("objective"):
+            return "topic without title or objective"
+        if not topic.get("point_of_discussion"):
+            return f"no points of discussion for {topic['topic_name']}"
+    return None
+
+
+def validate_elaboration(points) -> Optional[str]:
+    if not points:
+        return "no subtopics parsed"
+    if any(not point.get("subtopic") or not point.get("elaboration") for point in points):
+        return "subtopic without elaboration"
+    return None
+
+
+def validate_misc_points(misc_points) -> Optional[str]:
+    if not misc_points:
+        return "no misc points parsed"
+    for field in ("learn_objective", "method", "assessment"):
+        if not misc_points.get(field):
+            return f"missing {field}"
+    if not misc_points.get("duration"):
+        return "missing duration"
+    return None
+
+
+def validate_quiz(quiz) -> Optional[str]:
+    if not quiz:
+        return "empty quiz"
+    if not QUIZ_QUESTION_PATTERN.search(quiz):
+        return "no numbered questions"
+    if len(set(QUIZ_OPTION_PATTERN.findall(quiz))) < 4:
+        return "questions without A-D options"
+    return None
+
+
+def validate_misc_quiz(combined) -> Optional[str]:
+    if not combined:
+        return "combined output did not validate"
+    return validate_misc_points(combined["misc_points"]) or validate_quiz(combined["quiz"])
+
+
+STAGE_VALIDATORS = {
+    "topics": validate_topics,
+    "elaboration": validate_elaboration,
+    "prompting": validate_prompting,
+    "handout": validate_handout,
+    "misc_points": validate_misc_points,
+    "quiz": validate_quiz,
+    "misc_quiz": validate_misc_quiz,
+    "analogy": validate_text,
+}
+
+
+async def route_completion(stage: str, attempt: Callable, validate: Optional[Callable] = None):
+    # attempt(model) returns (value, completion results to bill). Returns the accepted value and
+    # every billed result, each tagged with result["route"]. The value of the last model is returned
+    # even when it fails validation, so callers keep their own handling of bad output.
+    validate = validate or STAGE_VALIDATORS.get(stage, validate_text)
+    models = stage_models(stage)
+    billed = []
+    value = None
+    for step, model in enumerate(models):
+        value, results = await attempt(model)
+        problem = validate(value)
+        if problem is None:
+            outcome = "accepted"
+        elif step == len(models) - 1:
+            outcome = "exhausted"
+        else:
+            outcome = "escalated"
+
+        for result in results:
+            result["route"] = {"step": step, "outcome": outcome, "reason": problem}
+        billed.extend(results)
+
+        if problem is None:
+            if step > 0:
+                logger.info(f"{stage} accepted from {model} after escalation")
+            break
+        logger.warning(f"{stage} output from {model} failed validation ({problem}), outcome: {outcome}")
+    return value, billed
@@ -6,6 +6,7 @@ from bson import ObjectId
 import logging
 from datetime import datetime
 
+from app.services.resilience import call_blocking_with_policy
 from app.utils.digitalocean_spaces import upload_file_to_spaces
 from app.db.operations import update_main_topic_document
 
@@ -19,6 +20,17 @@ load_dotenv()
 # Get API key from environment variable
 api_key = os.getenv("ELEVENLABS_API_KEY")
 
+# Socket level timeouts; the per-call deadline and retries come from the resilience policy
+ELEVENLABS_CONNECT_TIMEOUT = float(os.getenv("ELEVENLABS_CONNECT_TIMEOUT", "10"))
+ELEVENLABS_READ_TIMEOUT = float(os.getenv("ELEVENLABS_READ_TIMEOUT", "55"))
+
+
+def post_text_to_speech(url: str, payload: dict, headers: dict):
+    response = requests.post(url, json=payload, headers=headers, timeout=(ELEVENLABS_CONNECT_TIMEOUT, ELEVENLABS_READ_TIMEOUT))
+    # Raise inside the attempt so 429/5xx responses are retried
+    response.raise_for_status()
+    return response
+
 
 # app/services/multimedia_service.py
 async def topic_text_to_speech(main_topic_id: str, text: str, voice_id: str):
@@ -49,7 +61,7 @@ async def topic_text_to_speech(main_topic_id: str, text: str, voice_id: str):
     logger.debug(f"Payload: {payload}")
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = await call_blocking_with_policy("elevenlabs", post_text_to_speech, url, payload, headers)
         logger.debug(f"Response status code: {response.status_code}")
         logger.debug(f"Response headers: {response.headers}")
         logger.debug(f"Response content length: {len(response.content)} bytes")
@@ -4,17 +4,21 @@ from bson import ObjectId
 import os
 import re
 from fastapi import HTTPException
-from openai import OpenAI
 from typing import List, Dict
 from dotenv import load_dotenv
-import tiktoken
-from app.services.cost_calculator import calculate_cost
+from app.services.llm_gateway import chat_completion, chat_completion_result, cached_chat_completion, structured_chat_completion, stream_chat_completion, generate_image
+from app.services.output_parsers import STRUCTURED_OUTPUTS_ENABLED, ListOfTopicsOutput, ElaborationOutput, MiscPointsOutput, MiscQuizOutput, parse_topics_text, parse_elaboration_text, parse_misc_points_text, SubtopicStreamParser
+from app.services.resilience import call_blocking_with_policy
+from app.services.handout_translation import translate_segments, translate_markdown
+from app.services.token_accounting import completion_cost, cost_entry_fields
+from app.services.model_router import route_completion, primary_model, validate_misc_quiz
+from app.services.prompt_registry import render_listof_topic, render_detail_discussionpoint, render_prompt_to_write, render_misc_points_instructions, render_quiz_instructions
 from app.db.database import main_topic_collection, list_topics_collection, cost_ai_collection
-from app.db.operations import get_topic_by_name, add_elaborated_point, add_elaborated_point, get_topic_by_name, update_main_topic_document
+from app.db.cost_rollups import empty_rollup
+from app.db.operations import get_topic_by_name, add_elaborated_point, add_elaborated_point, get_topic_by_name, update_main_topic_document, add_cost_entry, get_cost_breakdown_by_main_topic_id, main_topic_id_match
 from app.utils.digitalocean_spaces import upload_file_to_spaces
 from datetime import datetime
 import base64
-from deep_translator import GoogleTranslator
 import requests
 import logging
 
@@ -25,65 +29,45 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "60"))
 
+async def parse_generated_content(content):
+    return parse_topics_text(content)
 
-def read_prompt(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
 
+async def structured_or_text_completion(messages, output_model, model: str = "gpt-4o-mini", bypass_cache: bool = False):
+    # Asks for JSON-schema structured output first; when that is disabled or does not validate,
+    # falls back to a plain completion for the regex parsers.
+    # Returns (parsed model or None, fallback text or None, completion results to bill)
+    results = []
+    if STRUCTURED_OUTPUTS_ENABLED:
+        result = await structured_chat_completion(messages, output_model, model=model, bypass_cache=bypass_cache)
+        results.append(result)
+        if result["parsed"] is not None:
+            return result["parsed"], None, results
+        logger.warning(f"Falling back to text completion for {output_model.__name__}")
 
-def count_tokens(text):
-    enc = tiktoken.get_encoding("cl100k_base")
-    tokens = enc.encode(text)
-    return len(tokens)
+    result = await cached_chat_completion(messages, model=model, bypass_cache=bypass_cache)
+    results.append(result)
+    return None, result["content"].strip(), results
 
-async def parse_generated_content(content):
-    sections = content.split('\n\n')
-    topics = []
-    topic_pattern = re.compile(r'\d+\.\s+\*\*Topic Title:\*\* (.*?)\n', re.DOTALL)
-    objective_pattern = re.compile(r'- \*\*Objective:\*\* (.*?)(?:\n|$)', re.DOTALL)
-    key_concepts_pattern = re.compile(r'- \*\*Key Concepts:\*\* (.*?)(?:\n|$)', re.DOTALL)
-    skills_pattern = re.compile(r'- \*\*Skills to be Mastered:\*\* (.*?)(?:\n|$)', re.DOTALL)
-    discussion_pattern = re.compile(r'- \*\*Point of Discussion:\*\*\n(.*?)(?=\n\s*\n|\Z)', re.DOTALL)
-
-    parsed_topics = []
-
-    for section in sections:
-        topic_match = topic_pattern.search(section)
-        if topic_match:
-            topic = {
-                "topic_name": topic_match.group(1).strip(),
-                "objective": objective_pattern.search(section).group(1).strip() if objective_pattern.search(section) else "",
-                "key_concepts": key_concepts_pattern.search(section).group(1).strip() if key_concepts_pattern.search(section) else "",
-                "skills_to_be_mastered": skills_pattern.search(section).group(1).strip() if skills_pattern.search(section) else "",
-                "point_of_discussion": []
-            }
-            
-            discussion_match = discussion_pattern.search(section)
-            if discussion_match:
-                discussion_points = discussion_match.group(1).strip().split('\n')
-                topic["point_of_discussion"] = [point.strip('- ').strip() for point in discussion_points]
-            
-            parsed_topics.append(topic)
-
-    return parsed_topics
-
-
-def generate_analogy(points_of_discussion):
+
+async def generate_analogy(points_of_discussion, topic_id: str = None):
 
     messages = [
         {"role": "system", "content": "Anda adalah seorang pengembang konten pendidikan dan merupakan konsultan untuk Pusdiklat PLN (pusat pendidikan dan pelatihan) yang mendukung Perusahaan Listrik Negara (PLN) dalam menjalankan bisnis ketenagalistrikan dan bidang-bidang lain yang terkait. Dari informasi yang diberikan user, carilah dan pilihlah konsep yang paling sulit, lalu buatkan analogi yang dapat menyederhanakan atau menjelaskan konsep tersebut dengan cara yang lebih mudah dipahami dan menarik. 1. Analogi ini ditujukan bagi audiens para karyawan Perusahaan Listrik Negara;  buat asumsi terkait latar belakang, tingkatan pengetahuan, dan minat audiens ini. 2. Carilah Koneksi yang Familiar. Cari objek, situasi, atau pengalaman yang familiar bagi audiens sebagai dasar analogi.  3. Analisis Kesamaan. Temukan kesamaan fungsional atau konseptual antara konsep utama dan objek analogi yang Anda pilih. Pastikan kesamaan tersebut cukup kuat untuk mendukung pemahaman tentang konsep utama. 4. Kembangkan Analogi. Bangun analogi Anda dengan menghubungkan kesamaan yang telah diidentifikasi. Gunakan narasi atau deskripsi yang jelas untuk menjelaskan bagaimana objek analogi merepresentasikan konsep utama."},
         {"role": "user", "content": points_of_discussion}
     ]
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages
-    )
+    async def attempt(model):
+        result = await chat_completion_result(messages, model=model)
+        return result["content"].strip(), [result]
+
+    analogy, results = await route_completion("analogy", attempt)
+
+    for result in results:
+        await add_cost_entry(topic_id, "analogy", "analogy", completion_cost(result), **cost_entry_fields(result))
 
-    analogy = completion.choices[0].message.content.strip()
     return analogy
 
 async def generate_summary(parsed_topics):
@@ -97,20 +81,14 @@ async def generate_summary(parsed_topics):
         {"role": "user", "content": prompt}
     ]
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
+    result = await chat_completion_result(messages, model="gpt-4o-mini")
 
-    summary = completion.choices[0].message.content.strip()
-    return summary
+    summary = result["content"].strip()
+    return summary, result
 
 async def create_listof_topic(topic):
-    # Read the prompt template
-    prompt_template = read_prompt("./app/prompts/prompt_listof_topic.txt")
-
-    # Replace the placeholder with the actual topic
-    prompt = prompt_template.replace("{{topic}}", topic)
+    # Render the prompt template with the actual topic
+    prompt = render_listof_topic(topic)
 
     messages = [
         {"role": "system",
@@ -118,31 +96,23 @@ async def create_listof_topic(topic):
         {"role": "user", "content": prompt}
     ]
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
-
-    list_of_topics = completion.choices[0].message.content.strip()
+    async def attempt(model):
+        parsed, list_of_topics, results = await structured_or_text_completion(messages, ListOfTopicsOutput, model=model, bypass_cache=True)
+        # Parse the generated content
+        if parsed is not None:
+            return [topic.model_dump() for topic in parsed.topics], results
+        return await parse_generated_content(list_of_topics), results
 
-    # Calculate cost based on the output
-    prompt_input_token_count = count_tokens(prompt)
-    prompt_output_token_count = count_tokens(list_of_topics)
-    total_cost_idr = calculate_cost(
-        prompt_input_token_count, prompt_output_token_count)
+    parsed_topics, results = await route_completion("topics", attempt)
 
-    # Parse the generated content
-    parsed_topics = await parse_generated_content(list_of_topics)
+    # Calculate cost from the usage reported by the API
+    total_cost_idr = sum(completion_cost(result) for result in results)
 
     # Generate summary
-    summary = await generate_summary(parsed_topics)
+    summary, summary_result = await generate_summary(parsed_topics)
 
     # Calculate additional cost for summary generation
-    summary_prompt_token_count = count_tokens(prompt)
-    summary_output_token_count = count_tokens(summary)
-    summary_cost = calculate_cost(summary_prompt_token_count, summary_output_token_count)
-
-    total_cost_idr += summary_cost
+    total_cost_idr += completion_cost(summary_result)
 
     # Save to MongoDB
     main_topic_data = {
@@ -154,14 +124,20 @@ async def create_listof_topic(topic):
         "latest_handout_document": None,  # Changed from str to None
         "latest_powerpoint_document": None,  # Changed from str to None
         "link_image_icon": None,  # Changed from str to None
-        "link_audio_pitch": None  # Changed from str to None
+        "link_audio_pitch": None,  # Changed from str to None
+        "cost_rollup": empty_rollup()
     }
     result = await main_topic_collection.insert_one(main_topic_data)
     main_topic_id = str(result.inserted_id)
 
     for topic in parsed_topics:
-        topic["main_topic_id"] = main_topic_id
-        await list_topics_collection.insert_one(topic)
+        topic["main_topic_id"] = result.inserted_id
+        inserted = await list_topics_collection.insert_one({**topic, "cost_rollup": empty_rollup()})
+        topic["_id"] = inserted.inserted_id
+
+    # Routing decisions for the topic list, keyed by the main topic it created
+    for completion_result in results:
+        await add_cost_entry(main_topic_id, main_topic_data["main_topic"], "topics", completion_cost(completion_result), **cost_entry_fields(completion_result))
 
     return {
         "main_topic_id": main_topic_id,
@@ -173,10 +149,9 @@ async def create_listof_topic(topic):
 # Translate topic from user
 async def translate_topic(topic: str) -> str:
     try:
-        translator = GoogleTranslator(source='id', target='en')
         # Ensure the topic is not more than 400 characters
         truncated_topic = topic[:400]
-        translated_topic = translator.translate(truncated_topic)
+        translated_topic = (await translate_segments([truncated_topic], 'id', 'en'))[0]
         
         logger.debug(f"== Original topic: {truncated_topic}")
         logger.debug(f"== Translated topic: {translated_topic}")
@@ -186,7 +161,7 @@ async def translate_topic(topic: str) -> str:
         logger.error(f"Error translating topic: {str(e)}")
         raise
 
-def translate_points(points: List[str]) -> List[str]:
+async def translate_points(points: List[str]) -> List[str]:
     prompt = "Translate the following points of discussion to Bahasa Indonesia:\n\n"
     for i, point in enumerate(points, 1):
         prompt += f"{i}. {point}\n"
@@ -196,10 +171,7 @@ def translate_points(points: List[str]) -> List[str]:
         {"role": "user", "content": prompt}
     ]
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
+    completion = await chat_completion(messages, model="gpt-4o-mini")
 
     translated_text = completion.choices[0].message.content.strip()
     translated_points = translated_text.split('\n')
@@ -207,61 +179,26 @@ def translate_points(points: List[str]) -> List[str]:
 
 
 
-async def elaborate_discussionpoint(topic: str, objective: str, points_of_discussion: List[str]) -> List[Dict[str, str]]:
-    prompt_template = read_prompt("./app/prompts/prompt_detaillistof_discussionpoint.txt")
-
+def build_elaboration_messages(topic: str, objective: str, points_of_discussion: List[str]) -> list:
     points_str = "\n".join([f"  - {point}" for point in points_of_discussion])
-    prompt = prompt_template.format(topic=topic, objective=objective, pointsofdiscussion=points_str)
+    prompt = render_detail_discussionpoint(topic, objective, points_str)
 
-    messages = [
+    return [
         {"role": "system", "content": "You are an educational content developer and are a consultant for PLN Pusdiklat (education and training centre) which supports Perusahaan Listrik Negara (PLN) in running the electricity business and other related fields."},
         {"role": "user", "content": prompt}
     ]
 
-    # Calculate input tokens
-    input_token_count = count_tokens(prompt)
-
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
-
-    elaborated_content = completion.choices[0].message.content.strip()
+async def elaborate_discussionpoint(topic: str, objective: str, points_of_discussion: List[str]) -> List[Dict[str, str]]:
+    messages = build_elaboration_messages(topic, objective, points_of_discussion)
 
-    # Calculate output tokens
-    output_token_count = count_tokens(elaborated_content)
+    async def attempt(model):
+        parsed, elaborated_content, results = await structured_or_text_completion(messages, ElaborationOutput, model=model, bypass_cache=True)
+        # Parse the elaborated content into a structured format
+        if parsed is not None:
+            return [subtopic.model_dump() for subtopic in parsed.subtopics], results
+        return parse_elaboration_text(elaborated_content), results
 
-    # Calculate cost
-    total_cost_idr = calculate_cost(input_token_count, output_token_count)
-
-    # Parse the elaborated content into a structured format
-    elaborated_points = []
-    current_subtopic = None
-    current_elaboration = []
-
-    for line in elaborated_content.split('\n'):
-        line = line.strip()
-        logger.debug(f"Processing line: {line}")
-
-        if '**Subtopic:**' in line:
-            if current_subtopic:
-                elaborated_points.append({
-                    "subtopic": current_subtopic,
-                    "elaboration": '\n'.join(current_elaboration)
-                })
-            current_subtopic = line.split('**Subtopic:**')[1].strip()
-            current_elaboration = []
-            logger.debug(f"Found new subtopic: {current_subtopic}")
-        elif '**Discussion Points Elaboration:**' not in line and line:  # Non-empty line and not the omitted line
-            current_elaboration.append(line)
-            logger.debug(f"Added line to current elaboration: {line}")
-
-    # Add the last subtopic
-    if current_subtopic:
-        elaborated_points.append({
-            "subtopic": current_subtopic,
-            "elaboration": '\n'.join(current_elaboration)
-        })
+    elaborated_points, results = await route_completion("elaboration", attempt)
 
     # Store elaborated points in the database and get the topic_id
     topic_doc = await get_topic_by_name(topic)
@@ -271,69 +208,72 @@ async def elaborate_discussionpoint(topic: str, objective: str, points_of_discus
         for point in elaborated_points:
             await add_elaborated_point(point['subtopic'], point['elaboration'], topic_id)
 
-    # Store cost information in cost_ai_collection
-    cost_data = {
-        "datetime": datetime.utcnow(),
-        "topic_id": str(topic_id),
-        "content": topic,
-        "process_name": "elaboration",
-        "cost": round(total_cost_idr)  
-    }
-    cost_ai_collection.insert_one(cost_data)
+    # Store cost information in cost_ai_collection, from the usage reported by the API
+    for result in results:
+        await add_cost_entry(topic_id, topic, "elaboration", completion_cost(result), **cost_entry_fields(result))
 
     return elaborated_points
 
+async def stream_elaborate_discussionpoint(topic: str, objective: str, points_of_discussion: List[str], topic_id=None):
+    # Streams the elaboration and stores each subtopic as soon as the next "**Subtopic:**"
+    # boundary closes it. Yields {"type": "point", "point_id", "subtopic", "elaboration"} per
+    # stored point so callers can start prompting right away, then one {"type": "done", ...}.
+    messages = build_elaboration_messages(topic, objective, points_of_discussion)
+
+    if topic_id is None:
+        topic_doc = await get_topic_by_name(topic)
+        topic_id = topic_doc['_id'] if topic_doc else None
+    parser = SubtopicStreamParser()
+    elaborated_points = []
+
+    async def store(points):
+        for point in points:
+            elaborated_points.append(point)
+            if topic_id is None:
+                continue
+            point_id = await add_elaborated_point(point['subtopic'], point['elaboration'], topic_id)
+            yield {"type": "point", "point_id": str(point_id), **point}
+
+    async for event in stream_chat_completion(messages, model=primary_model("elaboration"), bypass_cache=True):
+        if event["type"] == "delta":
+            async for point_event in store(parser.feed(event["content"])):
+                yield point_event
+        else:
+            async for point_event in store(parser.close()):
+                yield point_event
+            total_cost_idr = completion_cost(event)
+            await add_cost_entry(topic_id, topic, "elaboration", total_cost_idr, **cost_entry_fields(event))
+            yield {"type": "done", "points": elaborated_points, "usage": event["usage"], "cost": round(total_cost_idr)}
+
 
 # 🔰 Individual functions to generate prompting
-async def generate_prompting(elaboration: str, point_of_discussion: str, topic_id: str) -> str:
-    prompt_template = read_prompt("./app/prompts/prompt_create_prompttowrite.txt")
-    
-    prompt = prompt_template.replace("{point_of_discussion}", point_of_discussion)
-    prompt = prompt.replace("{elaboration}", elaboration)
+def build_prompting_messages(point_of_discussion: str, elaboration: str) -> list:
+    prompt = render_prompt_to_write(point_of_discussion, elaboration)
 
-    messages = [
+    return [
         {"role": "system", "content": "You are an educational content developer and are a consultant for PLN Pusdiklat (education and training centre) which supports Perusahaan Listrik Negara (PLN) in running the electricity business and other related fields."},
         {"role": "user", "content": prompt}
     ]
 
-    # Calculate input tokens
-    input_token_count = count_tokens(prompt)
-
-    # Use asyncio.to_thread to run the synchronous OpenAI call in a separate thread
-    completion = await asyncio.to_thread(
-        client.chat.completions.create,
-        model="gpt-4o-mini",
-        messages=messages
-    )
+async def generate_prompting(elaboration: str, point_of_discussion: str, topic_id: str, bypass_cache: bool = False) -> str:
+    messages = build_prompting_messages(point_of_discussion, elaboration)
 
-    prompting_content = completion.choices[0].message.content.strip()
+    async def attempt(model):
+        result = await cached_chat_completion(messages, model=model, bypass_cache=bypass_cache)
+        return result["content"].strip(), [result]
 
-    # Calculate output tokens
-    output_token_count = count_tokens(prompting_content)
+    prompting_content, results = await route_completion("prompting", attempt)
 
-    # Calculate cost
-    total_cost_idr = calculate_cost(input_token_count, output_token_count)
-
-    # Store cost information in cost_ai_collection
-    cost_data = {
-        "datetime": datetime.utcnow(),
-        "topic_id": str(topic_id),
-        "content": point_of_discussion,
-        "process_name": "prompting",
-        "cost": round(total_cost_idr)
-    }
-    await asyncio.to_thread(cost_ai_collection.insert_one, cost_data)
+    # Store cost information in cost_ai_collection, cache hits are free
+    for result in results:
+        await add_cost_entry(topic_id, point_of_discussion, "prompting", completion_cost(result), **cost_entry_fields(result))
 
     return prompting_content
 
-async def generate_handout(point_of_discussion: str, prompting: str, topic_id: str) -> str:
-    if not prompting:
-        logger.warning(f"Prompting is empty for point of discussion: {point_of_discussion}")
-        return ""
-    
+def build_handout_messages(point_of_discussion: str, prompting: str) -> list:
     myprompt = f"The topic is {point_of_discussion} and here's the detail instruction: {prompting}"
 
-    messages = [
+    return [
         {
             "role": "system",
             "content": "You are an educational content developer and are a consultant for PLN Pusdiklat (education and training centre) which supports Perusahaan Listrik Negara (PLN) in running the electricity business and other related fields. Create a detailed and comprehensive section for a book chapter that addresses the provided discussion points. The content should be tailored for PLN Persero employees who have diverse educational backgrounds, ensuring that the explanations are technically informative yet understandable for non-technical staff. The aim of this book chapter is to provide PLN Persero employees with a well-rounded understanding of the provided discussion points."
@@ -344,42 +284,44 @@ async def generate_handout(point_of_discussion: str, prompting: str, topic_id: s
         }
     ]
 
-    input_token_count = count_tokens(myprompt)
+async def generate_handout(point_of_discussion: str, prompting: str, topic_id: str, bypass_cache: bool = False) -> str:
+    if not prompting:
+        logger.warning(f"Prompting is empty for point of discussion: {point_of_discussion}")
+        return ""
 
-    completion = await asyncio.to_thread(
-        client.chat.completions.create,
-        model="gpt-4o-mini",
-        messages=messages
-    )
+    messages = build_handout_messages(point_of_discussion, prompting)
 
-    handout_content = completion.choices[0].message.content.strip()
+    async def attempt(model):
+        result = await cached_chat_completion(messages, model=model, bypass_cache=bypass_cache)
+        return result["content"].strip(), [result]
 
-    output_token_count = count_tokens(handout_content)
-    total_cost_idr = calculate_cost(input_token_count, output_token_count)
+    handout_content, results = await route_completion("handout", attempt)
 
-    cost_data = {
-        "datetime": datetime.utcnow(),
-        "topic_id": str(topic_id),
-        "content": point_of_discussion,
-        "process_name": "handout",
-        "cost": round(total_cost_idr)
-    }
-    await asyncio.to_thread(cost_ai_collection.insert_one, cost_data)
+    for result in results:
+        await add_cost_entry(topic_id, point_of_discussion, "handout", completion_cost(result), **cost_entry_fields(result))
 
     return handout_content
 
-async def generate_misc_points(point_of_discussion: str, handout: str, topic_id: str) -> dict:
-    if not handout:
-        logger.warning(f"Handout is empty for point of discussion: {point_of_discussion}")
-        return ""    
-    
-    prompt_template = read_prompt("./app/prompts/prompt_misc_points.txt")
-    my_prompt = prompt_template + f"Topiknya {point_of_discussion} dan berikut adalah informasinya: {handout}"
+async def stream_handout(point_of_discussion: str, prompting: str, topic_id: str, bypass_cache: bool = False):
+    # Yields completion deltas; the final "done" event carries the full handout once usage is known
+    messages = build_handout_messages(point_of_discussion, prompting)
 
-    messages = [
+    async for event in stream_chat_completion(messages, model=primary_model("handout"), bypass_cache=bypass_cache):
+        if event["type"] == "done":
+            total_cost_idr = completion_cost(event)
+            await add_cost_entry(topic_id, point_of_discussion, "handout", total_cost_idr, **cost_entry_fields(event))
+            event = {**event, "content": event["content"].strip(), "cost": round(total_cost_idr)}
+        yield event
+
+MISC_POINTS_SYSTEM_PROMPT = "Anda adalah seorang pengembang konten edukasi dan merupakan konsultan untuk Pusdiklat PLN yang mendukung Perusahaan Listrik Negara (PLN) dalam menjalankan bisnis ketenagalistrikan dan bidang-bidang terkait lainnya. Anda harus memberikan jawaban dalam bahasa Indonesia."
+
+def build_misc_points_messages(point_of_discussion: str, handout: str) -> list:
+    my_prompt = render_misc_points_instructions() + f"\n\nTopiknya {point_of_discussion} dan berikut adalah informasinya: {handout}"
+
+    return [
         {
             "role": "system",
-            "content": "Anda adalah seorang pengembang konten edukasi dan merupakan konsultan untuk Pusdiklat PLN yang mendukung Perusahaan Listrik Negara (PLN) dalam menjalankan bisnis ketenagalistrikan dan bidang-bidang terkait lainnya. Anda harus memberikan jawaban dalam bahasa Indonesia."
+            "content": MISC_POINTS_SYSTEM_PROMPT
         },
         {
             "role": "user",
@@ -387,67 +329,34 @@ async def generate_misc_points(point_of_discussion: str, handout: str, topic_id:
         }
     ]
 
-    try:
-        input_token_count = count_tokens(my_prompt)
-
-        completion = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="gpt-4o-mini",
-            messages=messages
-        )
-
-        response = completion.choices[0].message.content.strip()
-        logger.debug(f"\n😊 ==!== OpenAI response: {response}")
-
-        output_token_count = count_tokens(response)
-        total_cost_idr = calculate_cost(input_token_count, output_token_count)
-
-        cost_data = {
-            "datetime": datetime.utcnow(),
-            "topic_id": str(topic_id),
-            "content": point_of_discussion,
-            "process_name": "misc_points",
-            "cost": round(total_cost_idr)
-        }
-        await asyncio.to_thread(cost_ai_collection.insert_one, cost_data)
-
-        # Parse the response (existing code)
-        method = re.search(r'\[Usulan Durasi Waktu\]\n\n(.*?)(?=\*\*Durasi Total\*\*|\n###|\Z)', response, re.DOTALL)
-        assessment = re.search(r'\[Identifikasi Kriteria Penilaian\]\n\n(.*?)(?=\n###|\Z)', response, re.DOTALL)
-        learn_objective = re.search(r'\[Tujuan Pembelajaran\]\n\n(.*?)(?=\n###|\Z)', response, re.DOTALL)
-
-        duration_match = re.search(r'\*\*Durasi Total\*\*:\s*(\d+)\s*menit', response)
-        duration = int(duration_match.group(1))
+async def generate_misc_points(point_of_discussion: str, handout: str, topic_id: str, bypass_cache: bool = False) -> dict:
+    if not handout:
+        logger.warning(f"Handout is empty for point of discussion: {point_of_discussion}")
+        return ""    
+    
+    messages = build_misc_points_messages(point_of_discussion, handout)
 
-        logger.debug(f"\n\n==!!-- str(topic_id): {str(topic_id)}")
-        logger.debug(f"==!!-- point_of_discussion: {point_of_discussion}")
-        logger.debug(f"==!!-- method: {method.group(1).strip() if method else ''}")
-        logger.debug(f"==!!-- assessment: {assessment.group(1).strip() if assessment else ''}")
-        logger.debug(f"==!!-- learn_objective: {learn_objective.group(1).strip() if learn_objective else ''}")
-        logger.debug(f"==!!-- duration: {duration}\n\n")
+    try:
+        async def attempt(model):
+            parsed, response, results = await structured_or_text_completion(messages, MiscPointsOutput, model=model, bypass_cache=bypass_cache)
+            if parsed is not None:
+                return parsed.model_dump(), results
+            return parse_misc_points_text(response), results
 
+        misc_points, results = await route_completion("misc_points", attempt)
 
-        result = {
-            "method": method.group(1).strip() if method else "",
-            "assessment": assessment.group(1).strip() if assessment else "",
-            "learn_objective": learn_objective.group(1).strip() if learn_objective else "",
-            "duration": duration
-        }
+        for completion_result in results:
+            await add_cost_entry(topic_id, point_of_discussion, "misc_points", completion_cost(completion_result), **cost_entry_fields(completion_result))
 
-        return result
+        return misc_points
     except Exception as e:
         logger.error(f"Error generating misc points: {str(e)}")
         raise
 
-async def generate_quiz(point_of_discussion: str, handout: str, topic_id: str) -> str:
-    if not handout:
-        logger.warning(f"Handout is empty for point of discussion: {point_of_discussion}")
-        return ""        
-    
-    prompt_template = read_prompt("./app/prompts/prompt_quiz.txt")
-    my_prompt = prompt_template + f"The topic is {point_of_discussion} and here's the information: {handout}"
+def build_quiz_messages(point_of_discussion: str, handout: str) -> list:
+    my_prompt = render_quiz_instructions() + f"\n\nThe topic is {point_of_discussion} and here's the information: {handout}"
 
-    messages = [
+    return [
         {
             "role": "system",
             "content": "You are an educational content developer and are a consultant for PLN Pusdiklat (education and training centre) which supports Perusahaan Listrik Negara (PLN) in running the electricity business and other related fields. Provide response in bahasa Indonesia."
@@ -458,32 +367,29 @@ async def generate_quiz(point_of_discussion: str, handout: str, topic_id: str) -
         }
     ]
 
-    try:
-        input_token_count = count_tokens(my_prompt)
+def clean_quiz(response: str) -> str:
+    # Remove the '#### Kuis Pilihan Ganda' text if present
+    return response.replace('#### Kuis Pilihan Ganda', '').strip()
 
-        completion = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="gpt-4o-mini",
-            messages=messages
-        )
+async def generate_quiz(point_of_discussion: str, handout: str, topic_id: str, bypass_cache: bool = False) -> str:
+    if not handout:
+        logger.warning(f"Handout is empty for point of discussion: {point_of_discussion}")
+        return ""        
+    
+    messages = build_quiz_messages(point_of_discussion, handout)
 
-        response = completion.choices[0].message.content.strip()
-        logger.debug(f"OpenAI response for quiz: {response}")
+    try:
+        async def attempt(model):
+            completion_result = await cached_chat_completion(messages, model=model, bypass_cache=bypass_cache)
+            response = completion_result["content"].strip()
+            logger.debug(f"OpenAI response for quiz: {response}")
+            return clean_quiz(response), [completion_result]
 
-        output_token_count = count_tokens(response)
-        total_cost_idr = calculate_cost(input_token_count, output_token_count)
+        cleaned_response, results = await route_completion("quiz", attempt)
 
-        cost_data = {
-            "datetime": datetime.utcnow(),
-            "topic_id": str(topic_id),
-            "content": point_of_discussion,
-            "process_name": "quiz",
-            "cost": round(total_cost_idr)
-        }
-        await asyncio.to_thread(cost_ai_collection.insert_one, cost_data)
+        for completion_result in results:
+            await add_cost_entry(topic_id, point_of_discussion, "quiz", completion_cost(completion_result), **cost_entry_fields(completion_result))
 
-        # Remove the '#### Kuis Pilihan Ganda' text if present
-        cleaned_response = response.replace('#### Kuis Pilihan Ganda', '').strip()
         logger.debug(f"Cleaned quiz content: {cleaned_response}")
 
         return cleaned_response
@@ -492,15 +398,53 @@ async def generate_quiz(point_of_discussion: str, handout: str, topic_id: str) -
         logger.error(f"Error generating quiz: {str(e)}")
         raise
 
-def generate_handout_translation(handout: str) -> str:
-    try:
-        translator = GoogleTranslator(source='en', target='id')
-        # Translate in chunks of 5000 characters to avoid length limits
-        chunks = [handout[i:i+3000] for i in range(0, len(handout), 3000)]
-        translated_chunks = [translator.translate(chunk) for chunk in chunks]
+def build_misc_quiz_messages(point_of_discussion: str, handout: str) -> list:
+    # Both instruction sets up front and the handout once at the end, so the largest input is sent a single time
+    my_prompt = (
+        "Kerjakan dua tugas berikut untuk konten yang sama dan kembalikan hasilnya dalam satu JSON.\n\n"
+        "## Tugas 1: Modul edukasi (learn_objective, method, duration, assessment)\n\n"
+        + render_misc_points_instructions()
+        + "\n\n## Tugas 2: Kuis pilihan ganda (quiz, dalam markdown)\n\n"
+        + render_quiz_instructions()
+        + f"\n\nTopiknya {point_of_discussion} dan berikut adalah informasinya: {handout}"
+    )
 
-        # Join the translated chunks back into a single string
-        translated_handout = ' '.join(translated_chunks)
+    return [
+        {"role": "system", "content": MISC_POINTS_SYSTEM_PROMPT},
+        {"role": "user", "content": my_prompt}
+    ]
+
+async def generate_misc_points_and_quiz(point_of_discussion: str, handout: str, topic_id: str, bypass_cache: bool = False):
+    # One structured call for misc points and quiz. Returns None when the output does not
+    # validate, so the caller can fall back to the two separate calls.
+    if not handout:
+        logger.warning(f"Handout is empty for point of discussion: {point_of_discussion}")
+        return None
+
+    messages = build_misc_quiz_messages(point_of_discussion, handout)
+
+    async def attempt(model):
+        result = await structured_chat_completion(messages, MiscQuizOutput, model=model, bypass_cache=bypass_cache)
+        if result["parsed"] is None:
+            return None, [result]
+        combined = result["parsed"].model_dump()
+        quiz_content = clean_quiz(combined.pop("quiz"))
+        return {"misc_points": combined, "quiz": quiz_content}, [result]
+
+    combined, results = await route_completion("misc_quiz", attempt)
+
+    for result in results:
+        await add_cost_entry(topic_id, point_of_discussion, "misc_quiz", completion_cost(result), **cost_entry_fields(result))
+
+    # Still invalid after the cascade: the caller falls back to the separate calls
+    if combined is None or validate_misc_quiz(combined):
+        return None
+    return combined
+
+async def generate_handout_translation(handout: str) -> str:
+    try:
+        # Segmented on markdown and sentence boundaries, translated concurrently, layout kept as is
+        translated_handout = await translate_markdown(handout, 'en', 'id')
 
         logger.debug(f"Translated handout: {translated_handout}")
         return translated_handout
@@ -513,9 +457,9 @@ async def generate_topic_imageicon(topic: str, main_topic_id: str) -> str:
     prompt = f"Create a color minimalist icon-like image depicting the information of the training topic: {topic}. The image should be simple, professional, and easily recognizable. There should not be any text on the image."
 
     try:
-        response = client.images.generate(
+        response = await generate_image(
+            prompt,
             model="dall-e-3",
-            prompt=prompt,
             size="1024x1024",
             quality="standard",
             n=1,
@@ -532,7 +476,7 @@ async def generate_topic_imageicon(topic: str, main_topic_id: str) -> str:
             raise ValueError("No image URL in the response")
 
         # Download the image from the URL
-        image_response = requests.get(image_url)
+        image_response = await call_blocking_with_policy("openai", requests.get, image_url, timeout=IMAGE_DOWNLOAD_TIMEOUT)
         image_response.raise_for_status()  # Raise an exception for bad status codes
 
         # Create the resources directory if it doesn't exist
@@ -564,61 +508,39 @@ async def generate_topic_imageicon(topic: str, main_topic_id: str) -> str:
         raise HTTPException(
             status_code=500, detail=f"Error generating image: {str(e)}")
 
-async def get_all_cost(main_topic_id: str):
-    # Get the main topic document
-    main_topic = await main_topic_collection.find_one({"_id": ObjectId(main_topic_id)})
+async def get_all_cost(main_topic_id: str, totals_only: bool = False, include_debug: bool = False):
+    # The main topic and the cost aggregation run concurrently, one round trip each
+    main_topic, costs = await asyncio.gather(
+        main_topic_collection.find_one({"_id": ObjectId(main_topic_id)}, {"main_topic": 1}),
+        get_cost_breakdown_by_main_topic_id(main_topic_id, totals_only=totals_only, include_ids=include_debug)
+    )
     if not main_topic:
         logger.warning(f"Main topic not found for ID: {main_topic_id}")
-        return None, [], {}
-
-    all_costs = []
-    debug_info = {
-        "main_topic_id": main_topic_id,
-        "list_topics": [],
-        "cost_entries": []
-    }
-
-    # Convert ObjectId to string for querying list_topics_collection
-    list_topics_query = {"main_topic_id": main_topic_id}
-    logger.info(f"Querying list_topics_collection with: {list_topics_query}")
-
-    list_topics_cursor = list_topics_collection.find(list_topics_query)
-    list_topics_docs = await list_topics_cursor.to_list(length=None)
-
-    logger.info(f"Found {len(list_topics_docs)} list topics for main topic {main_topic_id}")
-
-    for list_topic in list_topics_docs:
-        topic_id_str = str(list_topic["_id"])
-        logger.info(f"Checking costs for topic: {list_topic['topic_name']} (ID: {topic_id_str})")
-
-        # Query cost_ai_collection using string representation of topic_id
-        cost_cursor = cost_ai_collection.find({"topic_id": topic_id_str})
-        cost_docs = await cost_cursor.to_list(length=None)
+        return None
 
-        logger.info(f"Found {len(cost_docs)} cost entries for topic {list_topic['topic_name']}")
-
-        if len(cost_docs) == 0:
-            logger.warning(f"No cost entries found for topic {list_topic['topic_name']} (ID: {topic_id_str})")
-
-        for cost in cost_docs:
-            cost_entry = {
-                'topic_name': list_topic['topic_name'],
-                'content': cost['content'],
-                'process_name': cost['process_name'],
-                'cost': cost['cost'],
-                'datetime': cost['datetime']
-            }
-            all_costs.append(cost_entry)
-            debug_info["cost_entries"].append({
-                "topic_id": topic_id_str,
-                "cost_id": str(cost['_id']),
-                "process_name": cost['process_name']
-            })
-
-    if not all_costs:
+    if not costs["entries"]:
         logger.warning(f"No cost entries found for main topic {main_topic_id}")
 
-    return main_topic['main_topic'], all_costs, debug_info
+    result = {
+        "main_topic": main_topic["main_topic"],
+        "total_cost": costs["total_cost"],
+        "breakdown": costs["breakdown"],
+    }
+    if not totals_only:
+        result["costs"] = costs["items"]
+    if include_debug:
+        list_topics = await list_topics_collection.find({"main_topic_id": main_topic_id_match(main_topic_id)}, {"_id": 1}).to_list(length=None)
+        result["debug_info"] = {
+            "main_topic_id": main_topic_id,
+            "list_topics": [str(list_topic["_id"]) for list_topic in list_topics],
+            "cost_entries": [
+                {"topic_id": item["topic_id"], "cost_id": item["cost_id"], "process_name": item["process_name"]}
+                for item in costs["items"] or []
+            ]
+        }
+        for item in costs["items"] or []:
+            del item["topic_id"], item["cost_id"]
+    return result
 
 async def do_analisis_kebutuhan(main_topic: str, points_of_discussion: List[str], nama_jabatan: str, job_description: str) -> str:
     prompt = f"Lakukan analisis, bagi jabatan {nama_jabatan} yang memiliki deskripsi pekerjaan atau tugas pokok dan fungsi berikut {job_description}, apakah memerlukan pelatihan bertopik {main_topic} yang memiliki detail pembahasan berikut {', '.join(points_of_discussion)}. Jika tidak perlu, sebutkan argumen atau alasannya. Jika perlu, maka berikan juga argumennya, dan sebutkan detail pembahasan mana saja tepatnya yang dibutuhkan. Jika dibutuhkan semua, maka sampaikan saja semua. Jika tidak, sebutkan mana-mana yang tepatnya relavan bagi nama_jabatan bersangkutan."
@@ -629,11 +551,7 @@ async def do_analisis_kebutuhan(main_topic: str, points_of_discussion: List[str]
     ]
 
     try:
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="gpt-4o-mini",
-            messages=messages
-        )
+        response = await chat_completion(messages, model="gpt-4o-mini")
 
         analysis_result = response.choices[0].message.content.strip()
         return analysis_result
@@ -0,0 +1,176 @@
+# app/services/output_parsers.py
+# Structured output schemas for the generation stages, plus the regex parsers for
+# free-text completions, which stay as the fallback path.
+import os
+import re
+import logging
+from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUTS_ENABLED = os.getenv("STRUCTURED_OUTPUTS_ENABLED", "true").lower() == "true"
+
+
+class TopicOutput(BaseModel):
+    topic_name: str = Field(description="Topic Title: the name of the training session")
+    objective: str = Field(description="What participants will achieve by the end of the session")
+    key_concepts: str = Field(description="Comma separated main ideas and theories covered")
+    skills_to_be_mastered: str = Field(description="Skills participants will practice and master")
+    point_of_discussion: List[str] = Field(description="Points covered in the session, one per item")
+
+
+class ListOfTopicsOutput(BaseModel):
+    topics: List[TopicOutput]
+
+
+class SubtopicOutput(BaseModel):
+    subtopic: str = Field(description="Subtopic title")
+    elaboration: str = Field(description="Markdown bullet list elaborating the subtopic's discussion points, examples and case studies")
+
+
+class ElaborationOutput(BaseModel):
+    subtopics: List[SubtopicOutput]
+
+
+class MiscPointsOutput(BaseModel):
+    learn_objective: str = Field(description="[Tujuan Pembelajaran] as a markdown numbered list")
+    method: str = Field(description="[Usulan Durasi Waktu]: delivery methodology and per-part durations in markdown")
+    duration: int = Field(description="Durasi Total in minutes")
+    assessment: str = Field(description="[Identifikasi Kriteria Penilaian] as a markdown numbered list")
+
+
+class MiscQuizOutput(MiscPointsOutput):
+    quiz: str = Field(description="Kuis Pilihan Ganda in markdown: numbered questions, options A-D, the correct answer and its rationale")
+
+
+def strict_json_schema(schema: dict) -> dict:
+    # Strict structured outputs want every object closed and every property required
+    if isinstance(schema, dict):
+        schema = {key: strict_json_schema(value) for key, value in schema.items() if key != "title"}
+        if schema.get("type") == "object" and "properties" in schema:
+            schema["additionalProperties"] = False
+            schema["required"] = list(schema["properties"])
+        return schema
+    if isinstance(schema, list):
+        return [strict_json_schema(item) for item in schema]
+    return schema
+
+
+def response_format_for(output_model) -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": output_model.__name__,
+            "strict": True,
+            "schema": strict_json_schema(output_model.model_json_schema()),
+        }
+    }
+
+
+def parse_structured(output_model, content: str) -> Optional[BaseModel]:
+    # Single pass JSON decode and validation; None means the caller should fall back
+    if not content:
+        return None
+    try:
+        return output_model.model_validate_json(content)
+    except ValidationError as e:
+        logger.warning(f"Structured output did not validate as {output_model.__name__}: {e.error_count()} errors")
+        return None
+
+
+TOPIC_PATTERN = re.compile(r'\d+\.\s+\*\*Topic Title:\*\* (.*?)\n', re.DOTALL)
+OBJECTIVE_PATTERN = re.compile(r'- \*\*Objective:\*\* (.*?)(?:\n|$)', re.DOTALL)
+KEY_CONCEPTS_PATTERN = re.compile(r'- \*\*Key Concepts:\*\* (.*?)(?:\n|$)', re.DOTALL)
+SKILLS_PATTERN = re.compile(r'- \*\*Skills to be Mastered:\*\* (.*?)(?:\n|$)', re.DOTALL)
+DISCUSSION_PATTERN = re.compile(r'- \*\*Point of Discussion:\*\*\n(.*?)(?=\n\s*\n|\Z)', re.DOTALL)
+
+
+def first_group(pattern, text: str) -> str:
+    match = pattern.search(text)
+    return match.group(1).strip() if match else ""
+
+
+def parse_topics_text(content: str) -> List[dict]:
+    parsed_topics = []
+    for section in content.split('\n\n'):
+        topic_match = TOPIC_PATTERN.search(section)
+        if not topic_match:
+            continue
+        topic = {
+            "topic_name": topic_match.group(1).strip(),
+            "objective": first_group(OBJECTIVE_PATTERN, section),
+            "key_concepts": first_group(KEY_CONCEPTS_PATTERN, section),
+            "skills_to_be_mastered": first_group(SKILLS_PATTERN, section),
+            "point_of_discussion": []
+        }
+        discussion = first_group(DISCUSSION_PATTERN, section)
+        if discussion:
+            topic["point_of_discussion"] = [point.strip('- ').strip() for point in discussion.split('\n')]
+        parsed_topics.append(topic)
+    return parsed_topics
+
+
+def parse_elaboration_text(content: str) -> List[dict]:
+    parser = SubtopicStreamParser()
+    return parser.feed(content) + parser.close()
+
+
+class SubtopicStreamParser:
+    # Incremental version of parse_elaboration_text for streamed completions: feed() takes
+    # text deltas and returns the subtopics completed so far, as soon as the next
+    # "**Subtopic:**" line shows their end; close() returns the last one.
+    def __init__(self):
+        self.buffer = ""
+        self.current_subtopic = None
+        self.current_elaboration = []
+
+    def feed(self, delta: str) -> List[dict]:
+        self.buffer += delta
+        *lines, self.buffer = self.buffer.split('\n')
+        completed = []
+        for line in lines:
+            point = self._process_line(line)
+            if point:
+                completed.append(point)
+        return completed
+
+    def close(self) -> List[dict]:
+        completed = self.feed('\n')
+        if self.current_subtopic:
+            completed.append({"subtopic": self.current_subtopic, "elaboration": '\n'.join(self.current_elaboration)})
+            self.current_subtopic = None
+        return completed
+
+    def _process_line(self, line: str) -> Optional[dict]:
+        line = line.strip()
+        if '**Subtopic:**' in line:
+            finished = None
+            if self.current_subtopic:
+                finished = {"subtopic": self.current_subtopic, "elaboration": '\n'.join(self.current_elaboration)}
+            self.current_subtopic = line.split('**Subtopic:**')[1].strip()
+            self.current_elaboration = []
+            return finished
+        if line and '**Discussion Points Elaboration:**' not in line:
+            self.current_elaboration.append(line)
+        return None
+
+
+METHOD_PATTERN = re.compile(r'\[Usulan Durasi Waktu\]\n\n(.*?)(?=\*\*Durasi Total\*\*|\n###|\Z)', re.DOTALL)
+# Sections end at the next "[Heading]" or "###" line
+ASSESSMENT_PATTERN = re.compile(r'\[Identifikasi Kriteria Penilaian\]\n\n(.*?)(?=\n\[|\n###|\Z)', re.DOTALL)
+LEARN_OBJECTIVE_PATTERN = re.compile(r'\[Tujuan Pembelajaran\]\n\n(.*?)(?=\n\[|\n###|\Z)', re.DOTALL)
+# The prompt's own example omits "menit", so the unit is optional
+DURATION_PATTERN = re.compile(r'\*\*Durasi Total\*\*:?\s*(\d+)\s*(?:menit)?', re.IGNORECASE)
+
+
+def parse_misc_points_text(content: str) -> dict:
+    duration_match = DURATION_PATTERN.search(content)
+    if not duration_match:
+        logger.warning("No total duration found in misc points response")
+    return {
+        "method": first_group(METHOD_PATTERN, content),
+        "assessment": first_group(ASSESSMENT_PATTERN, content),
+        "learn_objective": first_group(LEARN_OBJECTIVE_PATTERN, content),
+        "duration": int(duration_match.group(1)) if duration_match else None
+    }
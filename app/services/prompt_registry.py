@@ -0,0 +1,112 @@
+# app/services/prompt_registry.py
+import os
+import re
+import time
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+# How often (seconds) a template's mtime is re-checked for hot reload
+PROMPT_RELOAD_CHECK_SECONDS = float(os.getenv("PROMPT_RELOAD_CHECK_SECONDS", "2"))
+
+# Matches {{name}} and {name} placeholders
+PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}|\{(\w+)\}')
+
+
+class PromptTemplate:
+    def __init__(self, name: str, path: str, text: str, mtime: float):
+        self.name = name
+        self.path = path
+        self.text = text
+        self.mtime = mtime
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self.parts = self._compile(text)
+        self.placeholders = {field for _, field in self.parts if field}
+        # Literal text before the first placeholder: byte-identical across renders, so templates
+        # keep per-call content at the end and the provider can serve this part from its prompt cache
+        self.static_prefix = self.parts[0][0]
+
+    @staticmethod
+    def _compile(text: str) -> List[Tuple[str, Optional[str]]]:
+        # Pre-split the template into (literal, placeholder) pairs so rendering is a single join
+        parts = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            parts.append((text[position:match.start()], match.group(1) or match.group(2)))
+            position = match.end()
+        parts.append((text[position:], None))
+        return parts
+
+    def render(self, **values) -> str:
+        missing = self.placeholders - values.keys()
+        if missing:
+            raise KeyError(f"Missing values for prompt {self.name}: {', '.join(sorted(missing))}")
+        return "".join(literal + (values[field] if field else "") for literal, field in self.parts)
+
+
+class PromptRegistry:
+    def __init__(self, prompts_dir: str = PROMPTS_DIR):
+        self.prompts_dir = prompts_dir
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._last_checked: Dict[str, float] = {}
+
+    def load_all(self):
+        for filename in sorted(os.listdir(self.prompts_dir)):
+            if filename.endswith(".txt"):
+                self._load(filename[:-len(".txt")])
+        logger.info(f"Loaded {len(self._templates)} prompt templates from {self.prompts_dir}")
+
+    def _load(self, name: str) -> PromptTemplate:
+        path = os.path.join(self.prompts_dir, f"{name}.txt")
+        mtime = os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as file:
+            template = PromptTemplate(name, path, file.read(), mtime)
+        self._templates[name] = template
+        self._last_checked[name] = time.monotonic()
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        template = self._templates.get(name)
+        if template is None:
+            return self._load(name)
+
+        now = time.monotonic()
+        if now - self._last_checked[name] >= PROMPT_RELOAD_CHECK_SECONDS:
+            self._last_checked[name] = now
+            if os.stat(template.path).st_mtime != template.mtime:
+                logger.info(f"Prompt template {name} changed on disk, reloading")
+                template = self._load(name)
+        return template
+
+    def versions(self) -> Dict[str, str]:
+        return {name: template.version for name, template in self._templates.items()}
+
+
+prompt_registry = PromptRegistry()
+
+
+def render_listof_topic(topic: str) -> str:
+    return prompt_registry.get("prompt_listof_topic").render(topic=topic)
+
+
+def render_detail_discussionpoint(topic: str, objective: str, points_of_discussion: str) -> str:
+    return prompt_registry.get("prompt_detaillistof_discussionpoint").render(
+        topic=topic, objective=objective, pointsofdiscussion=points_of_discussion
+    )
+
+
+def render_prompt_to_write(point_of_discussion: str, elaboration: str) -> str:
+    return prompt_registry.get("prompt_create_prompttowrite").render(
+        point_of_discussion=point_of_discussion, elaboration=elaboration
+    )
+
+
+def render_misc_points_instructions() -> str:
+    return prompt_registry.get("prompt_misc_points").render()
+
+
+def render_quiz_instructions() -> str:
+    return prompt_registry.get("prompt_quiz").render()
@@ -0,0 +1,205 @@
+# app/services/rate_limiter.py
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from app.db.database import rate_limits_collection
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Coordinate budgets across worker processes through per-minute counters in Mongo
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "false").lower() == "true"
+# Fraction of the quota we aim to use, leaving room for estimation error
+RATE_LIMIT_HEADROOM = float(os.getenv("RATE_LIMIT_HEADROOM", "0.9"))
+# Completion tokens assumed for a request that does not set max_tokens
+RATE_LIMIT_COMPLETION_ESTIMATE = int(os.getenv("RATE_LIMIT_COMPLETION_ESTIMATE", "1000"))
+
+# Starting budgets per minute; the limits reported in response headers replace them
+DEFAULT_RATE_LIMITS = {
+    "gpt-4o": {"rpm": 500, "tpm": 30000},
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200000},
+    "dall-e-3": {"rpm": 7, "tpm": None},
+}
+
+
+def model_limits(model: str) -> dict:
+    # Overridable per model, e.g. RATE_LIMIT_GPT_4O_MINI_TPM=2000000
+    env_key = re.sub(r"[^A-Z0-9]", "_", model.upper())
+    defaults = DEFAULT_RATE_LIMITS.get(model, DEFAULT_RATE_LIMITS["gpt-4o-mini"])
+    limits = {}
+    for name in ("rpm", "tpm"):
+        value = os.getenv(f"RATE_LIMIT_{env_key}_{name.upper()}", defaults[name])
+        limits[name] = int(value) if value else None
+    return limits
+
+
+def parse_reset_duration(value) -> float:
+    # OpenAI reports resets like "20ms", "1s" or "6m0s"
+    if not value:
+        return 0.0
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", str(value)))
+
+
+def estimate_tokens(messages, max_tokens=None) -> int:
+    # Cheap pre-send estimate (~4 characters per token); settle() corrects it from the reported usage
+    prompt_tokens = sum(len(str(message.get("content", ""))) // 4 + 4 for message in messages)
+    return prompt_tokens + (max_tokens or RATE_LIMIT_COMPLETION_ESTIMATE)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute * RATE_LIMIT_HEADROOM
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_limit(self, per_minute: int):
+        self._refill()
+        capacity = per_minute * RATE_LIMIT_HEADROOM
+        self.tokens = min(self.tokens + max(capacity - self.capacity, 0), capacity)
+        self.capacity = capacity
+
+    def reserve(self, amount: float) -> float:
+        # Takes the amount right away, going into debt if needed, and returns how long
+        # the caller has to wait. Later callers queue behind the debt instead of racing.
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, remaining: float):
+        # The server's view wins whenever it has less left than we think
+        self._refill()
+        self.tokens = min(self.tokens, remaining * RATE_LIMIT_HEADROOM)
+
+
+class ModelRateGovernor:
+    def __init__(self, model: str):
+        limits = model_limits(model)
+        self.model = model
+        self.requests = TokenBucket(limits["rpm"]) if limits["rpm"] else None
+        self.tokens = TokenBucket(limits["tpm"]) if limits["tpm"] else None
+        self.paused_until = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "waited_seconds": 0.0, "rate_limited": 0}
+
+    async def acquire(self, estimated_tokens: int = 0):
+        if not RATE_LIMIT_ENABLED:
+            return
+        wait = max(self.paused_until - time.monotonic(), 0.0)
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+
+        self.stats["requests"] += 1
+        if wait > 0:
+            self.stats["throttled"] += 1
+            self.stats["waited_seconds"] += wait
+            logger.debug(f"Rate limiter holding {self.model} request for {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+        if RATE_LIMIT_SHARED:
+            await reserve_shared_window(self.model, estimated_tokens, self.limits())
+
+    def limits(self) -> dict:
+        return {
+            "rpm": self.requests.capacity if self.requests else None,
+            "tpm": self.tokens.capacity if self.tokens else None,
+        }
+
+    def settle(self, estimated_tokens: int, actual_tokens):
+        # Refunds an over-estimate, or charges the difference for an under-estimate
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def update_from_headers(self, headers):
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            if bucket is None:
+                continue
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                if limit and float(limit) * RATE_LIMIT_HEADROOM != bucket.capacity:
+                    bucket.set_limit(float(limit))
+                if remaining is not None:
+                    bucket.sync(float(remaining))
+            except ValueError:
+                logger.debug(f"Ignoring malformed rate limit headers for {self.model}: {limit}, {remaining}")
+
+    def rate_limited(self, headers):
+        # A 429 got through: pause this model until the server says capacity is back
+        self.stats["rate_limited"] += 1
+        self.update_from_headers(headers)
+        retry_after = headers.get("retry-after")
+        try:
+            pause = float(retry_after) if retry_after else 0.0
+        except ValueError:
+            pause = 0.0
+        pause = max(pause, parse_reset_duration(headers.get("x-ratelimit-reset-requests")), parse_reset_duration(headers.get("x-ratelimit-reset-tokens")))
+        self.paused_until = max(self.paused_until, time.monotonic() + (pause or 1.0))
+        logger.warning(f"Rate limited on {self.model}, pausing for {pause or 1.0:.2f}s")
+
+
+async def reserve_shared_window(model: str, tokens: int, limits: dict):
+    # Fixed one-minute windows counted in Mongo, so all workers share one budget
+    while True:
+        now = time.time()
+        window = int(now // 60)
+        window_id = f"{model}:{window}"
+        counter = await rate_limits_collection.find_one_and_update(
+            {"_id": window_id},
+            {
+                "$inc": {"requests": 1, "tokens": tokens},
+                "$setOnInsert": {"model": model, "expires_at": datetime.utcnow() + timedelta(minutes=5)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        within_rpm = not limits["rpm"] or counter["requests"] <= limits["rpm"]
+        within_tpm = not limits["tpm"] or counter["tokens"] <= limits["tpm"]
+        if within_rpm and within_tpm:
+            return
+
+        await rate_limits_collection.update_one({"_id": window_id}, {"$inc": {"requests": -1, "tokens": -tokens}})
+        # Spread the waiting workers over the start of the next window
+        await asyncio.sleep((window + 1) * 60 - now + random.uniform(0, 2))
+
+
+_governors = {}
+
+
+def get_governor(model: str) -> ModelRateGovernor:
+    if model not in _governors:
+        _governors[model] = ModelRateGovernor(model)
+    return _governors[model]
+
+
+def rate_limit_stats() -> dict:
+    return {
+        model: {
+            **governor.stats,
+            "limits": governor.limits(),
+            "available": {
+                "requests": governor.requests.tokens if governor.requests else None,
+                "tokens": governor.tokens.tokens if governor.tokens else None,
+            }
+        }
+        for model, governor in _governors.items()
+    }
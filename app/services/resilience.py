@@ -0,0 +1,191 @@
+# app/services/resilience.py
+# Timeouts, retries with jittered backoff and a circuit breaker for every outbound AI call
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import openai
+import requests
+from deep_translator.exceptions import TooManyRequests, RequestError
+
+logger = logging.getLogger(__name__)
+
+# Number of recent call latencies kept per upstream for the percentile metrics
+LATENCY_WINDOW = int(os.getenv("RESILIENCE_LATENCY_WINDOW", "500"))
+
+# Per upstream defaults; each can be overridden with <UPSTREAM>_CALL_<SETTING>, e.g. OPENAI_CALL_TIMEOUT=120
+UPSTREAM_DEFAULTS = {
+    # timeout: per attempt, deadline: whole call including backoff
+    "openai": {"timeout": 180, "attempts": 3, "backoff_base": 1, "backoff_max": 20, "deadline": 600,
+               "failure_threshold": 5, "reset_seconds": 30, "threads": 0},
+    "elevenlabs": {"timeout": 60, "attempts": 3, "backoff_base": 1, "backoff_max": 10, "deadline": 180,
+                   "failure_threshold": 3, "reset_seconds": 60, "threads": 4},
+    "google_translate": {"timeout": 20, "attempts": 4, "backoff_base": 0.5, "backoff_max": 8, "deadline": 90,
+                         "failure_threshold": 5, "reset_seconds": 30, "threads": 8},
+}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_rate_limited(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, TooManyRequests)):
+        return True
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    if isinstance(error, (requests.Timeout, requests.ConnectionError, TooManyRequests, RequestError)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+class Upstream:
+    def __init__(self, name: str):
+        settings = UPSTREAM_DEFAULTS[name]
+        env_prefix = f"{name.upper()}_CALL_"
+        for key, default in settings.items():
+            setattr(self, key, type(default)(os.getenv(f"{env_prefix}{key.upper()}", default)))
+        self.name = name
+        # Blocking clients get their own bounded pool, so a hung socket only ties up
+        # one of this upstream's threads instead of the shared default executor
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=name) if self.threads else None
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "timeouts": 0,
+                      "short_circuited": 0, "breaker_opened": 0}
+
+    def before_attempt(self) -> bool:
+        # Returns True when this attempt is the half-open probe
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                self.stats["short_circuited"] += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.state == "half_open":
+            # Let a single probe through; everyone else fails fast until it settles
+            if self.probe_in_flight:
+                self.stats["short_circuited"] += 1
+                raise CircuitOpenError(f"{self.name} circuit is half open")
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"{self.name} circuit closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["breaker_opened"] += 1
+                logger.warning(f"{self.name} circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def backoff_seconds(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+    def metrics(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000) if latencies else None
+
+        return {
+            **self.stats,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+
+
+_upstreams = {}
+
+
+def get_upstream(name: str) -> Upstream:
+    if name not in _upstreams:
+        _upstreams[name] = Upstream(name)
+    return _upstreams[name]
+
+
+async def call_with_policy(upstream_name: str, attempt_fn, prepare=None):
+    # attempt_fn is called once per attempt and returns a fresh awaitable. prepare (e.g. waiting on
+    # the rate limiter) is awaited before each attempt, outside the attempt timeout.
+    upstream = get_upstream(upstream_name)
+    upstream.stats["calls"] += 1
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        if prepare is not None:
+            await prepare()
+        is_probe = upstream.before_attempt()
+        try:
+            result = await asyncio.wait_for(attempt_fn(), timeout=upstream.timeout)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if isinstance(e, asyncio.TimeoutError):
+                upstream.stats["timeouts"] += 1
+            if is_rate_limited(e):
+                # Throttling is paced by the rate governor and does not count towards opening the circuit
+                if is_probe:
+                    upstream.probe_in_flight = False
+            elif retryable:
+                upstream.record_failure()
+            else:
+                # The upstream answered, the request itself was bad
+                upstream.record_success()
+
+            delay = upstream.backoff_seconds(attempt)
+            elapsed = time.monotonic() - started
+            if not retryable or attempt >= upstream.attempts or elapsed + delay + upstream.timeout > upstream.deadline:
+                upstream.stats["failures"] += 1
+                upstream.latencies.append(elapsed)
+                raise
+
+            upstream.stats["retries"] += 1
+            logger.warning(f"{upstream_name} call failed (attempt {attempt}/{upstream.attempts}), retrying in {delay:.2f}s: {type(e).__name__}: {str(e)}")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # A cancelled probe (e.g. the client left a stream) must not hold the circuit half open for good
+            if is_probe:
+                upstream.probe_in_flight = False
+            raise
+
+        upstream.record_success()
+        upstream.stats["successes"] += 1
+        upstream.latencies.append(time.monotonic() - started)
+        return result
+
+
+async def call_blocking_with_policy(upstream_name: str, fn, *args, **kwargs):
+    # For blocking clients (requests, deep_translator): each attempt runs on the upstream's thread pool
+    upstream = get_upstream(upstream_name)
+    loop = asyncio.get_running_loop()
+    return await call_with_policy(upstream_name, lambda: loop.run_in_executor(upstream.executor, partial(fn, *args, **kwargs)))
+
+
+def upstream_metrics() -> dict:
+    return {name: upstream.metrics() for name, upstream in _upstreams.items()}
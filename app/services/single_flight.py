@@ -0,0 +1,106 @@
+# app/services/single_flight.py
+# Coalesces concurrent generations of the same (point_id, stage): in-process callers share
+# one task, and a lease document in Mongo keeps other workers from running it at the same time.
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from app.db.database import leases_collection
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_LEASE_SECONDS = int(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "120"))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", "1"))
+
+_process_id = f"{socket.gethostname()}:{os.getpid()}"
+_inflight = {}
+
+
+def lease_key(point_id: str, stage: str) -> str:
+    return f"{stage}:{point_id}"
+
+
+async def acquire_lease(key: str, owner: str) -> bool:
+    now = datetime.utcnow()
+    try:
+        # Matches only an expired lease; a live one makes the upsert collide on _id
+        await leases_collection.update_one(
+            {"_id": key, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "acquired_at": now, "expires_at": now + timedelta(seconds=SINGLE_FLIGHT_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def renew_lease(key: str, owner: str) -> bool:
+    result = await leases_collection.update_one(
+        {"_id": key, "owner": owner},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=SINGLE_FLIGHT_LEASE_SECONDS)}}
+    )
+    return result.modified_count > 0
+
+
+async def release_lease(key: str, owner: str):
+    await leases_collection.delete_one({"_id": key, "owner": owner})
+
+
+async def wait_for_release(key: str):
+    while await leases_collection.find_one({"_id": key, "expires_at": {"$gte": datetime.utcnow()}}, {"_id": 1}):
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+
+
+async def keep_lease(key: str, owner: str):
+    while True:
+        await asyncio.sleep(SINGLE_FLIGHT_LEASE_SECONDS / 3)
+        if not await renew_lease(key, owner):
+            logger.warning(f"Lost single-flight lease {key}")
+            return
+
+
+@asynccontextmanager
+async def stage_lease(point_id: str, stage: str):
+    # Yields True while this caller holds the lease, False when another worker does
+    key = lease_key(point_id, stage)
+    owner = f"{_process_id}:{uuid.uuid4().hex[:8]}"
+    if not await acquire_lease(key, owner):
+        yield False
+        return
+
+    heartbeat = asyncio.create_task(keep_lease(key, owner))
+    try:
+        yield True
+    finally:
+        heartbeat.cancel()
+        await release_lease(key, owner)
+
+
+async def _lead(point_id: str, stage: str, run, on_follow):
+    while True:
+        async with stage_lease(point_id, stage) as acquired:
+            if acquired:
+                return await run()
+        logger.info(f"{stage} for point {point_id} is running on another worker, waiting for it")
+        await wait_for_release(lease_key(point_id, stage))
+        # on_follow returns the finished result, or None when the other run did not complete
+        result = await on_follow()
+        if result is not None:
+            return result
+
+
+async def run_single_flight(point_id: str, stage: str, run, on_follow):
+    key = lease_key(point_id, stage)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_lead(point_id, stage, run, on_follow))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        logger.info(f"Joining in-flight {stage} for point {point_id}")
+    # Shielded so one caller going away does not cancel the run the others are waiting on
+    return await asyncio.shield(task)
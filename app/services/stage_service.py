@@ -0,0 +1,251 @@
+# app/services/stage_service.py
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from functools import wraps
+from app.services.single_flight import run_single_flight
+from app.services.openai_service import generate_prompting, generate_handout, generate_misc_points, generate_quiz, generate_misc_points_and_quiz, generate_handout_translation
+from app.db.operations import get_point_of_discussion, get_topic_id_by_point_id, update_prompting, update_handout, update_misc_points, update_quiz, update_misc_points_and_quiz, update_translated_handout, mark_stage_running, mark_stage_done, mark_stage_failed, BATCH_STAGE_STALE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Per-point stage workers shared by the topic-level routes and the course pipeline.
+# Each returns a result dict ({"point_id", "status", ...}) or None when the point is skipped.
+
+# Point fields each stage writes; hashed into stages.<stage>.content_hash once the stage is done
+STAGE_CONTENT_FIELDS = {
+    "prompting": ["prompting"],
+    "handout": ["handout"],
+    "misc_points": ["learn_objective", "assessment", "method", "duration"],
+    "quiz": ["quiz"],
+    "translation": ["handout_id"],
+}
+
+
+def stage_content_hash(stage: str, point_data: dict) -> str:
+    content = {field: point_data.get(field) for field in STAGE_CONTENT_FIELDS[stage]}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+async def record_stage_result(point_id: str, stage: str, result):
+    if result is None or result["status"] == "skipped":
+        reason = result.get("reason") if result else "Point skipped"
+        await mark_stage_failed(point_id, stage, reason, status="pending")
+    elif result["status"] == "failed":
+        await mark_stage_failed(point_id, stage, result.get("reason") or "Stage failed")
+    else:
+        point_data = await get_point_of_discussion(point_id)
+        await mark_stage_done(point_id, stage, stage_content_hash(stage, point_data or {}))
+
+
+async def completed_stage_result(point_id: str, stages):
+    point_data = await get_point_of_discussion(point_id)
+    states = point_data.get("stages", {}) if point_data else {}
+    if all(states.get(stage, {}).get("status") == "done" for stage in stages):
+        return {"point_id": point_id, "status": "existing"}
+    return None
+
+
+async def batch_holding_stage(point_id: str, stages):
+    # The batch id a stage is waiting on, while that batch is still within its window
+    point_data = await get_point_of_discussion(point_id)
+    states = point_data.get("stages", {}) if point_data else {}
+    held_since = datetime.utcnow() - timedelta(seconds=BATCH_STAGE_STALE_SECONDS)
+    for stage in stages:
+        state = states.get(stage, {})
+        if state.get("status") == "running" and state.get("batch_id") and state.get("started_at") and state["started_at"] >= held_since:
+            return state["batch_id"]
+    return None
+
+
+def track_stage(*stages: str):
+    # Records pending/running/done/failed, attempts and a content hash under stages.<stage>
+    # for each stage the worker produces. Concurrent calls for the same point and stage
+    # are coalesced into a single run.
+    def decorator(worker):
+        @wraps(worker)
+        async def wrapper(point, *args, **kwargs):
+            async def run():
+                batch_id = await batch_holding_stage(point['id'], stages)
+                if batch_id:
+                    logger.info(f"{'+'.join(stages)} for point {point['id']} is waiting on batch {batch_id}, not generating")
+                    return {"point_id": point['id'], "status": "batched", "reason": f"Waiting on batch {batch_id}"}
+                for stage in stages:
+                    await mark_stage_running(point['id'], stage)
+                try:
+                    result = await worker(point, *args, **kwargs)
+                except Exception as e:
+                    for stage in stages:
+                        await mark_stage_failed(point['id'], stage, str(e))
+                    raise
+                for stage in stages:
+                    await record_stage_result(point['id'], stage, result)
+                return result
+
+            return await run_single_flight(point['id'], "+".join(stages), run, lambda: completed_stage_result(point['id'], stages))
+        return wrapper
+    return decorator
+
+
+@track_stage("prompting")
+async def process_point_prompting(point, bypass_cache: bool = False):
+    point_data = await get_point_of_discussion(point['id'])
+    if not point_data:
+        logger.warning(f"Point data not found for id: {point['id']}")
+        return None
+    
+    topic_id = await get_topic_id_by_point_id(point['id'])
+    if not topic_id:
+        logger.warning(f"Topic ID not found for point id: {point['id']}")
+        return None
+    
+    if not point_data.get('prompting'):
+        prompting = await generate_prompting(
+            point_data['elaboration'],
+            point_data['point_of_discussion'],
+            topic_id,
+            bypass_cache=bypass_cache
+        )
+        if prompting:
+            await update_prompting(point['id'], prompting)
+            logger.info(f"Generated prompting for point: {point['id']}")
+            return {"point_id": point['id'], "status": "generated"}
+        else:
+            logger.warning(f"No prompting generated for point: {point['id']}")
+            return {"point_id": point['id'], "status": "failed"}
+    else:
+        logger.info(f"Prompting already exists for point: {point['id']}")
+        return {"point_id": point['id'], "status": "existing"}
+
+@track_stage("handout")
+async def process_point_handout(point, bypass_cache: bool = False):
+    point_data = await get_point_of_discussion(point['id'])
+    if not point_data:
+        logger.warning(f"Point data not found for id: {point['id']}")
+        return {"point_id": point['id'], "status": "failed", "reason": "Point data not found"}
+    
+    if not point_data.get('handout'):
+        if not point_data.get('prompting'):
+            logger.warning(f"Prompting not found for point: {point['id']}. Skipping handout generation.")
+            return {"point_id": point['id'], "status": "skipped", "reason": "Prompting not found"}
+        
+        handout = await generate_handout(point_data['point_of_discussion'], point_data['prompting'], str(point_data['topic_name_id']), bypass_cache=bypass_cache)
+        if handout:
+            await update_handout(point['id'], handout)
+            logger.info(f"Generated handout for point: {point['id']}")
+            return {"point_id": point['id'], "status": "generated"}
+        else:
+            logger.warning(f"Failed to generate handout for point: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Handout generation failed"}
+    else:
+        logger.info(f"Handout already exists for point: {point['id']}")
+        return {"point_id": point['id'], "status": "existing"}
+
+@track_stage("misc_points")
+async def process_point_misc(point, bypass_cache: bool = False):
+    try:
+        point_data = await get_point_of_discussion(point['id'])
+        if not point_data:
+            logger.warning(f"Point data not found for id: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Point data not found"}
+
+        if not point_data.get('handout'):
+            logger.warning(f"Handout not found for point: {point['id']}. Skipping misc points generation.")
+            return {"point_id": point['id'], "status": "skipped", "reason": "Handout not found"}
+
+        misc_points = await generate_misc_points(point_data['point_of_discussion'], point_data['handout'], str(point_data['topic_name_id']), bypass_cache=bypass_cache)
+        if misc_points:
+            await update_misc_points(point['id'], misc_points)
+            logger.info(f"Generated misc points for point of discussion: {point['id']}")
+            return {"point_id": point['id'], "status": "generated"}
+        else:
+            logger.warning(f"Failed to generate misc points for point: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Misc points generation failed"}
+    except Exception as e:
+        logger.error(f"Error generating misc points for point {point['id']}: {str(e)}", exc_info=True)
+        return {"point_id": point['id'], "status": "failed", "reason": str(e)}
+
+@track_stage("quiz")
+async def process_point_quiz(point, bypass_cache: bool = False):
+    try:
+        point_data = await get_point_of_discussion(point['id'])
+        if not point_data:
+            logger.warning(f"Point data not found for id: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Point data not found"}
+
+        if not point_data.get('handout'):
+            logger.warning(f"Handout not found for point: {point['id']}. Skipping quiz generation.")
+            return {"point_id": point['id'], "status": "skipped", "reason": "Handout not found"}
+
+        quiz_content = await generate_quiz(point_data['point_of_discussion'], point_data['handout'], str(point_data['topic_name_id']), bypass_cache=bypass_cache)
+        if quiz_content:
+            await update_quiz(point['id'], quiz_content)
+            logger.info(f"Generated and stored quiz for point of discussion: {point['id']}")
+            return {"point_id": point['id'], "status": "generated"}
+        else:
+            logger.warning(f"Generated quiz content is empty for point of discussion: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Empty quiz content"}
+    except Exception as e:
+        logger.error(f"Error generating quiz for point {point['id']}: {str(e)}", exc_info=True)
+        return {"point_id": point['id'], "status": "failed", "reason": str(e)}
+
+@track_stage("misc_points", "quiz")
+async def process_point_misc_quiz(point, bypass_cache: bool = False):
+    # Combined stage: one structured call for misc points and quiz, falling back to the
+    # two separate calls when the combined output does not validate
+    try:
+        point_data = await get_point_of_discussion(point['id'])
+        if not point_data:
+            logger.warning(f"Point data not found for id: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Point data not found"}
+
+        if not point_data.get('handout'):
+            logger.warning(f"Handout not found for point: {point['id']}. Skipping misc points and quiz generation.")
+            return {"point_id": point['id'], "status": "skipped", "reason": "Handout not found"}
+
+        topic_id = str(point_data['topic_name_id'])
+        combined = await generate_misc_points_and_quiz(point_data['point_of_discussion'], point_data['handout'], topic_id, bypass_cache=bypass_cache)
+        if combined is None:
+            logger.warning(f"Combined misc points and quiz output did not validate for point {point['id']}, using separate calls")
+            misc_points = await generate_misc_points(point_data['point_of_discussion'], point_data['handout'], topic_id, bypass_cache=bypass_cache)
+            quiz_content = await generate_quiz(point_data['point_of_discussion'], point_data['handout'], topic_id, bypass_cache=bypass_cache)
+            combined = {"misc_points": misc_points, "quiz": quiz_content}
+
+        if not combined["misc_points"] or not combined["quiz"]:
+            return {"point_id": point['id'], "status": "failed", "reason": "Misc points and quiz generation failed"}
+
+        await update_misc_points_and_quiz(point['id'], combined["misc_points"], combined["quiz"])
+        logger.info(f"Generated misc points and quiz for point of discussion: {point['id']}")
+        return {"point_id": point['id'], "status": "generated"}
+    except Exception as e:
+        logger.error(f"Error generating misc points and quiz for point {point['id']}: {str(e)}", exc_info=True)
+        return {"point_id": point['id'], "status": "failed", "reason": str(e)}
+
+@track_stage("translation")
+async def process_point_translation(point, skip_existing: bool = False):
+    try:
+        point_data = await get_point_of_discussion(point['id'])
+        if not point_data:
+            logger.warning(f"Point data not found for id: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Point data not found"}
+
+        if not point_data.get('handout'):
+            logger.warning(f"Handout not found for point: {point['id']}. Skipping translation.")
+            return {"point_id": point['id'], "status": "skipped", "reason": "Handout not found"}
+
+        if skip_existing and point_data.get('handout_id'):
+            logger.info(f"Translated handout already exists for point: {point['id']}")
+            return {"point_id": point['id'], "status": "existing"}
+
+        translated_handout = await generate_handout_translation(point_data['handout'])
+        if translated_handout:
+            await update_translated_handout(point['id'], translated_handout)
+            logger.info(f"Generated and stored translated handout for point of discussion: {point['id']}")
+            return {"point_id": point['id'], "status": "translated"}
+        else:
+            logger.warning(f"Generated translated handout is empty for point of discussion: {point['id']}")
+            return {"point_id": point['id'], "status": "failed", "reason": "Empty translated handout"}
+    except Exception as e:
+        logger.error(f"Error translating handout for point {point['id']}: {str(e)}", exc_info=True)
+        return {"point_id": point['id'], "status": "failed", "reason": str(e)}
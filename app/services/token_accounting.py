@@ -0,0 +1,113 @@
+# app/services/token_accounting.py
+import asyncio
+import logging
+import contextvars
+from functools import lru_cache
+from typing import Optional
+import tiktoken
+from app.services.cost_calculator import calculate_cost
+
+logger = logging.getLogger(__name__)
+
+EMPTY_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+# Batch API requests are billed at half the interactive price
+BATCH_PRICE_FACTOR = 0.5
+
+# Per-task usage accumulator, used to report tokens for a unit of work (e.g. one point)
+_usage_tracker = contextvars.ContextVar("usage_tracker", default=None)
+
+
+def start_usage_tracking() -> dict:
+    tracker = dict(EMPTY_USAGE)
+    _usage_tracker.set(tracker)
+    return tracker
+
+
+def track_usage(usage: dict):
+    tracker = _usage_tracker.get()
+    if tracker is None:
+        return
+    for field in EMPTY_USAGE:
+        tracker[field] += usage.get(field, 0)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    # gpt-4o models use o200k_base; unknown models fall back to cl100k_base
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logger.warning(f"No tiktoken encoding registered for {model}, using cl100k_base")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _count_tokens_sync(text: str, model: str) -> int:
+    return len(get_encoding(model).encode(text))
+
+
+async def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    # Encoding long handouts is CPU bound, keep it off the event loop
+    return await asyncio.to_thread(_count_tokens_sync, text, model)
+
+
+def usage_from_completion(completion) -> Optional[dict]:
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return None
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached_tokens = details.get("cached_tokens") or 0
+    else:
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": cached_tokens,
+    }
+
+
+async def ensure_usage(usage: Optional[dict], messages: list, content: str, model: str) -> dict:
+    # Only re-tokenize when the API didn't report usage
+    if usage is not None:
+        return usage
+
+    prompt_text = "\n".join(m["content"] for m in messages)
+    prompt_tokens, completion_tokens = await asyncio.gather(
+        count_tokens(prompt_text, model),
+        count_tokens(content, model),
+    )
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cached_tokens": 0}
+
+
+def cost_from_usage(usage: dict, model: Optional[str] = None) -> float:
+    return calculate_cost(
+        usage["prompt_tokens"],
+        usage["completion_tokens"],
+        cached_input_token_count=usage.get("cached_tokens", 0),
+        model=model,
+    )
+
+
+def completion_cost(result: dict) -> float:
+    # Cache hits are free
+    if result.get("cache_hit"):
+        return 0
+    cost = cost_from_usage(result["usage"], result.get("model"))
+    return cost * BATCH_PRICE_FACTOR if result.get("batch") else cost
+
+
+def cost_entry_fields(result: dict) -> dict:
+    usage = result["usage"]
+    return {
+        "model": result["model"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "cached_tokens": usage.get("cached_tokens", 0),
+        "cache_hit": result.get("cache_hit", False),
+        **({"batch": True} if result.get("batch") else {}),
+        # Set by the model router: which step of the stage's cascade this was and why it moved on
+        **({f"route_{key}": value for key, value in result["route"].items()} if result.get("route") else {}),
+    }
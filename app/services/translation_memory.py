@@ -0,0 +1,105 @@
+# app/services/translation_memory.py
+# Segment-level translation memory: an in-process LRU in front of a persistent Mongo tier, keyed by
+# (source, target, normalized segment). Only segments missing from both tiers reach the translator,
+# so re-translating an edited handout sends just the paragraphs that changed.
+import os
+import re
+import hashlib
+import logging
+import unicodedata
+from datetime import datetime
+from typing import Callable, Dict, List
+from pymongo import UpdateOne
+from app.db.database import translations_collection
+from app.services.completion_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", "20000"))
+TRANSLATION_MEMORY_PERSIST = os.getenv("TRANSLATION_MEMORY_PERSIST", "true").lower() == "true"
+
+memory = LRUCache(TRANSLATION_MEMORY_MAX_ENTRIES)
+stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+
+WHITESPACE_PATTERN = re.compile(r'[ \t\u00a0]+')
+
+
+def normalize_segment(segment: str) -> str:
+    # Whitespace and unicode form differences do not change the translation
+    lines = [WHITESPACE_PATTERN.sub(" ", line).strip() for line in unicodedata.normalize("NFC", segment).split("\n")]
+    return "\n".join(lines).strip()
+
+
+def segment_key(source: str, target: str, segment: str) -> str:
+    return hashlib.sha256(f"{source}\x00{target}\x00{normalize_segment(segment)}".encode("utf-8")).hexdigest()
+
+
+async def lookup_translations(source: str, target: str, segments: List[str]) -> Dict[str, str]:
+    # Returns segment -> translation for every segment either tier knows
+    found = {}
+    missing = {}
+    for segment in segments:
+        key = segment_key(source, target, segment)
+        translation = memory.get(key)
+        if translation is not None:
+            found[segment] = translation
+            stats["memory_hits"] += 1
+        else:
+            missing[key] = segment
+
+    if missing and TRANSLATION_MEMORY_PERSIST:
+        try:
+            docs = await translations_collection.find({"_id": {"$in": list(missing)}}, {"translation": 1}).to_list(length=None)
+        except Exception as e:
+            logger.warning(f"Translation memory lookup failed: {str(e)}")
+            docs = []
+        for doc in docs:
+            memory.set(doc["_id"], doc["translation"])
+            found[missing.pop(doc["_id"])] = doc["translation"]
+            stats["store_hits"] += 1
+
+    stats["misses"] += len(missing)
+    return found
+
+
+async def store_translations(source: str, target: str, translations: Dict[str, str]):
+    if not translations:
+        return
+    now = datetime.utcnow()
+    operations = []
+    for segment, translation in translations.items():
+        key = segment_key(source, target, segment)
+        memory.set(key, translation)
+        operations.append(UpdateOne(
+            {"_id": key},
+            {"$set": {"source": source, "target": target, "translation": translation, "updated_at": now}},
+            upsert=True
+        ))
+
+    if not TRANSLATION_MEMORY_PERSIST:
+        return
+    try:
+        await translations_collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.warning(f"Translation memory write failed: {str(e)}")
+
+
+async def translate_with_memory(source: str, target: str, segments: List[str], translate_missing: Callable) -> List[str]:
+    # translate_missing(list of unique untranslated segments) returns their translations in order
+    translatable = [segment for segment in segments if segment.strip()]
+    known = await lookup_translations(source, target, list(dict.fromkeys(translatable)))
+    pending = list(dict.fromkeys(segment for segment in translatable if segment not in known))
+
+    if pending:
+        translated = await translate_missing(pending)
+        new_translations = dict(zip(pending, translated))
+        await store_translations(source, target, new_translations)
+        known.update(new_translations)
+    logger.info(f"Translated {len(translatable)} segments {source}->{target}: {len(pending)} sent, {len(translatable) - len(pending)} from memory")
+
+    # Blank segments are kept as they are so the caller can rebuild the layout
+    return [known[segment] if segment.strip() else segment for segment in segments]
+
+
+def translation_memory_stats() -> dict:
+    return {**stats, "memory_entries": len(memory)}
@@ -0,0 +1,163 @@
+import asyncio
+import tempfile
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import batch_pipeline
+from app.services.batch_client import LocalBatchBackend, LocalBatchServer
+from app.services.batch_pipeline import CourseBatchRun
+from app.services.cost_calculator import calculate_cost
+
+
+class ServedLocalBackend(LocalBatchBackend):
+    # The stand-in server answers pending batches whenever the pipeline polls
+    async def retrieve(self, batch_id):
+        await LocalBatchServer(self, mode="stub").process_pending()
+        return await super().retrieve(batch_id)
+
+
+class TestCourseBatchRun(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.points = {
+            "p1": {"_id": "p1", "topic_name_id": "t1", "point_of_discussion": "Trafo", "elaboration": "- a"},
+            "p2": {"_id": "p2", "topic_name_id": "t1", "point_of_discussion": "Relay", "elaboration": "- b"},
+        }
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def fake_db(self):
+        async def candidates(topic_ids, stage, required_field, output_field, stale_before):
+            return [dict(p) for p in self.points.values() if p.get(required_field) and not p.get(output_field)]
+
+        async def by_ids(point_ids, projection=None):
+            return [self.points[point_id] for point_id in point_ids]
+
+        def updater(*fields):
+            async def update(point_id, value):
+                if isinstance(value, dict):
+                    self.points[point_id].update(value)
+                else:
+                    self.points[point_id][fields[0]] = value
+            return update
+
+        async def claim(point_ids, stage, batch_id, stale_before):
+            claimed = set()
+            for point_id in point_ids:
+                state = self.points[point_id].setdefault("stages", {}).get(stage, {})
+                if state.get("status") != "running":
+                    self.points[point_id]["stages"][stage] = {"status": "running", "batch_id": batch_id}
+                    claimed.add(point_id)
+            return claimed
+
+        async def set_batch_id(point_ids, stage, old_batch_id, batch_id):
+            for point_id in point_ids:
+                self.points[point_id]["stages"][stage]["batch_id"] = batch_id
+
+        @asynccontextmanager
+        async def lease(key, stage):
+            yield self.lease_free
+
+        collection = MagicMock()
+        collection.find.return_value.to_list = AsyncMock(return_value=[])
+        collection.insert_one = AsyncMock()
+        collection.update_one = AsyncMock()
+        self.lease_free = True
+        return {
+            "stage_lease": lease,
+            "claim_points_for_batch": AsyncMock(side_effect=claim),
+            "set_stage_batch_id": AsyncMock(side_effect=set_batch_id),
+            "batches_collection": collection,
+            "get_list_topics_by_main_topic_id": AsyncMock(return_value=[{"_id": "t1"}]),
+            "get_batch_candidate_points": AsyncMock(side_effect=candidates),
+            "get_points_discussion_by_ids": AsyncMock(side_effect=by_ids),
+            "add_cost_entry": AsyncMock(),
+            "record_stage_result": AsyncMock(side_effect=self.record_stage_result),
+        }, updater
+
+    async def record_stage_result(self, point_id, stage, result):
+        self.points[point_id]["stages"][stage]["status"] = "done" if result["status"] == "generated" else result["status"]
+
+    def run_batch(self, mocks, updater):
+        stages = {
+            "prompting": dict(batch_pipeline.BATCH_STAGES["prompting"], update=updater("prompting")),
+            "handout": dict(batch_pipeline.BATCH_STAGES["handout"], update=updater("handout")),
+            "misc_points": dict(batch_pipeline.BATCH_STAGES["misc_points"], update=updater()),
+            "quiz": dict(batch_pipeline.BATCH_STAGES["quiz"], update=updater("quiz")),
+        }
+        with patch.multiple(batch_pipeline, BATCH_WORK_DIR=self.tmpdir.name, BATCH_STAGES=stages, **mocks):
+            run = CourseBatchRun("m1", backend=ServedLocalBackend(f"{self.tmpdir.name}/standin"), poll_seconds=0)
+            return asyncio.run(run.run())
+
+    def test_rounds_run_end_to_end_through_the_stand_in(self):
+        mocks, updater = self.fake_db()
+        state = self.run_batch(mocks, updater)
+
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(len(state["batches"]), 3)
+        for stage in ("prompting", "handout", "misc_points", "quiz"):
+            self.assertEqual(state["stages"][stage]["done"], 2, stage)
+        self.assertEqual(self.points["p1"]["duration"], 60)
+        self.assertTrue(self.points["p2"]["quiz"])
+        costs = mocks["add_cost_entry"].await_args_list
+        self.assertEqual(len(costs), 8)
+        self.assertTrue(all(c.kwargs["batch"] for c in costs))
+        # Submitted points were held under the batch id the API returned
+        self.assertTrue(self.points["p1"]["stages"]["quiz"]["batch_id"].startswith("batch_"))
+
+    def test_snapshot_model_names_are_priced_as_the_submitted_model(self):
+        mocks, updater = self.fake_db()
+        respond = LocalBatchServer.respond
+
+        async def snapshot_respond(server, body):
+            # The Batch API answers with the dated snapshot, not the requested alias
+            return dict(await respond(server, body), model=f"{body['model']}-2024-07-18")
+
+        with patch.object(LocalBatchServer, "respond", snapshot_respond):
+            self.run_batch(mocks, updater)
+
+        for call in mocks["add_cost_entry"].await_args_list:
+            expected = calculate_cost(call.kwargs["prompt_tokens"], call.kwargs["completion_tokens"], model="gpt-4o-mini") * 0.5
+            self.assertEqual(call.kwargs["model"], "gpt-4o-mini")
+            self.assertAlmostEqual(call.args[3], expected)
+        self.assertAlmostEqual(
+            calculate_cost(1000, 1000, model="gpt-4o-mini-2024-07-18"), calculate_cost(1000, 1000, model="gpt-4o-mini")
+        )
+
+    def test_points_claimed_elsewhere_are_not_submitted(self):
+        mocks, updater = self.fake_db()
+        self.points["p2"]["stages"] = {"prompting": {"status": "running", "batch_id": None}}
+        state = self.run_batch(mocks, updater)
+        self.assertEqual(state["stages"]["prompting"]["submitted"], 1)
+        self.assertNotIn("prompting", self.points["p2"])
+
+    def test_superseded_results_are_billed_but_not_written(self):
+        mocks, updater = self.fake_db()
+        original = mocks["get_points_discussion_by_ids"].side_effect
+
+        async def finished_meanwhile(point_ids, projection=None):
+            # p1's prompting was completed interactively while the batch ran
+            points = await original(point_ids, projection)
+            self.points["p1"]["stages"]["prompting"]["status"] = "done"
+            return points
+
+        mocks["get_points_discussion_by_ids"] = AsyncMock(side_effect=finished_meanwhile)
+        state = self.run_batch(mocks, updater)
+        self.assertEqual((state["stages"]["prompting"]["skipped"], state["stages"]["prompting"]["done"]), (1, 1))
+        self.assertNotIn("prompting", self.points["p1"])
+        # Both prompting results were billed; only p2 went on to the later rounds
+        self.assertEqual(len(mocks["add_cost_entry"].await_args_list), 5)
+
+    def test_second_run_for_the_same_course_does_nothing(self):
+        mocks, updater = self.fake_db()
+        self.lease_free = False
+        state = self.run_batch(mocks, updater)
+        self.assertEqual(state["status"], "already_running")
+        mocks["claim_points_for_batch"].assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+
+from app.services.concurrency import run_bounded, iter_bounded, resolve_limit, GENERATION_CONCURRENCY, GENERATION_GLOBAL_CONCURRENCY
+
+
+class TestRunBounded(unittest.TestCase):
+
+    def test_results_keep_input_order(self):
+        async def worker(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        delays = [0.03, 0.01, 0.02, 0.0]
+        results = asyncio.run(run_bounded(delays, worker, limit=4))
+        self.assertEqual(results, delays)
+
+    def test_limit_caps_tasks_in_flight(self):
+        in_flight = 0
+        peak = 0
+
+        async def worker(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return item
+
+        asyncio.run(run_bounded(range(10), worker, limit=3))
+        self.assertEqual(peak, 3)
+
+    def test_failing_worker_does_not_fail_the_batch(self):
+        finished = []
+
+        async def worker(point):
+            if point["id"] == "p2":
+                raise ValueError("boom")
+            await asyncio.sleep(0.01)
+            finished.append(point["id"])
+            return {"point_id": point["id"], "status": "generated"}
+
+        points = [{"id": "p1"}, {"id": "p2"}, {"id": "p3"}]
+        results = asyncio.run(run_bounded(points, worker, limit=3))
+        self.assertEqual(results[1], {"point_id": "p2", "status": "failed", "reason": "boom"})
+        self.assertEqual([result["status"] for result in results], ["generated", "failed", "generated"])
+        self.assertEqual(sorted(finished), ["p1", "p3"])
+
+    def test_resolve_limit(self):
+        self.assertEqual(resolve_limit(None), GENERATION_CONCURRENCY)
+        self.assertEqual(resolve_limit(0), GENERATION_CONCURRENCY)
+        self.assertEqual(resolve_limit(GENERATION_GLOBAL_CONCURRENCY + 10), GENERATION_GLOBAL_CONCURRENCY)
+
+
+class TestIterBounded(unittest.TestCase):
+
+    def test_yields_in_completion_order_with_index(self):
+        async def worker(delay):
+            await asyncio.sleep(delay)
+            return delay * 2
+
+        async def collect():
+            return [item async for item in iter_bounded([0.03, 0.0, 0.015], worker, limit=3)]
+
+        self.assertEqual(asyncio.run(collect()), [(1, 0.0), (2, 0.03), (0, 0.06)])
+
+    def test_failing_worker_yields_a_failed_result(self):
+        async def worker(point):
+            if point["id"] == "p1":
+                raise ValueError("boom")
+            await asyncio.sleep(0.01)
+            return {"point_id": point["id"], "status": "generated"}
+
+        async def collect():
+            points = [{"id": f"p{i}"} for i in range(4)]
+            return dict([item async for item in iter_bounded(points, worker, limit=4)])
+
+        results = asyncio.run(collect())
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertEqual(results[1], {"point_id": "p1", "status": "failed", "reason": "boom"})
+        self.assertEqual(results[3]["status"], "generated")
+
+    def test_closing_early_cancels_pending_tasks(self):
+        cancelled = []
+
+        async def worker(delay):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+            return delay
+
+        async def take_first():
+            iterator = iter_bounded([0.0, 1.0, 2.0], worker, limit=3)
+            first = await iterator.__anext__()
+            await iterator.aclose()
+            await asyncio.sleep(0)
+            return first
+
+        self.assertEqual(asyncio.run(take_first()), (0, 0.0))
+        self.assertEqual(sorted(cancelled), [1.0, 2.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import ObjectId
+
+from app.db import operations
+from app.db.operations import get_cost_breakdown_by_main_topic_id
+
+MAIN_TOPIC_ID = "66b1f0c2a4e5d3b2c1a09f87"
+
+
+class TestCostBreakdown(unittest.TestCase):
+
+    def run_breakdown(self, facet_result, **kwargs):
+        collection = MagicMock()
+        collection.aggregate.return_value.to_list = AsyncMock(return_value=[facet_result])
+        with patch.object(operations, "list_topics_collection", collection):
+            result = asyncio.run(get_cost_breakdown_by_main_topic_id(MAIN_TOPIC_ID, **kwargs))
+        pipeline = collection.aggregate.call_args.args[0]
+        return result, pipeline
+
+    def test_single_pipeline_groups_per_topic_and_process(self):
+        facet_result = {
+            "breakdown": [{"_id": {"topic_id": "t1", "process_name": "handout"}, "topic_name": "Grid", "cost": 300, "entries": 2}],
+            "total": [{"_id": None, "cost": 300, "entries": 2}],
+            "items": [{"topic_name": "Grid", "content": "p", "process_name": "handout", "cost": 150, "datetime": None}] * 2,
+        }
+        result, pipeline = self.run_breakdown(facet_result)
+        self.assertEqual(pipeline[0], {"$match": {"main_topic_id": {"$in": [ObjectId(MAIN_TOPIC_ID), MAIN_TOPIC_ID]}}})
+        self.assertEqual(result["total_cost"], 300)
+        self.assertEqual(result["breakdown"][0]["process_name"], "handout")
+        self.assertEqual(len(result["items"]), 2)
+
+    def test_totals_only_skips_line_items(self):
+        result, pipeline = self.run_breakdown({"breakdown": [], "total": []}, totals_only=True)
+        self.assertNotIn("items", pipeline[-1]["$facet"])
+        self.assertEqual((result["total_cost"], result["items"]), (0, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
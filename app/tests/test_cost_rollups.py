@@ -0,0 +1,80 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import ObjectId
+
+from app.db import cost_rollups, operations
+from app.db.cost_rollups import apply_cost_to_rollups, rebuild_cost_rollups
+from app.db.operations import get_all_main_topics
+
+
+class TestCostRollups(unittest.TestCase):
+
+    def setUp(self):
+        self.main_id = ObjectId()
+        self.topic_id = ObjectId()
+        self.list_topics = MagicMock()
+        self.main_topics = MagicMock()
+        self.cost_ai = MagicMock()
+        self.list_topics.find_one_and_update = AsyncMock(return_value={"_id": self.topic_id, "main_topic_id": str(self.main_id)})
+        self.main_topics.update_one = AsyncMock()
+        self.list_topics.bulk_write = AsyncMock()
+        self.main_topics.bulk_write = AsyncMock()
+        self.patcher = patch.multiple(
+            cost_rollups,
+            list_topics_collection=self.list_topics,
+            main_topic_collection=self.main_topics,
+            cost_ai_collection=self.cost_ai,
+        )
+        self.patcher.start()
+        self.addCleanup(self.patcher.stop)
+
+    def test_cost_entry_increments_list_topic_and_main_topic(self):
+        asyncio.run(apply_cost_to_rollups(str(self.topic_id), "handout", 120))
+        update = self.list_topics.find_one_and_update.call_args.args[1]
+        self.assertEqual(update["$inc"], {"cost_rollup.total_cost": 120, "cost_rollup.entries": 1, "cost_rollup.by_process.handout": 120})
+        self.assertEqual(self.main_topics.update_one.call_args.args, ({"_id": self.main_id, "cost_rollup": {"$exists": True}}, update))
+
+    def test_topic_list_entry_is_skipped(self):
+        # create_listof_topic bills the topic list to the plain main topic id
+        asyncio.run(apply_cost_to_rollups(str(self.main_id), "topics", 50))
+        self.list_topics.find_one_and_update.assert_not_called()
+        self.main_topics.update_one.assert_not_called()
+
+    def test_listing_falls_back_to_the_ledger_for_courses_without_a_rollup(self):
+        legacy_id = ObjectId()
+        collection = MagicMock()
+        collection.find.return_value.to_list = AsyncMock(return_value=[
+            {"_id": self.main_id, "main_topic": "New", "cost_rollup": {"total_cost": 70}},
+            {"_id": legacy_id, "main_topic": "Old"},
+        ])
+        breakdown = AsyncMock(return_value={"total_cost": 500})
+        with patch.multiple(operations, main_topic_collection=collection, get_cost_breakdown_by_main_topic_id=breakdown):
+            main_topics = asyncio.run(get_all_main_topics())
+        self.assertEqual([main_topic["total_cost"] for main_topic in main_topics], [70, 500])
+        breakdown.assert_awaited_once_with(legacy_id, totals_only=True)
+
+    def test_rebuild_sums_ledger_per_list_topic_and_main_topic(self):
+        other_topic_id = ObjectId()
+        self.cost_ai.aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"_id": {"topic_id": str(self.topic_id), "process_name": "handout"}, "cost": 300, "entries": 2},
+            {"_id": {"topic_id": str(self.topic_id), "process_name": "quiz"}, "cost": 40, "entries": 1},
+            {"_id": {"topic_id": "orphan", "process_name": "quiz"}, "cost": 999, "entries": 1},
+        ])
+        self.list_topics.find.return_value.to_list = AsyncMock(return_value=[
+            {"_id": self.topic_id, "main_topic_id": str(self.main_id)},
+            {"_id": other_topic_id, "main_topic_id": str(self.main_id)},
+        ])
+        self.main_topics.find.return_value.to_list = AsyncMock(return_value=[{"_id": self.main_id}])
+
+        self.assertEqual(asyncio.run(rebuild_cost_rollups()), {"list_topics": 2, "main_topics": 1})
+        topic_ops = {op._filter["_id"]: op._doc["$set"]["cost_rollup"] for op in self.list_topics.bulk_write.call_args.args[0]}
+        self.assertEqual(topic_ops[other_topic_id]["total_cost"], 0)
+        main_rollup = self.main_topics.bulk_write.call_args.args[0][0]._doc["$set"]["cost_rollup"]
+        self.assertEqual((main_rollup["total_cost"], main_rollup["entries"]), (340, 3))
+        self.assertEqual(main_rollup["by_process"], {"handout": 300, "quiz": 40})
+
+
+if __name__ == '__main__':
+    unittest.main()
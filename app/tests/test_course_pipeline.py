@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.services import course_pipeline
+from app.services.course_pipeline import CoursePipeline
+
+
+class TestCoursePipeline(unittest.TestCase):
+
+    def test_point_stages_run_while_elaborations_stream(self):
+        started = {}
+
+        async def stream(topic_name, objective, points, topic_id=None):
+            started[topic_name] = asyncio.Event()
+            yield {"type": "point", "point_id": f"{topic_name}-p1", "subtopic": "p1"}
+            # The stream only finishes once its first point's stage has started
+            await started[topic_name].wait()
+            yield {"type": "done"}
+
+        async def stage_worker(point, **kwargs):
+            started[point["id"].split("-")[0]].set()
+            return {"point_id": point["id"], "status": "generated"}
+
+        workers = {name: stage_worker for name in (
+            "process_point_prompting", "process_point_handout", "process_point_misc",
+            "process_point_quiz", "process_point_misc_quiz", "process_point_translation",
+        )}
+        topics = [{"_id": f"t{index}", "topic_name": f"t{index}"} for index in range(3)]
+        with patch.multiple(
+            course_pipeline,
+            get_list_topics_by_main_topic_id=AsyncMock(return_value=topics),
+            get_points_discussion_ids_by_topic_id=AsyncMock(return_value=[]),
+            stream_elaborate_discussionpoint=stream,
+            **workers
+        ):
+            # One stage slot for three streaming topics
+            pipeline = CoursePipeline("m1", concurrency=1, merged_misc_quiz=False)
+            state = asyncio.run(asyncio.wait_for(pipeline.run(), timeout=5))
+
+        self.assertEqual(state["status"], "completed")
+        self.assertEqual(state["stages"]["elaboration"], {"generated": 3})
+        self.assertEqual(state["stages"]["quiz"], {"generated": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
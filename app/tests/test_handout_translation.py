@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from app.services import handout_translation, translation_memory
+from app.services.handout_translation import segment_markdown, translate_markdown
+
+HANDOUT = """## Grid Stability
+
+- **Frequency:** kept within limits.
+1. First step.  
+
+```python
+print("not translated")
+```
+
+| Term | Meaning |
+|------|---------|
+| AGC | Automatic control |
+"""
+
+
+class TestHandoutTranslation(unittest.TestCase):
+
+    def test_segments_rebuild_the_original_and_skip_markup(self):
+        pieces = segment_markdown(HANDOUT)
+        self.assertEqual("".join(text for _, text in pieces), HANDOUT)
+        translatable = [text for is_text, text in pieces if is_text]
+        self.assertEqual(translatable, [
+            "Grid Stability\n\n- **Frequency:** kept within limits.\n1. First step.",
+            "Term | Meaning",
+            "AGC | Automatic control",
+        ])
+
+    def test_neighbouring_lines_pack_up_to_the_limit(self):
+        text = "\n".join(f"- Point {i} of the list." for i in range(30))
+        pieces = segment_markdown(text, max_chars=100)
+        self.assertEqual("".join(text for _, text in pieces), text)
+        translatable = [text for is_text, text in pieces if is_text]
+        self.assertEqual(len(translatable), 8)
+        for segment in translatable:
+            self.assertLessEqual(len(segment), 100)
+            self.assertTrue(segment.startswith("Point") and segment.endswith("list."))
+
+    def test_long_lines_split_on_sentence_boundaries(self):
+        line = " ".join(f"Sentence number {i} ends here." for i in range(40))
+        pieces = segment_markdown(line, max_chars=200)
+        self.assertEqual("".join(text for _, text in pieces), line)
+        for is_text, text in pieces:
+            if is_text:
+                self.assertLessEqual(len(text), 200)
+                self.assertTrue(text.endswith("ends here."))
+
+    def test_translation_keeps_layout(self):
+        async def fake_translate(segment, source, target):
+            return segment.upper()
+
+        translation_memory.memory.clear()
+        with patch.object(handout_translation, "translate_segment", side_effect=fake_translate), \
+                patch.object(translation_memory, "TRANSLATION_MEMORY_PERSIST", False):
+            translated = asyncio.run(translate_markdown(HANDOUT, "en", "id"))
+
+        self.assertTrue(translated.startswith("## GRID STABILITY\n\n- **FREQUENCY:** KEPT WITHIN LIMITS.\n1. FIRST STEP.  \n"))
+        self.assertIn('print("not translated")', translated)
+        self.assertIn("|------|---------|\n| AGC | AUTOMATIC CONTROL |", translated)
+
+
+if __name__ == '__main__':
+    unittest.main()
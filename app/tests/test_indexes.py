@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+from pymongo.errors import OperationFailure
+
+from app.db.indexes import INDEXES, ensure_indexes, index_report
+
+
+class FakeDatabase:
+
+    def __init__(self, collections):
+        self.collections = collections
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+
+def fake_collection(indexes=None, ops=None):
+    collection = MagicMock()
+    indexes = {"_id_": {"key": [("_id", 1)]}, **(indexes or {})}
+    collection.index_information = AsyncMock(return_value=indexes)
+    collection.aggregate.return_value.to_list = AsyncMock(return_value=[
+        {"name": name, "accesses": {"ops": (ops or {}).get(name, 5), "since": datetime(2026, 1, 1)}} for name in indexes
+    ])
+    collection.create_indexes = AsyncMock(side_effect=lambda models: [model.document["name"] for model in models])
+    return collection
+
+
+class TestIndexRegistry(unittest.TestCase):
+
+    def test_hot_lookups_are_declared(self):
+        declared = {(name, model.document["name"]) for name, models in INDEXES.items() for model in models}
+        for expected in [("points_discussion", "topic_name_id_1"), ("list_topics", "main_topic_id_1"),
+                         ("list_topics", "topic_name_1"), ("cost_ai", "topic_id_1")]:
+            self.assertIn(expected, declared)
+
+    def test_ensure_indexes_continues_past_a_conflict(self):
+        collections = {name: fake_collection() for name in INDEXES}
+        collections["llm_cache"].create_indexes = AsyncMock(side_effect=OperationFailure("IndexOptionsConflict"))
+        created = asyncio.run(ensure_indexes(FakeDatabase(collections)))
+        self.assertNotIn("llm_cache", created)
+        self.assertEqual(created["cost_ai"], ["topic_id_1"])
+
+    def test_report_lists_missing_undeclared_and_unused(self):
+        collections = {name: fake_collection() for name in INDEXES}
+        collections["list_topics"] = fake_collection(
+            {"main_topic_id_1": {"key": [("main_topic_id", 1.0)]}, "legacy_1": {"key": [("legacy", 1)]}},
+            ops={"legacy_1": 0}
+        )
+        report = asyncio.run(index_report(FakeDatabase(collections)))["list_topics"]
+        self.assertEqual(report["missing"], ["topic_name_1"])
+        self.assertEqual(report["undeclared"], ["legacy_1"])
+        self.assertEqual([index["name"] for index in report["unused"]], ["legacy_1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import job_queue
+from app.services.job_queue import claim_job, retry_delay_seconds, JOB_BACKOFF_BASE_SECONDS, JOB_BACKOFF_MAX_SECONDS
+from app.services.job_handlers import require_success, JobFailedError
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def test_retry_delay_grows_and_is_capped(self):
+        for attempts in range(1, 4):
+            ceiling = JOB_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1))
+            delay = retry_delay_seconds(attempts)
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+        self.assertLessEqual(retry_delay_seconds(50), JOB_BACKOFF_MAX_SECONDS)
+
+    def test_failed_stage_result_raises(self):
+        self.assertEqual(require_success({"status": "generated"}), {"status": "generated"})
+        with self.assertRaises(JobFailedError):
+            require_success({"status": "failed", "reason": "boom"})
+
+
+    def test_crashed_last_attempt_is_marked_failed_before_claiming(self):
+        collection = MagicMock()
+        collection.update_many = AsyncMock(return_value=MagicMock(modified_count=1))
+        collection.find_one_and_update = AsyncMock(return_value=None)
+        with patch.object(job_queue, "jobs_collection", collection):
+            self.assertIsNone(asyncio.run(claim_job("w1", ["course_pipeline"])))
+
+        query, update = collection.update_many.call_args.args
+        self.assertEqual(query["status"], "running")
+        self.assertEqual(query["$expr"], {"$gte": ["$attempts", "$max_attempts"]})
+        self.assertEqual(query["type"], {"$in": ["course_pipeline"]})
+        self.assertEqual((update["$set"]["status"], update["$set"]["last_error"]), ("failed", "lease expired"))
+        # Claiming still only picks up jobs with attempts left
+        claim_query = collection.find_one_and_update.call_args.args[0]
+        self.assertEqual(claim_query["$expr"], {"$lt": ["$attempts", "$max_attempts"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
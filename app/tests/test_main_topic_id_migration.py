@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import ObjectId
+
+from app.db import main_topic_id_migration, operations
+from app.db.main_topic_id_migration import migrate_main_topic_ids
+from app.db.operations import main_topic_id_match
+
+
+class TestMainTopicIdMatch(unittest.TestCase):
+
+    def test_compat_matches_both_forms_until_rollout_ends(self):
+        main_id = ObjectId()
+        self.assertEqual(main_topic_id_match(str(main_id)), {"$in": [main_id, str(main_id)]})
+        with patch.object(operations, "MAIN_TOPIC_ID_COMPAT", False):
+            self.assertEqual(main_topic_id_match(str(main_id)), main_id)
+
+
+class TestMainTopicIdMigration(unittest.TestCase):
+
+    def run_migration(self, batches, **kwargs):
+        collection = MagicMock()
+        collection.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(side_effect=batches + [[]])
+        collection.bulk_write = AsyncMock(side_effect=lambda operations, ordered: MagicMock(modified_count=len(operations)))
+        collection.count_documents = AsyncMock(return_value=0)
+        with patch.object(main_topic_id_migration, "list_topics_collection", collection):
+            counts = asyncio.run(migrate_main_topic_ids(batch_size=2, pause_seconds=0, **kwargs))
+        return counts, collection
+
+    def test_rewrites_strings_in_batches_and_skips_invalid_values(self):
+        first, second = ObjectId(), ObjectId()
+        batches = [
+            [{"_id": ObjectId(), "main_topic_id": str(first)}, {"_id": ObjectId(), "main_topic_id": "not-an-id"}],
+            [{"_id": ObjectId(), "main_topic_id": str(second)}],
+        ]
+        counts, collection = self.run_migration(batches)
+        self.assertEqual(counts, {"scanned": 3, "convertible": 2, "migrated": 2, "invalid": 1, "remaining_strings": 0})
+        update = collection.bulk_write.call_args_list[0].args[0][0]
+        self.assertEqual(update._filter["main_topic_id"], str(first))
+        self.assertEqual(update._doc, {"$set": {"main_topic_id": first}})
+        self.assertEqual(collection.find.call_args_list[1].args[0]["_id"], {"$gt": batches[0][-1]["_id"]})
+
+    def test_dry_run_writes_nothing(self):
+        counts, collection = self.run_migration([[{"_id": ObjectId(), "main_topic_id": str(ObjectId())}]], dry_run=True)
+        collection.bulk_write.assert_not_called()
+        self.assertEqual((counts["convertible"], counts["migrated"]), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from app.services import model_router
+from app.services.model_router import route_completion, stage_models, validate_misc_points, validate_quiz, validate_prompting, validate_handout
+from app.services.token_accounting import cost_entry_fields
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def route(self, outputs):
+        calls = []
+
+        async def attempt(model):
+            calls.append(model)
+            return outputs[model], [{"model": model, "usage": {"prompt_tokens": 10, "completion_tokens": 5}}]
+
+        with patch.dict(model_router.STAGE_CASCADES, {"misc_points": ["small", "large"]}):
+            value, results = asyncio.run(route_completion("misc_points", attempt))
+        return value, results, calls
+
+    def test_valid_output_stays_on_the_cheap_model(self):
+        misc = {"learn_objective": "1. a", "method": "m", "duration": 60, "assessment": "1. b"}
+        value, results, calls = self.route({"small": misc, "large": None})
+        self.assertEqual(calls, ["small"])
+        self.assertEqual(value, misc)
+        self.assertEqual(results[0]["route"]["outcome"], "accepted")
+
+    def test_missing_duration_escalates(self):
+        broken = {"learn_objective": "1. a", "method": "m", "duration": None, "assessment": "1. b"}
+        fixed = dict(broken, duration=90)
+        value, results, calls = self.route({"small": broken, "large": fixed})
+        self.assertEqual(calls, ["small", "large"])
+        self.assertEqual(value, fixed)
+        self.assertEqual([r["route"]["outcome"] for r in results], ["escalated", "accepted"])
+        fields = cost_entry_fields(results[0])
+        self.assertEqual((fields["model"], fields["route_reason"]), ("small", "missing duration"))
+
+    def test_validators(self):
+        self.assertIsNone(validate_misc_points({"learn_objective": "x", "method": "y", "duration": 30, "assessment": "z"}))
+        self.assertEqual(validate_misc_points({"learn_objective": "x", "method": "", "duration": 30, "assessment": "z"}), "missing method")
+        self.assertIsNone(validate_quiz("1. **Q?**\n   - A) a\n   - B) b\n   - C) c\n   - D) d"))
+        self.assertIsNotNone(validate_quiz("Maaf, saya tidak bisa."))
+
+    def test_text_stages_can_escalate(self):
+        section = "Transformator menaikkan dan menurunkan tegangan. " * 12
+        handout = f"## Pengantar\n\n{section}\n\n## Prinsip Kerja\n\n{section}\n\n## Pemeliharaan\n\n{section}"
+        self.assertIsNone(validate_handout(handout))
+        self.assertIsNone(validate_prompting(section))
+        self.assertEqual(validate_handout("## Pengantar\n\nTransformator."), "shorter than 1500 characters")
+        self.assertEqual(validate_handout(section * 4), "no sections or paragraphs")
+        self.assertEqual(validate_prompting("I'm sorry, but I can't help with that." + " " * 400), "refusal")
+
+    def test_analogy_keeps_its_baseline_model(self):
+        self.assertEqual(stage_models("analogy"), ["gpt-4o"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,5 +35,40 @@ class TestGenerateTopicMiscRoute(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         # Further assertions can be added based on the expected output
 
+class TestGeneratePointStageRoutes(unittest.TestCase):
+
+    @patch('app.routes.openai_routes.process_point_prompting', new_callable=AsyncMock)
+    @patch('app.routes.openai_routes.get_point_of_discussion', new_callable=AsyncMock)
+    def test_prompting_held_by_a_batch_is_a_conflict(self, mock_get_point, mock_process):
+        mock_get_point.return_value = {"_id": "p1", "prompting": None}
+        mock_process.return_value = {"point_id": "p1", "status": "batched", "reason": "Waiting on batch batch_1"}
+
+        response = client.post("/api/generate-prompting", json={"point_of_discussion_id": "p1"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"detail": "Waiting on batch batch_1"})
+
+    @patch('app.routes.openai_routes.process_point_handout', new_callable=AsyncMock)
+    @patch('app.routes.openai_routes.get_point_of_discussion', new_callable=AsyncMock)
+    def test_handout_held_by_a_batch_is_a_conflict(self, mock_get_point, mock_process):
+        mock_get_point.return_value = {"_id": "p1", "prompting": "Prompt"}
+        mock_process.return_value = {"point_id": "p1", "status": "batched", "reason": "Waiting on batch batch_1"}
+
+        response = client.post("/api/generate-handout", json={"point_of_discussion_id": "p1"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"detail": "Waiting on batch batch_1"})
+
+    @patch('app.routes.openai_routes.process_point_prompting', new_callable=AsyncMock)
+    @patch('app.routes.openai_routes.get_point_of_discussion', new_callable=AsyncMock)
+    def test_prompting_missing_after_generation_is_an_error(self, mock_get_point, mock_process):
+        mock_get_point.return_value = {"_id": "p1"}
+        mock_process.return_value = {"point_id": "p1", "status": "generated"}
+
+        response = client.post("/api/generate-prompting", json={"point_of_discussion_id": "p1"})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {"detail": "Prompting generation did not store a prompting"})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,99 @@
+import json
+import unittest
+
+from app.services.output_parsers import (
+    MiscPointsOutput, ListOfTopicsOutput, response_format_for, parse_structured,
+    parse_topics_text, parse_elaboration_text, parse_misc_points_text, SubtopicStreamParser
+)
+
+MISC_RESPONSE = """[Tujuan Pembelajaran]
+
+1. Mendefinisikan manajemen bahan bakar.
+
+[Usulan Durasi Waktu]
+
+**Metodologi Pengiriman**: Ceramah dan diskusi.
+
+**Durasi Total**: 150
+
+[Identifikasi Kriteria Penilaian]
+
+1. **Pemahaman terhadap Konsep-konsep Utama**"""
+
+
+class TestStructuredOutputs(unittest.TestCase):
+
+    def test_schema_is_strict(self):
+        schema = response_format_for(ListOfTopicsOutput)["json_schema"]["schema"]
+        topic_schema = schema["$defs"]["TopicOutput"]
+        self.assertFalse(schema["additionalProperties"])
+        self.assertFalse(topic_schema["additionalProperties"])
+        self.assertEqual(set(topic_schema["required"]), set(topic_schema["properties"]))
+
+    def test_parse_structured(self):
+        content = json.dumps({"learn_objective": "a", "method": "b", "duration": 90, "assessment": "c"})
+        self.assertEqual(parse_structured(MiscPointsOutput, content).duration, 90)
+        self.assertIsNone(parse_structured(MiscPointsOutput, '{"learn_objective": "a"'))
+        self.assertIsNone(parse_structured(MiscPointsOutput, ""))
+
+
+class TestTextFallbackParsers(unittest.TestCase):
+
+    def test_misc_points_without_minutes_unit(self):
+        parsed = parse_misc_points_text(MISC_RESPONSE)
+        self.assertEqual(parsed["duration"], 150)
+        self.assertEqual(parsed["learn_objective"], "1. Mendefinisikan manajemen bahan bakar.")
+        self.assertTrue(parsed["method"].startswith("**Metodologi Pengiriman**"))
+        self.assertTrue(parsed["assessment"].startswith("1. **Pemahaman"))
+
+    def test_misc_points_missing_duration_does_not_crash(self):
+        self.assertIsNone(parse_misc_points_text("[Tujuan Pembelajaran]\n\nsesuatu")["duration"])
+
+    def test_topics_and_elaboration(self):
+        topics = parse_topics_text(
+            "1. **Topic Title:** Grid Basics\n"
+            "   - **Objective:** Understand the grid.\n"
+            "   - **Point of Discussion:**\n"
+            "     - Stability.\n"
+            "     - Storage."
+        )
+        self.assertEqual(topics[0]["topic_name"], "Grid Basics")
+        self.assertEqual(topics[0]["objective"], "Understand the grid.")
+        self.assertEqual(topics[0]["key_concepts"], "")
+        self.assertEqual(topics[0]["point_of_discussion"], ["Stability.", "Storage."])
+
+        points = parse_elaboration_text(
+            "1. **Subtopic:** Stability\n   - **Discussion Points Elaboration:**\n     - Frequency.\n"
+            "2. **Subtopic:** Storage\n     - Batteries."
+        )
+        self.assertEqual(points, [
+            {"subtopic": "Stability", "elaboration": "- Frequency."},
+            {"subtopic": "Storage", "elaboration": "- Batteries."},
+        ])
+
+
+class TestSubtopicStreamParser(unittest.TestCase):
+
+    def test_emits_each_subtopic_when_the_next_one_starts(self):
+        text = (
+            "1. **Subtopic:** Stability\n   - **Discussion Points Elaboration:**\n     - Frequency.\n"
+            "2. **Subtopic:** Storage\n     - Batteries.\n"
+        )
+        parser = SubtopicStreamParser()
+        emitted = []
+        for i in range(0, len(text), 7):
+            for point in parser.feed(text[i:i + 7]):
+                emitted.append((i, point))
+
+        self.assertEqual([point for _, point in emitted], [{"subtopic": "Stability", "elaboration": "- Frequency."}])
+        # Emitted while the stream was still going, before "Storage" was complete
+        self.assertLess(emitted[0][0], len(text) - 7)
+        self.assertEqual(parser.close(), [{"subtopic": "Storage", "elaboration": "- Batteries."}])
+        self.assertEqual(parse_elaboration_text(text), [
+            {"subtopic": "Stability", "elaboration": "- Frequency."},
+            {"subtopic": "Storage", "elaboration": "- Batteries."},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from app.services import prompt_registry as registry_module
+from app.services.prompt_registry import PromptRegistry
+
+
+class TestPromptRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "prompt_sample.txt")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("Topic {{topic}} for {audience}.")
+        self.registry = PromptRegistry(self.tmpdir.name)
+        self.registry.load_all()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_render_fills_both_placeholder_styles(self):
+        template = self.registry.get("prompt_sample")
+        self.assertEqual(template.render(topic="Grid", audience="PLN"), "Topic Grid for PLN.")
+
+    def test_render_requires_all_placeholders(self):
+        with self.assertRaises(KeyError):
+            self.registry.get("prompt_sample").render(topic="Grid")
+
+    def test_reloads_when_mtime_changes(self):
+        old_version = self.registry.get("prompt_sample").version
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("New {topic}")
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+
+        original_interval = registry_module.PROMPT_RELOAD_CHECK_SECONDS
+        registry_module.PROMPT_RELOAD_CHECK_SECONDS = 0
+        try:
+            template = self.registry.get("prompt_sample")
+        finally:
+            registry_module.PROMPT_RELOAD_CHECK_SECONDS = original_interval
+
+        self.assertNotEqual(template.version, old_version)
+        self.assertEqual(template.render(topic="Grid"), "New Grid")
+
+    def test_shipped_templates_keep_placeholders_at_the_end(self):
+        # Per-call values come after the instructions so the rendered prefix stays cacheable
+        registry = PromptRegistry()
+        registry.load_all()
+        for name in registry.versions():
+            template = registry.get(name)
+            literal = "".join(literal for literal, _ in template.parts)
+            self.assertGreater(len(template.static_prefix), 0.9 * len(literal), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from app.services.rate_limiter import TokenBucket, ModelRateGovernor, parse_reset_duration, RATE_LIMIT_HEADROOM
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reservations_queue_behind_debt(self):
+        bucket = TokenBucket(60 / RATE_LIMIT_HEADROOM)  # one token per second
+        self.assertEqual(bucket.reserve(60), 0.0)
+        first_wait = bucket.reserve(1)
+        second_wait = bucket.reserve(1)
+        self.assertAlmostEqual(first_wait, 1.0, places=1)
+        self.assertAlmostEqual(second_wait, 2.0, places=1)
+
+    def test_headers_update_limits_and_remaining(self):
+        governor = ModelRateGovernor("gpt-4o")
+        governor.update_from_headers({
+            "x-ratelimit-limit-tokens": "1000000",
+            "x-ratelimit-remaining-tokens": "1000",
+        })
+        self.assertEqual(governor.tokens.capacity, 1000000 * RATE_LIMIT_HEADROOM)
+        self.assertLessEqual(governor.tokens.tokens, 1000 * RATE_LIMIT_HEADROOM + 1)
+
+    def test_parse_reset_duration(self):
+        self.assertEqual(parse_reset_duration("6m0s"), 360)
+        self.assertAlmostEqual(parse_reset_duration("20ms"), 0.02)
+        self.assertAlmostEqual(parse_reset_duration("1.5s"), 1.5)
+        self.assertEqual(parse_reset_duration(None), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from app.services.resilience import Upstream, CircuitOpenError, call_with_policy, get_upstream
+
+
+class TestCallWithPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.upstream = get_upstream("google_translate")
+        self.upstream.__init__("google_translate")
+
+    def test_retries_retryable_errors_then_succeeds(self):
+        calls = []
+
+        async def attempt():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError("reset")
+            return "ok"
+
+        with patch("app.services.resilience.asyncio.sleep", return_value=None):
+            self.assertEqual(asyncio.run(call_with_policy("google_translate", attempt)), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.upstream.stats["retries"], 2)
+        self.assertEqual(self.upstream.state, "closed")
+
+    def test_non_retryable_errors_are_raised_immediately(self):
+        async def attempt():
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(call_with_policy("google_translate", attempt))
+        self.assertEqual(self.upstream.stats["retries"], 0)
+
+    def test_attempt_timeout(self):
+        self.upstream.timeout = 0.01
+        self.upstream.attempts = 1
+
+        async def attempt():
+            await asyncio.sleep(1)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(call_with_policy("google_translate", attempt))
+        self.assertEqual(self.upstream.stats["timeouts"], 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold_and_half_opens_after_reset(self):
+        upstream = Upstream("elevenlabs")
+        for _ in range(upstream.failure_threshold):
+            upstream.before_attempt()
+            upstream.record_failure()
+        self.assertEqual(upstream.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            upstream.before_attempt()
+
+        upstream.opened_at -= upstream.reset_seconds
+        upstream.before_attempt()
+        self.assertEqual(upstream.state, "half_open")
+        with self.assertRaises(CircuitOpenError):
+            upstream.before_attempt()
+        upstream.record_success()
+        self.assertEqual(upstream.state, "closed")
+
+    def half_open(self, name):
+        upstream = get_upstream(name)
+        upstream.__init__(name)
+        upstream.state = "open"
+        upstream.opened_at -= upstream.reset_seconds + 1
+        return upstream
+
+    def test_cancelled_probe_releases_the_half_open_circuit(self):
+        upstream = self.half_open("elevenlabs")
+
+        async def cancelled_probe():
+            task = asyncio.create_task(call_with_policy("elevenlabs", lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelled_probe())
+        self.assertEqual((upstream.state, upstream.probe_in_flight), ("half_open", False))
+        self.assertTrue(upstream.before_attempt())
+
+    def test_rate_limits_do_not_open_the_circuit(self):
+        upstream = self.half_open("elevenlabs")
+        upstream.attempts = 1
+        response = requests.Response()
+        response.status_code = 429
+
+        async def attempt():
+            raise requests.HTTPError(response=response)
+
+        with self.assertRaises(requests.HTTPError):
+            asyncio.run(call_with_policy("elevenlabs", attempt))
+        self.assertEqual((upstream.state, upstream.probe_in_flight, upstream.consecutive_failures), ("half_open", False, 0))
+
+    def test_prepare_runs_outside_the_attempt_timeout(self):
+        upstream = get_upstream("google_translate")
+        upstream.__init__("google_translate")
+        upstream.timeout = 0.05
+
+        async def attempt():
+            return "ok"
+
+        async def slow_rate_limiter():
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(asyncio.run(call_with_policy("google_translate", attempt, prepare=slow_rate_limiter)), "ok")
+        self.assertEqual(upstream.stats["timeouts"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
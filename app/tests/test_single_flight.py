@@ -0,0 +1,48 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+from app.services import single_flight
+from app.services.single_flight import run_single_flight
+
+
+class TestRunSingleFlight(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_run(self):
+        runs = []
+
+        @asynccontextmanager
+        async def lease(point_id, stage):
+            yield True
+
+        async def run():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return {"status": "generated"}
+
+        async def callers():
+            return await asyncio.gather(*(run_single_flight("p1", "handout", run, AsyncMock()) for _ in range(3)))
+
+        with patch.object(single_flight, "stage_lease", lease):
+            results = asyncio.run(callers())
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(results, [{"status": "generated"}] * 3)
+
+    def test_follows_a_run_held_by_another_worker(self):
+        run = AsyncMock()
+        on_follow = AsyncMock(return_value={"status": "existing"})
+
+        @asynccontextmanager
+        async def lease(point_id, stage):
+            yield False
+
+        with patch.object(single_flight, "stage_lease", lease), \
+                patch.object(single_flight, "wait_for_release", AsyncMock()):
+            result = asyncio.run(run_single_flight("p1", "handout", run, on_follow))
+        self.assertEqual(result, {"status": "existing"})
+        run.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.services import stage_service
+from app.services.stage_service import track_stage, stage_content_hash, process_point_misc_quiz
+
+
+class TestTrackStage(unittest.TestCase):
+
+    def run_tracked(self, result=None, error=None):
+        async def worker(point):
+            if error:
+                raise error
+            return result
+
+        async def without_coalescing(point_id, stage, run, on_follow):
+            return await run()
+
+        mocks = {
+            "run_single_flight": AsyncMock(side_effect=without_coalescing),
+            "mark_stage_running": AsyncMock(),
+            "mark_stage_done": AsyncMock(),
+            "mark_stage_failed": AsyncMock(),
+            "get_point_of_discussion": AsyncMock(return_value={"handout": "text"}),
+        }
+        with patch.multiple(stage_service, **mocks):
+            try:
+                asyncio.run(track_stage("handout")(worker)({"id": "p1"}))
+            except RuntimeError:
+                pass
+        return mocks
+
+    def test_success_marks_done_with_content_hash(self):
+        mocks = self.run_tracked({"point_id": "p1", "status": "generated"})
+        mocks["mark_stage_running"].assert_awaited_once_with("p1", "handout")
+        mocks["mark_stage_done"].assert_awaited_once_with("p1", "handout", stage_content_hash("handout", {"handout": "text"}))
+
+    def test_failure_and_skip_are_recorded(self):
+        mocks = self.run_tracked({"point_id": "p1", "status": "failed", "reason": "empty"})
+        mocks["mark_stage_failed"].assert_awaited_once_with("p1", "handout", "empty")
+
+        mocks = self.run_tracked({"point_id": "p1", "status": "skipped", "reason": "Prompting not found"})
+        mocks["mark_stage_failed"].assert_awaited_once_with("p1", "handout", "Prompting not found", status="pending")
+
+        mocks = self.run_tracked(error=RuntimeError("boom"))
+        mocks["mark_stage_failed"].assert_awaited_once_with("p1", "handout", "boom")
+        mocks["mark_stage_done"].assert_not_awaited()
+
+
+class TestMergedMiscQuiz(unittest.TestCase):
+
+    def run_merged(self, combined):
+        async def without_coalescing(point_id, stage, run, on_follow):
+            return await run()
+
+        point = {"point_of_discussion": "Trafo", "handout": "text", "topic_name_id": "t1"}
+        misc_points = {"learn_objective": "1. a", "method": "m", "duration": 30, "assessment": "1. b"}
+        mocks = {
+            "run_single_flight": AsyncMock(side_effect=without_coalescing),
+            "mark_stage_running": AsyncMock(),
+            "mark_stage_done": AsyncMock(),
+            "mark_stage_failed": AsyncMock(),
+            "get_point_of_discussion": AsyncMock(return_value=point),
+            "generate_misc_points_and_quiz": AsyncMock(return_value=combined),
+            "generate_misc_points": AsyncMock(return_value=misc_points),
+            "generate_quiz": AsyncMock(return_value="1. Q"),
+            "update_misc_points_and_quiz": AsyncMock(),
+        }
+        with patch.multiple(stage_service, **mocks):
+            result = asyncio.run(process_point_misc_quiz({"id": "p1"}))
+        return result, mocks
+
+    def test_merged_output_is_written_once(self):
+        combined = {"misc_points": {"learn_objective": "1. a", "method": "m", "duration": 30, "assessment": "1. b"}, "quiz": "1. Q"}
+        result, mocks = self.run_merged(combined)
+        self.assertEqual(result["status"], "generated")
+        mocks["update_misc_points_and_quiz"].assert_awaited_once_with("p1", combined["misc_points"], "1. Q")
+        mocks["generate_quiz"].assert_not_awaited()
+        self.assertEqual([c.args[1] for c in mocks["mark_stage_done"].await_args_list], ["misc_points", "quiz"])
+
+    def test_invalid_merged_output_falls_back_to_separate_calls(self):
+        result, mocks = self.run_merged(None)
+        self.assertEqual(result["status"], "generated")
+        mocks["generate_misc_points"].assert_awaited_once()
+        mocks["generate_quiz"].assert_awaited_once()
+        mocks["update_misc_points_and_quiz"].assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
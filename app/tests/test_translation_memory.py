@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from app.services import translation_memory
+from app.services.translation_memory import translate_with_memory, segment_key
+
+
+class TestTranslationMemory(unittest.TestCase):
+
+    def setUp(self):
+        translation_memory.memory.clear()
+        self.sent = []
+
+    async def fake_translate(self, pending):
+        self.sent.append(list(pending))
+        return [f"ID({segment})" for segment in pending]
+
+    def translate(self, segments):
+        with patch.object(translation_memory, "TRANSLATION_MEMORY_PERSIST", False):
+            return asyncio.run(translate_with_memory("en", "id", segments, self.fake_translate))
+
+    def test_only_changed_segments_are_sent_again(self):
+        first = self.translate(["Intro", "", "Body", "Outro"])
+        self.assertEqual(first, ["ID(Intro)", "", "ID(Body)", "ID(Outro)"])
+
+        second = self.translate(["Intro", "", "Body edited", "Outro"])
+        self.assertEqual(second[2], "ID(Body edited)")
+        self.assertEqual(self.sent, [["Intro", "Body", "Outro"], ["Body edited"]])
+
+    def test_key_ignores_whitespace_but_not_language_pair(self):
+        self.assertEqual(segment_key("en", "id", "Grid  stability \n"), segment_key("en", "id", "Grid stability"))
+        self.assertNotEqual(segment_key("en", "id", "Grid"), segment_key("id", "en", "Grid"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# app/worker.py
+# Generation worker: claims jobs from the Mongo job queue and runs them.
+# Run next to the API with `python -m app.worker`.
+import os
+import uuid
+import signal
+import socket
+import asyncio
+import logging
+from app.services.job_queue import JOB_LEASE_SECONDS, claim_job, renew_lease, complete_job, fail_job
+from app.services.job_handlers import JOB_HANDLERS
+from app.db.indexes import ensure_indexes
+from app.services.llm_gateway import close_client
+from app.services.prompt_registry import prompt_registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+# Comma separated list of job types this worker accepts; empty means all
+WORKER_JOB_TYPES = [t for t in os.getenv("WORKER_JOB_TYPES", "").split(",") if t]
+
+
+class Worker:
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, job_types=None):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.job_types = job_types or list(JOB_HANDLERS)
+        self.stopping = asyncio.Event()
+
+    def stop(self):
+        logger.info(f"Worker {self.worker_id} stopping, waiting for running jobs")
+        self.stopping.set()
+
+    async def run(self):
+        prompt_registry.load_all()
+        await ensure_indexes(collections=["jobs"])
+        logger.info(f"Worker {self.worker_id} started (concurrency={self.concurrency}, job types={self.job_types})")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+
+        while not self.stopping.is_set():
+            await slots.acquire()
+            try:
+                job = await claim_job(self.worker_id, self.job_types)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), timeout=WORKER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self.execute(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        await close_client()
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await renew_lease(job_id, self.worker_id):
+                logger.warning(f"Lost lease on job {job_id}")
+                return
+
+    async def execute(self, job: dict):
+        logger.info(f"Running {job['type']} job {job['_id']} (attempt {job['attempts']}/{job['max_attempts']})")
+        handler = JOB_HANDLERS.get(job["type"])
+        if handler is None:
+            job = {**job, "attempts": job["max_attempts"]}
+            await fail_job(job, self.worker_id, f"Unknown job type: {job['type']}")
+            return
+
+        heartbeat = asyncio.create_task(self.heartbeat(job["_id"]))
+        try:
+            result = await handler(job)
+            await complete_job(job["_id"], self.worker_id, result)
+            logger.info(f"Completed {job['type']} job {job['_id']}")
+        except Exception as e:
+            logger.error(f"Error running {job['type']} job {job['_id']}: {str(e)}", exc_info=True)
+            await fail_job(job, self.worker_id, str(e))
+        finally:
+            heartbeat.cancel()
+
+
+async def main():
+    worker = Worker(job_types=WORKER_JOB_TYPES)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())